@@ -0,0 +1,152 @@
+import argparse
+import datetime
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+from dateutil.relativedelta import relativedelta
+
+from CandleStore import CandleStore
+from FyersData import FYERS_TIMEZONE, RateLimiter, fetch_history, load_fyers_client
+from Resilience import RetryQueue
+from SymbolMaster import SymbolMaster, resolve_universe
+
+# Longest range Fyers serves in one history request: 100 days intraday, 366 days daily
+MAX_CHUNK_DAYS = {'D': 366, '1D': 366}
+DEFAULT_CHUNK_DAYS = 100
+
+
+# Function to split an epoch range into the largest ranges one request may cover
+def chunk_ranges(range_from, range_to, resolution):
+    chunk_seconds = MAX_CHUNK_DAYS.get(resolution, DEFAULT_CHUNK_DAYS) * 24 * 60 * 60
+    chunks = []
+    start = range_from
+    while start <= range_to:
+        end = min(start + chunk_seconds - 1, range_to)
+        chunks.append((start, end))
+        start = end + 1
+    return chunks
+
+
+# Function to backfill a long history of many symbols into the candle store
+def backfill(symbols, resolution, range_from, range_to, confile='config.ini', store=None,
+             max_workers=8, limiter=None, symbol_master=None):
+    """
+    Splits the range of every symbol into chunks the broker accepts, fetches all chunks
+    concurrently under the rate limiter and writes each symbol's stitched, deduplicated
+    candles to the store as soon as its last chunk is in.
+    Args:
+        symbols: Fyers symbols, e.g. 'NSE:SBIN-EQ'.
+        resolution: Fyers resolution string, e.g. '15' or 'D'.
+        range_from, range_to: Epoch timestamps of the whole range.
+        store: CandleStore to write to; defaults to the shared candle database.
+    Returns:
+        Dictionary of symbol -> number of candles written.
+    """
+    fyers = load_fyers_client(confile)
+    if fyers is None:
+        return {}
+    store = store or CandleStore()
+    limiter = limiter or RateLimiter()
+    retry_queue = RetryQueue()
+
+    # Symbols already complete for the range only need the bars after their last stored one
+    tasks = []
+    for symbol in dict.fromkeys(symbols):
+        start = store.refresh_start(symbol, resolution, range_from)
+        for chunk in chunk_ranges(start, range_to, resolution):
+            tasks.append((symbol, start, chunk))
+
+    remaining = {}
+    for symbol, _, _ in tasks:
+        remaining[symbol] = remaining.get(symbol, 0) + 1
+    parts = {symbol: [] for symbol in remaining}
+    complete = {symbol: True for symbol in remaining}
+    lock = threading.Lock()
+    written = {}
+
+    def finish(symbol, start):
+        frames = [frame for frame in parts.pop(symbol) if frame is not None and not frame.empty]
+        if not frames:
+            written[symbol] = 0
+            return
+        df = pd.concat(frames)
+        df = df[~df.index.duplicated(keep='last')].sort_index()
+        # Only a fully fetched range may be recorded as covered
+        covered_from = range_from if complete[symbol] and start == range_from else None
+        store.write(symbol, resolution, df, tz=FYERS_TIMEZONE, covered_from=covered_from)
+        written[symbol] = len(df)
+        print(f"Backfilled {len(df)} candles for {symbol}")
+
+    def collect(symbol, start, df, failed=False):
+        with lock:
+            parts[symbol].append(df)
+            if failed:
+                complete[symbol] = False
+            remaining[symbol] -= 1
+            if remaining[symbol] == 0:
+                finish(symbol, start)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(fetch_history, fyers, symbol, resolution, chunk[0], chunk[1], limiter, symbol_master):
+                (symbol, start, chunk)
+            for symbol, start, chunk in tasks
+        }
+        for future in as_completed(futures):
+            symbol, start, chunk = futures[future]
+            try:
+                df = future.result()
+            except Exception as e:
+                print(f"Error fetching {symbol} from {chunk[0]} to {chunk[1]}: {str(e)}")
+                retry_queue.add((symbol, start, chunk), fetch_history, fyers, symbol, resolution,
+                                chunk[0], chunk[1], limiter, symbol_master)
+                continue
+            collect(symbol, start, df)
+
+    # Chunks that still failed are retried once the pool is done
+    retried = retry_queue.drain()
+    for key, df in retried.items():
+        collect(key[0], key[1], df)
+    for symbol, start, chunk in retry_queue.pending:
+        collect(symbol, start, None, failed=True)
+
+    return written
+
+
+# Function to read the symbols given on the command line or in a file, one per line
+def _read_symbols(symbols, symbols_file):
+    names = [symbol.strip() for symbol in (symbols or '').split(',') if symbol.strip()]
+    if symbols_file:
+        with open(symbols_file) as f:
+            names += [line.strip() for line in f if line.strip() and not line.startswith('#')]
+    return names
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill long intraday history into the candle store.")
+    parser.add_argument('--symbols', help="Comma separated symbols, e.g. SBIN.NS,TCS.NS")
+    parser.add_argument('--symbols-file', help="File with one symbol per line")
+    parser.add_argument('--resolution', default='15', help="Fyers resolution, e.g. 15, 60, 120 or D")
+    parser.add_argument('--years', type=int, default=3, help="Years of history to backfill")
+    parser.add_argument('--workers', type=int, default=8, help="Requests in flight at once")
+    parser.add_argument('--config', default='config.ini', help="Config file with the FyersAPI section")
+    args = parser.parse_args()
+
+    symbol_names = _read_symbols(args.symbols, args.symbols_file)
+    if not symbol_names:
+        parser.error("Give --symbols or --symbols-file.")
+
+    master = SymbolMaster()
+    fyers_symbols = resolve_universe(symbol_names, master=master)
+
+    today = datetime.datetime.now()
+    range_from_epoch = int(time.mktime((today - relativedelta(years=args.years)).timetuple()))
+    range_to_epoch = int(time.mktime(today.timetuple()))
+
+    started = time.monotonic()
+    counts = backfill(list(fyers_symbols.values()), args.resolution, range_from_epoch, range_to_epoch,
+                      confile=args.config, max_workers=args.workers, symbol_master=master)
+    print(f"Backfilled {sum(counts.values())} candles for {len(counts)} symbols "
+          f"in {time.monotonic() - started:.1f}s")
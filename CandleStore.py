@@ -0,0 +1,207 @@
+import datetime
+import sqlite3
+import time
+
+import pandas as pd
+import yfinance as yf
+from dateutil.relativedelta import relativedelta
+
+from FyersData import FYERS_TIMEZONE, PRICE_COLUMNS, fetch_history_bulk
+from Resilience import YAHOO_HOST, YAHOO_RETRYABLE_ERRORS, call_with_retry
+
+CANDLE_DB = '../StockCandles.db'
+
+
+# Function to convert a DataFrame index to epoch seconds
+def _to_epoch(index, tz=None):
+    index = pd.DatetimeIndex(pd.to_datetime(index))
+    if index.tz is None:
+        index = index.tz_localize(tz or 'UTC')
+    return ((index - pd.Timestamp(0, tz='UTC')) // pd.Timedelta(seconds=1)).to_numpy()
+
+
+# Function to flatten the (field, ticker) columns yf.download returns for a single ticker
+def _flatten_columns(df):
+    if isinstance(df.columns, pd.MultiIndex):
+        df = df.copy()
+        df.columns = df.columns.get_level_values(0)
+    return df
+
+
+class CandleStore:
+    """
+    On-disk OHLCV cache keyed by (symbol, resolution). Candles are stored with epoch-second
+    timestamps so a refresh only has to request the bars after the last stored one.
+    """
+
+    def __init__(self, db_path=CANDLE_DB):
+        self.db_path = db_path
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS candles (
+            symbol TEXT,
+            resolution TEXT,
+            ts INTEGER,
+            open REAL,
+            high REAL,
+            low REAL,
+            close REAL,
+            volume REAL,
+            PRIMARY KEY (symbol, resolution, ts)
+        ) WITHOUT ROWID
+        """)
+        # One row per series: its timezone ('' for naive daily data) and how far back it is complete
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS candle_series (
+            symbol TEXT,
+            resolution TEXT,
+            tz TEXT,
+            covered_from INTEGER,
+            PRIMARY KEY (symbol, resolution)
+        )
+        """)
+        conn.commit()
+        conn.close()
+
+    def _series(self, conn, symbol, resolution):
+        return conn.execute(
+            "SELECT tz, covered_from FROM candle_series WHERE symbol = ? AND resolution = ?",
+            (symbol, resolution)
+        ).fetchone()
+
+    def last_timestamp(self, symbol, resolution):
+        conn = sqlite3.connect(self.db_path)
+        row = conn.execute(
+            "SELECT MAX(ts) FROM candles WHERE symbol = ? AND resolution = ?", (symbol, resolution)
+        ).fetchone()
+        conn.close()
+        return row[0]
+
+    def refresh_start(self, symbol, resolution, range_from):
+        """
+        Returns the epoch from which the series must be fetched to cover range_from onwards.
+        The last stored bar is fetched again because it may have still been forming.
+        """
+        conn = sqlite3.connect(self.db_path)
+        series = self._series(conn, symbol, resolution)
+        last = conn.execute(
+            "SELECT MAX(ts) FROM candles WHERE symbol = ? AND resolution = ?", (symbol, resolution)
+        ).fetchone()[0]
+        conn.close()
+        if series is None or last is None or series[1] is None or range_from < series[1]:
+            return range_from
+        return max(last, range_from)
+
+    def write(self, symbol, resolution, df, tz=None, covered_from=None):
+        """
+        Upserts the candles of df. A naive index is taken to be in `tz` (or is kept naive when
+        tz is None); covered_from records the start of the window that was fetched.
+        """
+        if df is None or df.empty:
+            return
+        df = _flatten_columns(df)
+        index = pd.DatetimeIndex(pd.to_datetime(df.index))
+        series_tz = str(index.tz) if index.tz is not None else (tz or '')
+        timestamps = _to_epoch(index, tz)
+
+        rows = zip(
+            [symbol] * len(df), [resolution] * len(df), timestamps.tolist(),
+            *(df[column].astype(float).tolist() for column in PRICE_COLUMNS)
+        )
+        conn = sqlite3.connect(self.db_path)
+        conn.executemany("""
+            INSERT OR REPLACE INTO candles (symbol, resolution, ts, open, high, low, close, volume)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)""", rows)
+
+        series = self._series(conn, symbol, resolution)
+        if series is not None and series[1] is not None:
+            covered_from = series[1] if covered_from is None else min(series[1], covered_from)
+        conn.execute("""
+            INSERT OR REPLACE INTO candle_series (symbol, resolution, tz, covered_from)
+            VALUES (?, ?, ?, ?)""", (symbol, resolution, series_tz, covered_from))
+        conn.commit()
+        conn.close()
+
+    def read(self, symbol, resolution, range_from=None, range_to=None):
+        """
+        Returns the stored candles of a series between the two epochs (inclusive) as a
+        DataFrame indexed by Date in the series' own timezone.
+        """
+        conn = sqlite3.connect(self.db_path)
+        series = self._series(conn, symbol, resolution)
+        df = pd.read_sql("""
+            SELECT ts, open AS Open, high AS High, low AS Low, close AS Close, volume AS Volume
+            FROM candles
+            WHERE symbol = ? AND resolution = ? AND ts >= ? AND ts <= ?
+            ORDER BY ts""", conn,
+            params=(symbol, resolution, range_from if range_from is not None else 0,
+                    range_to if range_to is not None else 2 ** 62))
+        conn.close()
+
+        index = pd.to_datetime(df.pop('ts'), unit='s', utc=True)
+        index = index.dt.tz_convert(series[0]) if series and series[0] else index.dt.tz_localize(None)
+        df.index = pd.DatetimeIndex(index, name='Date')
+        return df
+
+    def get_candles(self, symbol, resolution, range_from, range_to, fetch, tz=None):
+        """
+        Serves a window of candles from the store, fetching only what is missing.
+        Args:
+            fetch: Function (symbol, range_from, range_to) -> DataFrame or None.
+            tz: Timezone of a naive index returned by fetch.
+        """
+        start = self.refresh_start(symbol, resolution, range_from)
+        fresh = fetch(symbol, start, range_to) if start <= range_to else None
+        if fresh is not None and not fresh.empty:
+            self.write(symbol, resolution, fresh, tz=tz, covered_from=range_from if start == range_from else None)
+        return self.read(symbol, resolution, range_from, range_to)
+
+
+# Function to get the Fyers history of many symbols through the candle store
+def cached_history_bulk(symbols, resolution, range_from, range_to, confile='config.ini', store=None,
+                        symbol_master=None):
+    """
+    Same as FyersData.fetch_history_bulk, but only the bars after each symbol's last stored
+    bar are requested; the rest of the window is served from the store.
+    """
+    store = store or CandleStore()
+    symbols = list(dict.fromkeys(symbols))
+    starts = {symbol: store.refresh_start(symbol, resolution, range_from) for symbol in symbols}
+    fresh = fetch_history_bulk(symbols, resolution, starts, range_to, confile, symbol_master=symbol_master)
+    for symbol, df in fresh.items():
+        covered_from = range_from if starts[symbol] == range_from else None
+        store.write(symbol, resolution, df, tz=FYERS_TIMEZONE, covered_from=covered_from)
+
+    results = {}
+    for symbol in symbols:
+        df = store.read(symbol, resolution, range_from, range_to)
+        if not df.empty:
+            results[symbol] = df
+    return results
+
+
+# Function to turn a yfinance period such as '3mo' or '5d' into a start epoch
+def period_start(period):
+    units = {'d': 'days', 'wk': 'weeks', 'mo': 'months', 'y': 'years'}
+    for suffix, unit in units.items():
+        if period.endswith(suffix) and period[:-len(suffix)].isdigit():
+            start = datetime.datetime.now() - relativedelta(**{unit: int(period[:-len(suffix)])})
+            return int(time.mktime(start.timetuple()))
+    raise ValueError(f"Unsupported period: {period}")
+
+
+# Function to download yfinance candles through the candle store
+def yf_download_cached(symbol, period="1mo", interval="1d", store=None):
+    """
+    Drop-in replacement for yf.download(symbol, period=..., interval=...) that keeps the
+    candles on disk and only downloads the bars after the last stored one.
+    """
+    store = store or CandleStore()
+
+    def fetch(symbol, range_from, range_to):
+        start = datetime.datetime.fromtimestamp(range_from, tz=datetime.timezone.utc)
+        data = call_with_retry(yf.download, symbol, start=start, interval=interval,
+                               host=YAHOO_HOST, retryable=YAHOO_RETRYABLE_ERRORS)
+        return _flatten_columns(data)
+
+    return store.get_candles(symbol, interval, period_start(period), int(time.time()), fetch)
@@ -6,7 +6,8 @@ import pandas as pd
 import yfinance as yf
 import numpy as np
 import pytz
-from fyers_apiv3 import fyersModel
+from FyersData import fetch_history, month_range
+from FyersSession import get_fyers_session
 import configparser
 import datetime
 from dateutil.relativedelta import relativedelta
@@ -19,6 +20,10 @@ window_maximized = False
 
 import configparser
 import os
+from ZoneStore import TIMEFRAME_LABELS, ZoneStore
+
+# Zones table the violation marks are written to
+zone_store = ZoneStore()
 
 
 def convert_to_nse_symbol(symbol):
@@ -30,75 +35,14 @@ def convert_to_nse_symbol(symbol):
     
 
 def candles_2hr(confile, symbol):
-    config = configparser.ConfigParser()
-
-    # Verify the config file exists
-    if not os.path.exists(confile):
-        print(f"Config file not found: {confile}")
-        return None
-    
-    config.read(confile)  # Read the configuration file
-
-    # Check if 'FyersAPI' section exists
-    if 'FyersAPI' not in config:
-        print("FyersAPI section not found in config file.")
+    # Reuse the process-wide Fyers session instead of reading the config and connecting per call
+    fyers = get_fyers_session(confile)
+    if fyers is None:
         return None
 
-    # Fetch client_id and access_token from config
-    client_id = config['FyersAPI']['client_id']
-    access_token = config['FyersAPI']['access_token']
-
-    # Initialize the FyersModel instance with your client_id, access_token, and enable async mode
-    fyers = fyersModel.FyersModel(client_id=client_id, is_async=False, token=access_token, log_path="")
-
-    # Get today's date and the date 1 month before today
-    today = datetime.datetime.now()
-    month1bef = today - relativedelta(months=1)
-
-    # Convert the dates to epoch timestamps
-    range_from_epoch = int(time.mktime(month1bef.timetuple()))  # 1 month ago
-    range_to_epoch = int(time.mktime(today.timetuple()))  # Today
-
-    # Prepare the data dictionary
-    data = {
-        "symbol": symbol,
-        "resolution": "120",
-        "date_format": "0",  # 0 means using epoch timestamps
-        "range_from": range_from_epoch,
-        "range_to": range_to_epoch,
-        "cont_flag": "1"
-    }
-
-    # Call the API
-    response = fyers.history(data=data)
-    # print(response)
-
-    # Sample data
-    candles_data = response.get('candles', [])
-
-    if not candles_data:
-        print(f"No candles data found for symbol: {symbol}")
-        return None
-
-    # Convert the candles data
-    converted_data = []
-    for candle in candles_data:
-        date = datetime.datetime.fromtimestamp(candle[0]).strftime('%Y-%m-%d %H:%M:%S')
-        open_price = candle[1]
-        high_price = candle[2]
-        low_price = candle[3]
-        close_price = candle[4]
-        volume = candle[5]
-        
-        # Append the converted values to the list
-        converted_data.append([date, open_price, high_price, low_price, close_price, volume])
-
-    # Create the DataFrame
-    two_hour_df = pd.DataFrame(converted_data, columns=['Date', 'Open', 'High', 'Low', 'Close', 'Volume'])
-
-    # Set the 'Date' column as the index
-    two_hour_df.set_index('Date', inplace=True)
-    return two_hour_df
+    # Get the 2-hour candles of the last month
+    range_from_epoch, range_to_epoch = month_range(1)
+    return fetch_history(fyers, symbol, "120", range_from_epoch, range_to_epoch)
 
 
 # Function to fetch the stock price results from the database sorted by nearest_diff
@@ -278,24 +222,10 @@ def display_candlestick_charts():
             cur.execute("DELETE FROM GreenRedList WHERE symbol=? AND price_range_low=?", (symbol, stock['price_range_low']))
             cur.close()
             conn1.commit()
-            if timeframe == '1d':
-                conn = sqlite3.connect('../StockDZSZ.db')
-                cursor = conn.cursor()
-                cursor.execute("UPDATE demand_supply_zones SET zone_status = 'Violated' WHERE symbol = ? AND price_range_high = ? ", (stock['symbol'], stock['price_range_high']))
-                cursor.close()
-                conn.commit()
-            elif timeframe == '1hr':
-                conn = sqlite3.connect('../StockTest.db')
-                cursor = conn.cursor()
-                cursor.execute("UPDATE demand_supply_zones_1hr SET zone_status = 'Violated' WHERE symbol = ? AND price_range_high = ? ", (stock['symbol'], stock['price_range_high']))
-                cursor.close()
-                conn.commit()
-            elif timeframe == '2hr':
-                conn = sqlite3.connect('../StockTest.db')
-                cursor = conn.cursor()
-                cursor.execute("UPDATE demand_supply_zones SET zone_status = 'Violated' WHERE symbol = ? AND price_range_high = ? ", (stock['symbol'], stock['price_range_high']))
-                cursor.close()
-                conn.commit()
+            # Every timeframe's zones live in the one zones table
+            if timeframe in TIMEFRAME_LABELS:
+                zone_store.set_status(stock['symbol'], TIMEFRAME_LABELS[timeframe], 'NSE', stock['start_date'],
+                                      stock['end_date'], 'Violated')
         else:
             print(f"The zone for {symbol} is not violated.")
             zone_color = 'green'  # Unviolated zones are shown in green
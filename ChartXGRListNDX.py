@@ -19,6 +19,10 @@ window_maximized = False
 
 import configparser
 import os
+from ZoneStore import TIMEFRAME_LABELS, ZoneStore
+
+# Zones table the violation marks are written to
+zone_store = ZoneStore()
 
 # Function to fetch the stock price results from the database sorted by nearest_diff
 def fetch_sorted_price_diff_data(database_name):
@@ -190,18 +194,10 @@ def display_candlestick_charts():
             cur.execute("DELETE FROM GreenRedList WHERE symbol=? AND price_range_low=?", (symbol, stock['price_range_low']))
             cur.close()
             conn1.commit()
-            if timeframe == '1d':
-                conn = sqlite3.connect('../StockDZSZNDX.db')
-                cursor = conn.cursor()
-                cursor.execute("UPDATE demand_supply_zones SET zone_status = 'Violated' WHERE symbol = ? AND price_range_high = ? ", (stock['symbol'], stock['price_range_high']))
-                cursor.close()
-                conn.commit()
-            elif timeframe == '1hr':
-                conn = sqlite3.connect('../StockDZSZNDXNDX.db')
-                cursor = conn.cursor()
-                cursor.execute("UPDATE demand_supply_zones_1hr SET zone_status = 'Violated' WHERE symbol = ? AND price_range_high = ? ", (stock['symbol'], stock['price_range_high']))
-                cursor.close()
-                conn.commit()
+            # Every timeframe's zones live in the one zones table
+            if timeframe in TIMEFRAME_LABELS:
+                zone_store.set_status(stock['symbol'], TIMEFRAME_LABELS[timeframe], 'NASDAQ', stock['start_date'],
+                                      stock['end_date'], 'Violated')
         else:
             print(f"The zone for {symbol} is not violated.")
             zone_color = 'green'  # Unviolated zones are shown in green
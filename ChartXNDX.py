@@ -5,6 +5,8 @@ import pandas as pd
 import yfinance as yf
 import numpy as np
 
+from Resample import resample_candles
+
 # Flag to track whether the chart is in full screen
 window_maximized = False
 
@@ -40,35 +42,6 @@ def fetch_sorted_price_diff_data(database_name):
         })
     return result_data
 
-# Function to merge consecutive 1-hour candles into 2-hour candles, including volume aggregation
-def merge_to_2_hour_candles(stock_data):
-    """
-    Merges consecutive 1-hour candles into 2-hour candles, including volume aggregation.
-    """
-    two_hour_candles = []
-    
-    # Iterate over the stock data, stepping through the candles two by two (index i and i+1)
-    for i in range(0, len(stock_data) - 1, 2):  # Step by 2 to combine two 1-hour candles
-        # Open: First hour's open, Close: Last hour's close
-        o = stock_data.iloc[i]['Open']
-        c = stock_data.iloc[i + 1]['Close']
-        
-        # High: Maximum high of the two hours, Low: Minimum low of the two hours
-        h = max(stock_data.iloc[i]['High'], stock_data.iloc[i + 1]['High'])
-        l = min(stock_data.iloc[i]['Low'], stock_data.iloc[i + 1]['Low'])
-        
-        # Volume: Sum of both hours' volume
-        volume = stock_data.iloc[i]['Volume'] + stock_data.iloc[i + 1]['Volume']
-        
-        # Use the starting time of the first candle in the pair for the 2-hour candle
-        two_hour_candles.append([stock_data.index[i], o, h, l, c, volume])
-    
-    # Create a DataFrame with the 2-hour candles
-    two_hour_df = pd.DataFrame(two_hour_candles, columns=['Date', 'Open', 'High', 'Low', 'Close', 'Volume'])
-    two_hour_df.set_index('Date', inplace=True)
-    
-    return two_hour_df
-
 # Function to fetch historical candlestick data for a given stock symbol
 def fetch_candlestick_data(stock_symbol, timeframe):
     stock = yf.Ticker(stock_symbol)
@@ -78,7 +51,7 @@ def fetch_candlestick_data(stock_symbol, timeframe):
         data = stock.history(period="1mo", interval="1h")  # Fetch last month of 1-hour data
     elif timeframe == '2hr':
         data1 = stock.history(period="1mo", interval="1h")  # Fetch last month of 1-hour data
-        data = merge_to_2_hour_candles(data1)  # Merge to 2-hour candles   
+        data = resample_candles(data1, '2h', market='NASDAQ')  # Merge to session-aligned 2-hour candles
     else:
         data = stock.history(period="3mo")  # Default to 3 months of 1-day data
     
@@ -1,33 +1,29 @@
+import heapq
 import sqlite3
-import yfinance as yf
+from PriceSnapshot import price_snapshot
+from ZoneIndex import ZoneIndex
+from ZoneStore import TIMEFRAME_LABELS, ZONE_DB
 
-# Function to get the current price of a stock using yfinance
-def get_current_price(stock_symbol):
-    try:
-        stock = yf.Ticker(stock_symbol)
-        current_price = stock.history(period="1d")['Close'].iloc[-1]
-        return current_price
-    except Exception as e:
-        print(f"Error fetching current price for {stock_symbol}: {e}")
-        return None
+# Timeframes of the zones table that are checked, mapped to the label written to stock_price_results
+CHECK_TIMEFRAMES = {'1d': '1d', '1h': '1hr', '2h': '2hr'}
 
 # Function to fetch demand and supply zones from the database (handles both daily and hourly data)
-def fetch_zones_from_db(database_name, table_name, timeframe):
+def fetch_zones_from_db(timeframe, market='NSE', database_name=ZONE_DB):
     # Connect to the SQLite database
     conn = sqlite3.connect(database_name)
     cursor = conn.cursor()
 
-    # Query to fetch demand and supply zone details (no need for timeframe filter)
-    query = f"""
+    # Query to fetch the active zones of one market and timeframe, served by the (zone_status, start_ts) index
+    query = """
     SELECT symbol, start_date, end_date, price_range_high, price_range_low
-    FROM { table_name }
-    WHERE zone_status = 'Active';
-    """ 
+    FROM zones
+    WHERE zone_status = 'Active' AND timeframe = ? AND market = ?;
+    """
 
     zones_data = []
     try:
         # Execute the query to fetch the zones
-        cursor.execute(query)
+        cursor.execute(query, (TIMEFRAME_LABELS[timeframe], market))
 
         # Fetch all results and store them
         rows = cursor.fetchall()
@@ -98,57 +94,53 @@ def insert_results_into_db(results, database_name):
         print(f"SQLite error during insertion: {e}")
 
 # Function to check which stocks have their current price within the range
-def check_stocks_in_range():
-    # Fetch active zones from the daily database (StockDZSZ.db) and hourly database (StockTest.db)
-    daily_zones = fetch_zones_from_db('../StockDZSZ.db', "demand_supply_zones", '1d')  # Daily data
-    hourly_zones = fetch_zones_from_db('../StockTest.db', "demand_supply_zones_1hr", '1hr')  # Hourly data
-    hourly_2_zones = fetch_zones_from_db('../StockTest.db', "demand_supply_zones", '2hr')  # Hourly data
-
-    if not daily_zones and not hourly_zones:
+def check_stocks_in_range(index=None):
+    """
+    Args:
+        index: ZoneIndex of the active zones to check. By default the active daily, hourly and
+            2-hour zones are loaded from the zones table; a caller that keeps running can pass its
+            own index and keep it current with index.apply() instead of reloading it.
+    """
+    if index is None:
+        index = ZoneIndex.load(statuses=('Active',), timeframe=tuple(CHECK_TIMEFRAMES), market='NSE')
+
+    if not len(index):
         print("No active zones found in the database.")
         return
 
-    # Combine daily and hourly zones
-    zones_data = daily_zones + hourly_zones + hourly_2_zones
-
-    # Create a list to store stocks that are closest to the price range
-    closest_stocks = []
-
-    for zone in zones_data:
-        symbol = zone['symbol']
-        price_range_high = zone['price_range_high']
-        price_range_low = zone['price_range_low']
+    # Fetch the price of every distinct symbol in one batched request
+    symbols = list(index.symbols)
+    current_prices = price_snapshot.prices(symbols)
 
-        # Get current price of the stock
-        current_price = get_current_price(symbol)
+    # Each symbol's zones come out of the index nearest first, so merging them sorts every zone
+    symbol_results = []
+    for symbol in symbols:
+        current_price = current_prices.get(symbol)
 
         if current_price is None:
             print(f"Skipping {symbol} as current price couldn't be fetched.")
             continue
 
-        # Calculate the difference between the current price and both price range boundaries
-        diff_low = abs(current_price - price_range_low)
-        diff_high = abs(current_price - price_range_high)
-
-        # Determine the nearest price range (low or high)
-        nearest_range = 'Low' if diff_low < diff_high else 'High'
-        nearest_diff = diff_low if nearest_range == 'Low' else diff_high
-
-        # Add stock to the closest_stocks list with the nearest price difference
-        closest_stocks.append({
-            'symbol': symbol,
-            'current_price': current_price,
-            'price_range_low': price_range_low,
-            'price_range_high': price_range_high,
-            'nearest_range': nearest_range,
-            'nearest_diff': nearest_diff,
-            'start_date': zone['start_date'],
-            'end_date': zone['end_date'],
-            'timeframe': zone['timeframe']
-        })
-
-    # Sort the stocks by the nearest price difference (smallest difference first)
-    closest_stocks.sort(key=lambda x: x['nearest_diff'])
+        results = []
+        for nearest_diff, zone in index.by_distance(symbol, current_price):
+            # Name the nearer of the two stored bounds (demand zones store them inverted)
+            diff_low = abs(current_price - zone['price_range_low'])
+            diff_high = abs(current_price - zone['price_range_high'])
+            results.append({
+                'symbol': symbol,
+                'current_price': current_price,
+                'price_range_low': zone['price_range_low'],
+                'price_range_high': zone['price_range_high'],
+                'nearest_range': 'Low' if diff_low < diff_high else 'High',
+                'nearest_diff': nearest_diff,
+                'start_date': zone['start_date'],
+                'end_date': zone['end_date'],
+                'timeframe': CHECK_TIMEFRAMES.get(zone['timeframe'], zone['timeframe'])
+            })
+        symbol_results.append(results)
+
+    # The stocks sorted by the nearest price difference (smallest difference first)
+    closest_stocks = list(heapq.merge(*symbol_results, key=lambda x: x['nearest_diff']))
     
     # Insert the results into the StockDZSZ.db database
     if closest_stocks:
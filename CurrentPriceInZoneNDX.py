@@ -1,33 +1,24 @@
 import sqlite3
-import yfinance as yf
-
-# Function to get the current price of a stock using yfinance
-def get_current_price(stock_symbol):
-    try:
-        stock = yf.Ticker(stock_symbol)
-        current_price = stock.history(period="1d")['Close'].iloc[-1]
-        return current_price
-    except Exception as e:
-        print(f"Error fetching current price for {stock_symbol}: {e}")
-        return None
+from PriceSnapshot import price_snapshot
+from ZoneStore import TIMEFRAME_LABELS, ZONE_DB
 
 # Function to fetch demand and supply zones from the database (handles both daily and hourly data)
-def fetch_zones_from_db(database_name, table_name, timeframe):
+def fetch_zones_from_db(timeframe, market='NASDAQ', database_name=ZONE_DB):
     # Connect to the SQLite database
     conn = sqlite3.connect(database_name)
     cursor = conn.cursor()
 
-    # Query to fetch demand and supply zone details (no need for timeframe filter)
-    query = f"""
+    # Query to fetch the active zones of one market and timeframe, served by the (zone_status, start_ts) index
+    query = """
     SELECT symbol, start_date, end_date, price_range_high, price_range_low
-    FROM { table_name }
-    WHERE zone_status = 'Active';
-    """ 
+    FROM zones
+    WHERE zone_status = 'Active' AND timeframe = ? AND market = ?;
+    """
 
     zones_data = []
     try:
         # Execute the query to fetch the zones
-        cursor.execute(query)
+        cursor.execute(query, (TIMEFRAME_LABELS[timeframe], market))
 
         # Fetch all results and store them
         rows = cursor.fetchall()
@@ -99,10 +90,10 @@ def insert_results_into_db(results, database_name):
 
 # Function to check which stocks have their current price within the range
 def check_stocks_in_range():
-    # Fetch active zones from the daily database (StockDZSZ.db) and hourly database (StockTest.db)
-    daily_zones = fetch_zones_from_db('../StockDZSZNDX.db', "demand_supply_zones", '1d')  # Daily data
-    # hourly_zones = fetch_zones_from_db('StockTest.db', "demand_supply_zones_1hr", '1hr')  # Hourly data
-    # hourly_2_zones = fetch_zones_from_db('StockTest.db', "demand_supply_zones", '2hr')  # Hourly data
+    # Fetch the active daily, hourly and 2-hour zones from the zones table
+    daily_zones = fetch_zones_from_db('1d')  # Daily data
+    # hourly_zones = fetch_zones_from_db('1hr')  # Hourly data
+    # hourly_2_zones = fetch_zones_from_db('2hr')  # Hourly data
 
     if not daily_zones :
         print("No active zones found in the database.")
@@ -114,13 +105,16 @@ def check_stocks_in_range():
     # Create a list to store stocks that are closest to the price range
     closest_stocks = []
 
+    # Fetch the price of every distinct symbol in one batched request
+    current_prices = price_snapshot.prices(zone['symbol'] for zone in zones_data)
+
     for zone in zones_data:
         symbol = zone['symbol']
         price_range_high = zone['price_range_high']
         price_range_low = zone['price_range_low']
 
         # Get current price of the stock
-        current_price = get_current_price(symbol)
+        current_price = current_prices.get(symbol)
 
         if current_price is None:
             print(f"Skipping {symbol} as current price couldn't be fetched.")
@@ -1,5 +1,8 @@
-import sqlite3
 import yfinance as yf
+from ZoneEngine import zone_rows
+from ZoneStore import NSE_1H_SOURCE, ZoneStore
+from CandleStore import yf_download_cached
+from ScanRunner import run_scan
 import pandas as pd
 
 # List of Nifty 50 stock symbols
@@ -24,187 +27,8 @@ nifty_200_symbols = [
 
 nifty_200_symbols = [i + ".NS" for i in nifty_200_symbols]
 
-# Connect to SQLite database
-conn = sqlite3.connect('../StockTest.db')
-cursor = conn.cursor()
-
-# Drop existing table and create a new one
-cursor.execute("DROP TABLE IF EXISTS demand_supply_zones_1hr;")
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS demand_supply_zones_1hr (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    symbol TEXT,
-    start_date TEXT,
-    end_date TEXT,
-    base_candles_count INTEGER,
-    zone_type TEXT,
-    zone_classification TEXT,
-    price_range_high REAL,
-    price_range_low REAL,
-    zone_status TEXT,
-    tested_date TEXT
-)
-""")
-conn.commit()
-
-# Clean the table before inserting new data
-cursor.execute("DELETE FROM demand_supply_zones_1hr;")
-
-def update_zone_status(stock_data, price_range_high, price_range_low, zone_type, start_date, end_date):
-    """
-    Determines the status of the zone (Active, Tested, or Violated) based on stock data.
-    Args:
-        stock_data: DataFrame containing historical stock data.
-        price_range_high: High value of the zone (supply zone or demand zone).
-        price_range_low: Low value of the zone (supply zone or demand zone).
-        zone_type: The type of zone ('Supply Zone' or 'Demand Zone').
-        start_date: The start date of the zone.
-        end_date: The end date of the zone.
-    Returns:
-        zone_status: One of "Active", "Tested", or "Violated".
-    """
-    tested_date = None
-    zone_status = "Active"  # Default to Active
-    
-    # Find the indices for the start_date and end_date
-    start_index = stock_data.index.get_loc(start_date)
-    end_index = stock_data.index.get_loc(end_date)
-    
-    # Get the candles immediately after the zone (next candles)
-    next_candles = stock_data.iloc[end_index + 1:]  # Next 2 or 3 candles after the zone
-
-    # Print the zone boundaries for debugging
-    print(f"Checking zone status from {start_date} to {end_date}. Zone Price range: High = {price_range_high}, Low = {price_range_low}")
-
-    for i in range(len(next_candles)):
-        current_high = next_candles['High'].iloc[i]
-        current_low = next_candles['Low'].iloc[i]
-        current_close = next_candles['Close'].iloc[i]
-
-        # Print the current price levels for debugging
-        print(f"Checking next candle at index {i}. Current High: {current_high}, Current Low: {current_low}, Current Close: {current_close}")
-
-        # Check if the price violates the zone
-        if zone_type == "Supply Zone":
-            if current_close > price_range_high:
-                zone_status = "Violated"
-                print(f"Supply Zone violated: Close {current_close} > High {price_range_high}")
-                break
-            elif price_range_low <= current_high <= price_range_high or price_range_low <= current_low <= price_range_high:
-                zone_status = "Tested"
-                print(f"Supply Zone tested: Price in range [{price_range_low}, {price_range_high}]")
-                tested_date = next_candles.index[i].strftime('%Y-%m-%d %H:%M')  # Set the tested date when the zone is tested
-                break
-        elif zone_type == "Demand Zone":
-            if current_close < price_range_low:
-                zone_status = "Violated"
-                print(f"Demand Zone violated: Close {current_close} < Low {price_range_low}")
-                break
-            elif price_range_low <= current_high <= price_range_high or price_range_low <= current_low <= price_range_high:
-                zone_status = "Tested"
-                tested_date = next_candles.index[i].strftime('%Y-%m-%d %H:%M')  # Set the tested date when the zone is tested
-                print(f"Demand Zone tested: Price in range [{price_range_low}, {price_range_high}]")
-                break
-    return zone_status, tested_date
-
-def calculate_zone_price_range(classified_candles, stock_data, zone_type, start_date, end_date):
-    start_candle = classified_candles[start_date]
-    start_index = stock_data.index.get_loc(start_date)
-    end_index = stock_data.index.get_loc(end_date)
-
-    base_candles = [
-        classified_candles[stock_data.index[i].strftime('%Y-%m-%d %H:%M')] 
-        for i in range(start_index + 1, end_index) 
-        if classified_candles[stock_data.index[i].strftime('%Y-%m-%d %H:%M')]["candle_type"] == "Base"
-    ]
-
-    combined_base_candle = combine_multiple_base_candles(base_candles)
-    
-    if combined_base_candle and combined_base_candle['open'] is None:
-        print(f"Warning: Invalid combined base candle for {start_date} to {end_date}. Returning None.")
-        return None  # Or return default value
-    
-    if zone_type == 'DBD':  # Double Bottom
-        highest_wick = round(combined_base_candle['high'], 2)
-        lowest_body = round(combined_base_candle["lowest_body"], 2)
-        return (start_date, end_date, highest_wick, lowest_body)
-    
-    elif zone_type == 'RBR':  # Reversal Bottom
-        lowest_wick = round(combined_base_candle['low'], 2)
-        highest_body = round(combined_base_candle["highest_body"], 2)
-        return (start_date, end_date, lowest_wick, highest_body)
-    
-    elif zone_type == 'RBD':  # Reversal Double
-        highest_wick = round(max(combined_base_candle['high'], start_candle["high"]), 2)
-        lowest_body = round(combined_base_candle["lowest_body"], 2)
-        return (start_date, end_date, highest_wick, lowest_body)
-    
-    elif zone_type == 'DBR':  # Double Bottom Reversal
-        lowest_wick = round(min(combined_base_candle['low'], start_candle["low"]), 2)
-        highest_body = round(combined_base_candle["highest_body"], 2)
-        return (start_date, end_date, lowest_wick, highest_body)
-    
-    else:
-        return None
-
-
-
-def combine_multiple_base_candles(candles):
-    if not candles:
-        return {
-            'open': None,
-            'close': None,
-            'high': None,
-            'low': None,
-            'color': None,
-            'lowest_body': None,
-            'highest_body': None,
-            'combined': False
-        }
-
-    new_high = candles[0]['high']
-    new_low = candles[0]['low']
-    new_open = candles[0]['open']
-    new_close = candles[0]['close']
-    new_color = candles[0]['color']
-    
-    lowest_body = min(new_open, new_close)
-    highest_body = max(new_open, new_close)
-
-    for candle in candles[1:]:
-        new_high = max(new_high, candle['high'])
-        new_low = min(new_low, candle['low'])
-
-        if candle['color'] == 'g':
-            candle_low_body = candle['open']
-            candle_high_body = candle['close']
-        elif candle['color'] == 'r':
-            candle_low_body = candle['close']
-            candle_high_body = candle['open']
-        else:
-            candle_low_body = min(candle['open'], candle['close'])
-            candle_high_body = max(candle['open'], candle['close'])
-
-        lowest_body = min(lowest_body, candle_low_body)
-        highest_body = max(highest_body, candle_high_body)
-
-        if new_close > new_open:
-            new_color = 'g'
-        elif new_close < new_open:
-            new_color = 'r'
-        else:
-            new_color = None
-
-    return {
-        'open': new_open,
-        'close': new_close,
-        'high': new_high,
-        'low': new_low,
-        'color': new_color,
-        'lowest_body': lowest_body,
-        'highest_body': highest_body,
-        'combined': True
-    }
+# All zones go to the shared zones table; a rescan upserts instead of rebuilding it
+zone_store = ZoneStore()
 
 def is_last_long_candle_valid(zone_start_index, zone_end_index, stock_data, long_candle_threshold):
     # Initialize variable to store the last long candle
@@ -241,128 +65,32 @@ def is_last_long_candle_valid(zone_start_index, zone_end_index, stock_data, long
 def analyze_zones(stock_symbol):
     try:
         # Download the stock data with 1-hour intervals for the last 3 months
-        stock_data = yf.download(stock_symbol, period="1mo", interval="1h")
+        stock_data = yf_download_cached(stock_symbol, period="1mo", interval="1h")
         # stock_data = merge_to_2_hour_candles(stock_data1)
         # If no data is returned, skip this symbol
         if stock_data.empty:
             print(f"Warning: No data found for {stock_symbol}. Skipping.")
             return []
 
-        # Calculate candle sizes and round them to 1 decimal
-        candle_sizes = [abs(stock_data['Close'][i] - stock_data['Close'][i-1]) for i in range(1, len(stock_data))]
-        rounded_candle_sizes = [round(size, 1) for size in candle_sizes]
-        
-        # Calculate average candle size
-        avg_candle_size = round(sum(rounded_candle_sizes) / len(rounded_candle_sizes), 1)
-        long_candle_threshold = avg_candle_size * 1.5
-
-        # Track long candle dates
-        long_candle_dates = [
-            stock_data.index[i].strftime('%Y-%m-%d %H:%M') 
-            for i in range(1, len(stock_data))  
-            if rounded_candle_sizes[i-1] >= long_candle_threshold
-        ]
-
-        # Function to classify candles as long or base
-        def classify_candle_color(i):
-            if stock_data['Close'][i] > stock_data['Open'][i]:
-                return 'g'  # Green
-            elif stock_data['Close'][i] < stock_data['Open'][i]:
-                return 'r'  # Red
-            else:
-                return None  # Neutral
-
-        # Create a dictionary to classify candles
-        classified_candles = {}
-        for i in range(1, len(stock_data)):  # Start from 1
-            candle_color = classify_candle_color(i)
-            candle_type = "Long" if rounded_candle_sizes[i-1] >= long_candle_threshold else "Base"
-            classified_candles[stock_data.index[i].strftime('%Y-%m-%d %H:%M')] = {
-                "close": round(stock_data['Close'][i], 1),
-                "candle_size": rounded_candle_sizes[i-1],
-                "candle_type": candle_type,
-                "color": candle_color,
-                "open": stock_data['Open'][i],
-                "high": stock_data['High'][i],
-                "low": stock_data['Low'][i],
-                "date": stock_data.index[i].strftime('%Y-%m-%d %H:%M')  # Explicitly add the date
-            }
+        # Find and classify every zone of the series in one vectorized pass
+        rows = zone_rows(stock_symbol, stock_data, '%Y-%m-%d %H:%M')
+        for row in rows:
+            print(f"Zone found for {stock_symbol}: {row[4]} from {row[1]} to {row[2]} "
+                f"Price Range: {row[6]} - {row[7]} Status: {row[8]}")
 
-        # Loop through long candle dates and analyze zones
-        for i in range(1, len(long_candle_dates)):
-            start_date = long_candle_dates[i - 1]
-            end_date = long_candle_dates[i]
-            
-            # Determine zone type and classification
-            first_candle_color = classified_candles[start_date]["color"]
-            second_candle_color = classified_candles[end_date]["color"]
-            # del_HL = abs(classified_candles[end_date]["high"] - classified_candles[end_date]["low"])
-            del_OC = abs(classified_candles[end_date]["open"] - classified_candles[end_date]["close"])
-            # wick = abs(del_HL-del_OC)
-            if first_candle_color == 'r' and second_candle_color == 'r':
-                zone_type = 'Supply Zone'  # Reversal Bottom
-                xa = min(classified_candles[end_date]["open"], classified_candles[end_date]["close"])
-                wick = classified_candles[end_date]["low"] - xa
-                zone_classification = 'DBD'
-            elif first_candle_color == 'g' and second_candle_color == 'g':
-                zone_type = 'Demand Zone'  # Reversal Double
-                zone_classification = 'RBR'
-                xa = max(classified_candles[end_date]["open"], classified_candles[end_date]["close"])
-                wick = classified_candles[end_date]["high"] - xa
-            if first_candle_color == 'r' and second_candle_color == 'g':
-                zone_type = 'Demand Zone'  # Reversal Bottom
-                zone_classification = 'DBR'
-                xa = max(classified_candles[end_date]["open"], classified_candles[end_date]["close"])
-                wick = classified_candles[end_date]["high"] - xa
-            elif first_candle_color == 'g' and second_candle_color == 'r':
-                zone_type = 'Supply Zone'  # Reversal Double
-                zone_classification = 'RBD'
-                xa = min(classified_candles[end_date]["open"], classified_candles[end_date]["close"])
-                wick = classified_candles[end_date]["low"] - xa
-            else:
-                zone_type = 'Neutral'
-                zone_classification = 'None'
-                
-            start_index = stock_data.index.get_loc(start_date)
-            end_index = stock_data.index.get_loc(end_date)
-
-            base_candles = [
-                classified_candles[stock_data.index[i].strftime('%Y-%m-%d %H:%M')] 
-                for i in range(start_index + 1, end_index)  # Exclude long candles themselves
-                if classified_candles[stock_data.index[i].strftime('%Y-%m-%d %H:%M')]["candle_type"] == "Base"
-            ]
-            
-            # Count the base candles correctly
-            base_candle_count = len(base_candles)
-            
-
-            result = calculate_zone_price_range(
-                classified_candles, stock_data, zone_classification, start_date, end_date
-            )
-            if result is not None and len(base_candles) < 7 and len(base_candles) != 0:
-                # Calculate zone price range
-                start_date, end_date, price_range_high, price_range_low = result
-                # Determine zone status
-                zone_status, tested_date = update_zone_status(stock_data, price_range_high, price_range_low, zone_type, start_date, end_date)
-                if wick > (0.1*del_OC):
-                    zone_status = "Bad"
-                print(f"Zone found for {stock_symbol}: {zone_type} from {start_date} to {end_date} "
-                    f"Price Range: {price_range_high} - {price_range_low} Status: {zone_status}")
-                
-                cursor.execute("""
-                    INSERT INTO demand_supply_zones_1hr (symbol, start_date, end_date, base_candles_count, zone_type, 
-                    zone_classification, price_range_high, price_range_low, zone_status, tested_date)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?,?)""",
-                            (stock_symbol, start_date, end_date, base_candle_count, zone_type,
-                                zone_classification, price_range_high, price_range_low, zone_status, tested_date))
-                conn.commit()
+        # One upsert per symbol instead of one insert per zone
+        zone_store.upsert(rows, '1h', 'NSE')
+        return rows
 
     except Exception as e:
         print(f"Error processing {stock_symbol}: {str(e)}")
 
-# Analyze zones for all Nifty 50 symbols
-for symbol in nifty_200_symbols:
-    analyze_zones(symbol)
-
-# Close the database connection
-conn.close()
+if __name__ == "__main__":
+    if NSE_1H_SOURCE != 'yfinance':
+        # The NSE 1-hour zones come from DZSZ4's Fyers series; a second set would compete with them
+        print(f"NSE 1-hour zones are written by DZSZ4 (NSE_1H_SOURCE = '{NSE_1H_SOURCE}'). Skipping.")
+    else:
+        # Download each symbol in this process and scan the downloaded series on all cores
+        series = ((symbol, yf_download_cached(symbol, period="1mo", interval="1h")) for symbol in nifty_200_symbols)
+        specs = [{'timeframe': '1h', 'market': 'NSE', 'date_format': '%Y-%m-%d %H:%M'}]
+        run_scan(series, specs, zone_store.db_path)
@@ -1,6 +1,7 @@
-import sqlite3
 import yfinance as yf
 import pandas as pd
+from Indicators import EmaService
+from ZoneStore import ZoneStore
 
 # List of Nifty 200 stock symbols (already provided)
 nifty_200_symbols = [
@@ -32,30 +33,8 @@ nifty_200_symbols = [
 # Append ".NS" to each symbol for Yahoo Finance
 nifty_200_symbols = [i + ".NS" for i in nifty_200_symbols]
 
-# Connect to SQLite database
-conn = sqlite3.connect('StockTest.db')
-cursor = conn.cursor()
-
-# Drop existing table and create a new one
-cursor.execute("DROP TABLE IF EXISTS demand_supply_zones;")
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS demand_supply_zones (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    symbol TEXT,
-    start_date TEXT,
-    end_date TEXT,
-    base_candles_count INTEGER,
-    zone_type TEXT,
-    zone_classification TEXT,
-    price_range_high REAL,
-    price_range_low REAL,
-    zone_status TEXT
-)
-""")
-conn.commit()
-
-# Clean the table before inserting new data
-cursor.execute("DELETE FROM demand_supply_zones;")
+# Zones of this experimental EMA scan stay in their own store next to the script
+zone_store = ZoneStore('StockTest.db')
 
 # Function to combine base candles
 def combine_multiple_base_candles(candles):
@@ -154,18 +133,16 @@ def fetch_stock_data(symbol):
         print(f"Error fetching data for {symbol}: {e}")
         return None
 
-# Calculate 20-day EMA
-def calculate_ema(symbol):
+# Calculate the 20-day EMA of every symbol: one batched download, updated from the stored EMAs
+def calculate_ema(symbols):
     try:
-        stock_data = yf.download(symbol, period="1mo", interval="1d")
-        stock_data['EMA20'] = stock_data['Close'].ewm(span=20, adjust=False).mean()
-        return stock_data
+        return EmaService(spans=(20,)).latest(symbols, span=20)
     except Exception as e:
-        print(f"Error fetching EMA for {symbol}: {e}")
-        return None
+        print(f"Error fetching EMA: {e}")
+        return {}
 
 # Function to classify candles and calculate demand/supply zones
-def classify_candles_and_calculate_zones(stock_data, symbol, ema_data):
+def classify_candles_and_calculate_zones(stock_data, symbol, ema20):
     classified_candles = {}
     
     # Assuming stock_data is in 1-hour interval, but EMA is daily
@@ -188,6 +165,7 @@ def classify_candles_and_calculate_zones(stock_data, symbol, ema_data):
         }
 
     # Calculate zones and compare with EMA
+    rows = []
     for i in range(len(stock_data) - 1):
         current_time = stock_data.index[i]
         next_time = stock_data.index[i + 1]
@@ -200,25 +178,26 @@ def classify_candles_and_calculate_zones(stock_data, symbol, ema_data):
             zone_status = "Active"
             
             # Compare with EMA to check if zone is violated
-            if classified_zone == 'DBD' and high > ema_data['EMA20'].iloc[-1]:
+            if classified_zone == 'DBD' and high > ema20:
                 zone_status = "Violated"
-            elif classified_zone == 'RBR' and low < ema_data['EMA20'].iloc[-1]:
+            elif classified_zone == 'RBR' and low < ema20:
                 zone_status = "Violated"
-            if classified_zone == 'RBD' and high > ema_data['EMA20'].iloc[-1]:
+            if classified_zone == 'RBD' and high > ema20:
                 zone_status = "Violated"
-            elif classified_zone == 'DBR' and low < ema_data['EMA20'].iloc[-1]:
+            elif classified_zone == 'DBR' and low < ema20:
                 zone_status = "Violated"
             
-            # Insert into database
-            cursor.execute("""
-            INSERT INTO demand_supply_zones (symbol, start_date, end_date, base_candles_count, zone_type, zone_classification, price_range_high, price_range_low, zone_status)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (symbol, start_date, end_date, 1, classified_zone, classified_zone, high, low, zone_status))
-            conn.commit()
+            rows.append((symbol, start_date, end_date, 1, classified_zone, classified_zone, high, low, zone_status, None))
         else:
             print(f"No valid price range for {symbol} between {current_time} and {next_time}.")
+
+    # Upsert the symbol's zones in one transaction
+    zone_store.upsert(rows, '1h', 'NSE')
     print(stock_data)
 
+# Latest daily EMA20 of every symbol, used to validate its zones
+ema20_values = calculate_ema(nifty_200_symbols)
+
 # Main loop to process each stock symbol
 for symbol in nifty_200_symbols:
     print(f"Processing {symbol}...")
@@ -227,15 +206,13 @@ for symbol in nifty_200_symbols:
     stock_data = fetch_stock_data(symbol)
     
     if stock_data is not None:
-        # Fetch EMA data (for validation)
-        ema_data = calculate_ema(symbol)
+        # EMA for validation
+        ema20 = ema20_values.get(symbol)
         
-        if ema_data is not None:
-            classify_candles_and_calculate_zones(stock_data, symbol, ema_data)
+        if ema20 is not None:
+            classify_candles_and_calculate_zones(stock_data, symbol, ema20)
         else:
             print(f"Could not fetch EMA data for {symbol}. Skipping zone calculation.")
     
-# Close the database connection
-conn.close()
 print("Processing complete.")
 
@@ -1,12 +1,129 @@
 import yfinance as yf
+import numpy as np
 import pandas as pd
 import sqlite3
-from fyers_apiv3 import fyersModel
 import configparser
 import datetime
 from dateutil.relativedelta import relativedelta
 import time
 import os
+from CandleStore import CandleStore, cached_history_bulk
+from FyersData import fetch_history
+from FyersSession import get_fyers_session
+from Patterns import candle_features, detect_patterns
+from SymbolMaster import to_fyers_symbol
+
+# Window of 15-minute candles the engulfing candles are looked for in
+ENGULFING_WINDOW_END = datetime.date(2025, 1, 24)
+ENGULFING_WINDOW_DAYS = 30
+
+
+# Function to get the epoch range of the 15-minute candles to scan
+def engulfing_window():
+    month1bef = ENGULFING_WINDOW_END - relativedelta(days=ENGULFING_WINDOW_DAYS)
+    return int(time.mktime(month1bef.timetuple())), int(time.mktime(ENGULFING_WINDOW_END.timetuple()))
+
+
+# Identify Bullish and Bearish Engulfing patterns without adding columns to data
+def identify_engulfing_patterns(data, engulf_percentage=0.7, symbol_column='symbol', features=None):
+    """
+    Returns:
+        Dictionary with Bullish_Engulfing and Bearish_Engulfing boolean arrays aligned with the
+        rows of data, or None if the patterns could not be computed. In a stacked panel of
+        tickers the previous candle is taken within each ticker.
+    """
+    try:
+        patterns = detect_patterns(data, ['bullish_engulfing', 'bearish_engulfing'], symbol_column,
+                                   engulf_percentage, features)
+    except Exception as e:
+        print(f"Error identifying engulfing patterns: {e}")
+        return None  # Return None if there's an error
+    return {'Bullish_Engulfing': patterns['bullish_engulfing'], 'Bearish_Engulfing': patterns['bearish_engulfing']}
+
+
+# Function to match the engulfing candles of many tickers to the zones they formed in, in one pass
+def filter_engulfing_candles_in_zone(data, zones, symbol_column='symbol', patterns=None):
+    """
+    Joins candles to zones on time and price at once instead of filtering the whole frame per zone.
+    A bullish engulfing candle matches a Demand Zone (price_range_low > price_range_high) and a
+    bearish one a Supply Zone when the candle closes after the zone's end_date, its Low is at or
+    above price_range_low, its High at or below price_range_high and its wick against the move is
+    under 20% of its range.
+    Args:
+        data: Candles with a DatetimeIndex. With several tickers stacked, symbol_column names
+            the ticker of each candle.
+        zones: Zones with price_range_low, price_range_high and end_date, plus symbol_column when
+            data has it.
+        patterns: Output of identify_engulfing_patterns; computed from data when not given.
+    Returns:
+        DataFrame with one row per (zone, candle) match, in zone order and then candle time: the
+        candle's columns and wick features, the pattern and the zone's type, range and end_date.
+    """
+    columns = [symbol_column, 'Datetime', 'Open', 'High', 'Low', 'Close', 'Upper_Wick', 'Lower_Wick',
+               'Candle_Range', 'pattern', 'zone_type', 'price_range_low', 'price_range_high', 'end_date']
+    if data is None or data.empty or zones is None or zones.empty:
+        return pd.DataFrame(columns=columns)
+
+    # Wick features of every candle, computed once and shared with the pattern detection
+    features = candle_features(data, symbol_column)
+    patterns = patterns if patterns is not None else identify_engulfing_patterns(data, features=features)
+    if patterns is None:
+        return pd.DataFrame(columns=columns)
+    open_, high, low, close = features['open'], features['high'], features['low'], features['close']
+    upper_wick, lower_wick, candle_range = features['upper_wick'], features['lower_wick'], features['candle_range']
+    with np.errstate(divide='ignore', invalid='ignore'):
+        bullish = patterns['Bullish_Engulfing'] & (upper_wick / candle_range < 0.2)
+        bearish = patterns['Bearish_Engulfing'] & (lower_wick / candle_range < 0.2)
+
+    # Only the candidate candles take part in the join, sorted by (ticker, time)
+    has_symbol = symbol_column in data.columns
+    data_symbols = data[symbol_column].to_numpy() if has_symbol else np.zeros(len(data), dtype=object)
+    zone_symbols = zones[symbol_column].to_numpy() if has_symbol else np.zeros(len(zones), dtype=object)
+    codes, symbol_names = pd.factorize(np.concatenate([data_symbols, zone_symbols]))
+    data_codes, zone_codes = codes[:len(data)], codes[len(data):]
+
+    seconds = pd.DatetimeIndex(data.index).as_unit('s').asi8
+    candidates = np.flatnonzero(bullish | bearish)
+    candidates = candidates[np.lexsort((seconds[candidates], data_codes[candidates]))]
+    # One sorted int64 key per candle: ticker code in the high bits, epoch seconds in the low ones
+    candle_key = data_codes[candidates].astype(np.int64) * 2**34 + seconds[candidates]
+
+    zone_low = zones['price_range_low'].to_numpy(dtype=float)
+    zone_high = zones['price_range_high'].to_numpy(dtype=float)
+    is_demand = zone_low > zone_high
+    zone_end = pd.DatetimeIndex(pd.to_datetime(zones['end_date']))
+    zone_codes = zone_codes.astype(np.int64)
+
+    # Each zone reaches from the first candle after its end_date to the last candle of its ticker
+    first = np.searchsorted(candle_key, zone_codes * 2**34 + zone_end.as_unit('s').asi8, side='right')
+    last = np.searchsorted(candle_key, (zone_codes + 1) * 2**34, side='left')
+    # A zone without an end date matches nothing, as no candle is after it
+    first = np.where(zone_end.isna(), last, first)
+    counts = np.maximum(last - first, 0)
+    pair_zone = np.repeat(np.arange(len(zones)), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    pair_candle = candidates[np.repeat(first, counts) + offsets]
+
+    match = ((low[pair_candle] >= zone_low[pair_zone]) & (high[pair_candle] <= zone_high[pair_zone])
+             & np.where(is_demand[pair_zone], bullish[pair_candle], bearish[pair_candle]))
+    pair_zone, pair_candle = pair_zone[match], pair_candle[match]
+
+    return pd.DataFrame({
+        symbol_column: symbol_names[data_codes[pair_candle]] if has_symbol else None,
+        'Datetime': data.index[pair_candle],
+        'Open': open_[pair_candle],
+        'High': high[pair_candle],
+        'Low': low[pair_candle],
+        'Close': close[pair_candle],
+        'Upper_Wick': upper_wick[pair_candle],
+        'Lower_Wick': lower_wick[pair_candle],
+        'Candle_Range': candle_range[pair_candle],
+        'pattern': np.where(is_demand[pair_zone], 'Bullish Engulfing', 'Bearish Engulfing'),
+        'zone_type': np.where(is_demand[pair_zone], 'Demand Zone', 'Supply Zone'),
+        'price_range_low': zone_low[pair_zone],
+        'price_range_high': zone_high[pair_zone],
+        'end_date': zones['end_date'].to_numpy()[pair_zone],
+    }, columns=columns)
 
 def process_stock_data_for_Engulfing_Candle(ticker, db_path, table_name):
     # Fetch zones from the database, ordered by 'nearest_diff'
@@ -15,10 +132,10 @@ def process_stock_data_for_Engulfing_Candle(ticker, db_path, table_name):
         query = f"""
         SELECT price_range_low, price_range_high, end_date, nearest_diff
         FROM {table_name}
-        WHERE symbol = '{ticker}'
+        WHERE symbol = ?
         ORDER BY nearest_diff ASC
         """
-        zones = pd.read_sql(query, conn)
+        zones = pd.read_sql(query, conn, params=(ticker,))
         conn.close()
         return zones
 
@@ -31,61 +148,22 @@ def process_stock_data_for_Engulfing_Candle(ticker, db_path, table_name):
 
     # Download stock data for 15-minute interval
     def download_stock_data(ticker, period="1mo", interval="15m"):
-        confile = r'config.ini'
-        config = configparser.ConfigParser()
-
-        if not os.path.exists(confile):
-            print(f"Config file not found: {confile}")
+        # Shared Fyers session: the config is parsed once and connections are kept alive across tickers
+        fyers = get_fyers_session(r'config.ini')
+        if fyers is None:
             return None
-        
-        config.read(confile)  # Read the configuration file
-
-        if 'FyersAPI' not in config:
-            print("FyersAPI section not found in config file.")
-            return None
-
-        client_id = config['FyersAPI']['client_id']
-        access_token = config['FyersAPI']['access_token']
 
-        fyers = fyersModel.FyersModel(client_id=client_id, is_async=False, token=access_token, log_path="")
-
-        today = datetime.date(2025, 1, 24)
-        month1bef = today - relativedelta(days=30)
-
-        range_from_epoch = int(time.mktime(month1bef.timetuple()))
-        range_to_epoch = int(time.mktime(today.timetuple()))
-
-        data = {
-            "symbol": ticker,
-            "resolution": "15",  # For 15-minute interval
-            "date_format": "0",
-            "range_from": range_from_epoch,
-            "range_to": range_to_epoch,
-            "cont_flag": "1"
-        }
-
-        response = fyers.history(data=data)
-        candles_data = response.get('candles', [])
-        if not candles_data:
-            print(f"No candles data found for symbol: {ticker}")
-            return None
+        range_from_epoch, range_to_epoch = engulfing_window()
 
-        converted_data = []
-        for candle in candles_data:
-            date = datetime.datetime.fromtimestamp(candle[0]).strftime('%Y-%m-%d %H:%M:%S')
-            open_price = candle[1]
-            high_price = candle[2]
-            low_price = candle[3]
-            close_price = candle[4]
-            volume = candle[5]
-            converted_data.append([date, open_price, high_price, low_price, close_price, volume])
+        # Serve the window from the candle store, fetching only the bars it does not have yet
+        fifteen_min_df = CandleStore().get_candles(
+            ticker, "15", range_from_epoch, range_to_epoch,
+            lambda symbol, range_from, range_to: fetch_history(fyers, symbol, "15", range_from, range_to),
+            tz='Asia/Kolkata'
+        )
 
-        fifteen_min_df = pd.DataFrame(converted_data, columns=['Date', 'Open', 'High', 'Low', 'Close', 'Volume'])
-
-        # Convert 'Date' to datetime
-        fifteen_min_df['Date'] = pd.to_datetime(fifteen_min_df['Date'])
-
-        fifteen_min_df.set_index('Date', inplace=True)
+        # Zone dates are naive local times, so drop the timezone
+        fifteen_min_df.index = fifteen_min_df.index.tz_localize(None)
 
         if fifteen_min_df.empty:
             print(f"No valid stock data returned for {ticker}.")
@@ -93,71 +171,6 @@ def process_stock_data_for_Engulfing_Candle(ticker, db_path, table_name):
         
         return fifteen_min_df
 
-    # Identify Bullish and Bearish Engulfing patterns
-    def identify_engulfing_patterns(data, engulf_percentage=0.7):
-        try:
-            data['Open_Previous'] = data['Open'].shift(1)
-            data['Close_Previous'] = data['Close'].shift(1)
-            previous_candle_range = abs(data['Close_Previous'] - data['Open_Previous'])
-
-            # Bullish Engulfing pattern
-            data['Bullish_Engulfing'] = (
-                (data['Open'] <= data['Close_Previous']) &
-                (data['Open'] < data['Open_Previous']) &
-                (data['Close'] > data['Open_Previous']) &
-                (abs(data['Close'] - data['Open']) >= engulf_percentage * previous_candle_range)
-            )
-
-            # Bearish Engulfing pattern
-            data['Bearish_Engulfing'] = (
-                (data['Open'] >= data['Close_Previous']) &
-                (data['Open'] > data['Open_Previous']) &
-                (data['Close'] < data['Open_Previous']) &
-                (abs(data['Close'] - data['Open']) >= engulf_percentage * previous_candle_range)
-            )
-
-        except Exception as e:
-            print(f"Error identifying engulfing patterns: {e}")
-            return None  # Return None if there's an error
-
-    # Filter Bullish and Bearish Engulfing Candles inside the Demand and Supply zones
-    def filter_engulfing_candles_in_zone(data, zones):
-        filtered_bullish = []
-        filtered_bearish = []
-        
-        for index, zone in zones.iterrows():
-            zone_low = zone['price_range_low']
-            zone_high = zone['price_range_high']
-            zone_type = "Demand Zone" if zone_low > zone_high else "Supply Zone"
-            zone_end_date = pd.to_datetime(zone['end_date'])
-            
-            data['Upper_Wick'] = data['High'] - data[['Close', 'Open']].max(axis=1)
-            data['Lower_Wick'] = data[['Close', 'Open']].min(axis=1) - data['Low']
-            data['Candle_Range'] = data['High'] - data['Low']
-
-            # Only consider candles that are after the zone's end_date
-            data_after_zone_end = data[data.index > zone_end_date]
-            
-            if zone_type == "Demand Zone":
-                bullish_in_zone = data_after_zone_end[(data_after_zone_end['Bullish_Engulfing']) & 
-                                                       (data_after_zone_end['Low'] >= zone_low) &
-                                                       (data_after_zone_end['High'] <= zone_high) &
-                                                       (data_after_zone_end['Upper_Wick'] / data_after_zone_end['Candle_Range'] < 0.2)]
-                filtered_bullish.append(bullish_in_zone)
-
-            if zone_type == "Supply Zone":
-                bearish_in_zone = data_after_zone_end[(data_after_zone_end['Bearish_Engulfing']) & 
-                                                       (data_after_zone_end['Low'] >= zone_low) &
-                                                       (data_after_zone_end['High'] <= zone_high) &
-                                                       (data_after_zone_end['Lower_Wick'] / data_after_zone_end['Candle_Range'] < 0.2)]
-                filtered_bearish.append(bearish_in_zone)
-        
-        # Combine filtered results
-        bullish_in_zone_combined = pd.concat(filtered_bullish) if filtered_bullish else pd.DataFrame()
-        bearish_in_zone_combined = pd.concat(filtered_bearish) if filtered_bearish else pd.DataFrame()
-
-        return bullish_in_zone_combined, bearish_in_zone_combined
-
     # Main process
     ticker2 = convert_to_nse_symbol(ticker)
     data = download_stock_data(ticker2)  # This fetches 15-minute data
@@ -167,8 +180,8 @@ def process_stock_data_for_Engulfing_Candle(ticker, db_path, table_name):
         return
 
     zones = fetch_zones_from_db(ticker, db_path, table_name)  # Fetching zones for '1hr' timeframe
-    identify_engulfing_patterns(data, engulf_percentage=0.7)
-    bullish_in_zone, bearish_in_zone = filter_engulfing_candles_in_zone(data, zones)
+    matches = filter_engulfing_candles_in_zone(data, zones)
+    bearish_in_zone = matches[matches['pattern'] == 'Bearish Engulfing']
 
     # Print the Bearish Engulfing Candles inside Supply Zones with zone range
     print(f"\nBearish Engulfing Candles Inside Supply Zones for {ticker}:")
@@ -177,25 +190,82 @@ def process_stock_data_for_Engulfing_Candle(ticker, db_path, table_name):
     else:
         print("No bearish engulfing candles found inside supply zones.")
 
-# Example usage for a list of Nifty 200 symbols
-# nifty_200_symbols = [
-#     "ABB", "ABFRL", "ABCAPITAL", "ADANIENT", "ADANIGREEN", "ADANIPOWER", "ADANIPORTS", "ALKE", "APOLLOHOSP",
-#     # ... (same list as before)
-# ]
+# Function to find the engulfing candles inside the zones of many tickers at once
+def scan_engulfing_candles(symbols, db_path, table_name, confile='config.ini'):
+    """
+    Batch mode of process_stock_data_for_Engulfing_Candle: the zones of every ticker come from
+    one query, the 15-minute candles are fetched concurrently through the candle store, and the
+    patterns and the zone join run once over the stacked panel of all tickers.
+    Args:
+        symbols: yfinance tickers such as 'SBIN.NS'; duplicates are scanned once.
+    Returns:
+        DataFrame of every engulfing candle inside a zone, see filter_engulfing_candles_in_zone.
+    """
+    symbols = list(dict.fromkeys(symbols))
+    if not symbols:
+        return filter_engulfing_candles_in_zone(None, None)
+
+    conn = sqlite3.connect(db_path)
+    query = f"""
+    SELECT symbol, price_range_low, price_range_high, end_date, nearest_diff
+    FROM {table_name}
+    WHERE symbol IN ({', '.join('?' * len(symbols))})
+    ORDER BY nearest_diff ASC
+    """
+    zones = pd.read_sql(query, conn, params=symbols)
+    conn.close()
+
+    range_from_epoch, range_to_epoch = engulfing_window()
+    fyers_symbols = {to_fyers_symbol(symbol): symbol for symbol in symbols}
+    candles = cached_history_bulk(list(fyers_symbols), "15", range_from_epoch, range_to_epoch, confile=confile)
+
+    frames = []
+    for symbol in symbols:
+        df = candles.get(to_fyers_symbol(symbol))
+        if df is None or df.empty:
+            print(f"Skipping {symbol} due to missing or invalid data.")
+            continue
+        # Zone dates are naive local times, so drop the timezone
+        df = df.tz_localize(None) if df.index.tz is not None else df.copy()
+        df['symbol'] = symbol
+        frames.append(df)
+    if not frames:
+        return filter_engulfing_candles_in_zone(None, None)
+
+    data = pd.concat(frames)
+    matches = filter_engulfing_candles_in_zone(data, zones)
+
+    bearish_symbols = set(matches.loc[matches['pattern'] == 'Bearish Engulfing', 'symbol'])
+    for frame in frames:
+        symbol = frame['symbol'].iloc[0]
+        print(f"\nBearish Engulfing Candles Inside Supply Zones for {symbol}:")
+        if symbol in bearish_symbols:
+            print("Bearish engulfing candles found inside supply zones.")
+        else:
+            print("No bearish engulfing candles found inside supply zones.")
+    return matches
+
+
+if __name__ == "__main__":
+    # Example usage for a list of Nifty 200 symbols
+    # nifty_200_symbols = [
+    #     "ABB", "ABFRL", "ABCAPITAL", "ADANIENT", "ADANIGREEN", "ADANIPOWER", "ADANIPORTS", "ALKE", "APOLLOHOSP",
+    #     # ... (same list as before)
+    # ]
 
-# nifty_200_symbols = [i + ".NS" for i in nifty_200_symbols]
+    # nifty_200_symbols = [i + ".NS" for i in nifty_200_symbols]
 
-conn = sqlite3.connect("../StockDZSZ.db")
-query = f"""
-SELECT symbol
-FROM stock_price_results
-WHERE timeframe = '1hr'
-ORDER BY nearest_diff ASC
-"""
+    conn = sqlite3.connect("../StockDZSZ.db")
+    query = f"""
+    SELECT symbol
+    FROM stock_price_results
+    WHERE timeframe = '1hr'
+    ORDER BY nearest_diff ASC
+    """
 
-nifty_200_symbols = [row[0] for row in conn.execute(query).fetchall()]
+    nifty_200_symbols = [row[0] for row in conn.execute(query).fetchall()]
 
-for symbol in nifty_200_symbols:
-    process_stock_data_for_Engulfing_Candle(symbol, '../StockDZSZ.db', 'stock_price_results')
+    # One zone query, concurrent candle fetches and one pattern pass for every symbol
+    scan_engulfing_candles(nifty_200_symbols, '../StockDZSZ.db', 'stock_price_results')
 
-conn.close()
\ No newline at end of file
+    conn.close()
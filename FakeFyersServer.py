@@ -0,0 +1,164 @@
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+# Faults inject() accepts besides an HTTP status code
+TIMEOUT = 'timeout'
+HTML = 'html'
+EMPTY = 'empty'
+
+
+class FakeFyersServer:
+    """
+    Local stand-in for the Fyers data API, to exercise the retry, backoff and circuit breaker
+    paths without the real broker. It serves /data/history and /data/quotes with synthetic
+    candles and quotes, and answers with injected faults first:
+        an HTTP status code, e.g. 503 or 429, sent with a JSON error body;
+        TIMEOUT, which holds the response for `delay` seconds before answering normally;
+        HTML, a 200 response with an HTML page, as a gateway error page would be;
+        EMPTY, a 200 response with an empty body.
+    Point data_url in config.ini (or FyersSession's base_url) at url to use it.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, delay=2.0, bars=50):
+        self.delay = delay
+        self.bars = bars
+        self.faults = {}
+        self.requests = []
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/data"
+
+    @property
+    def host(self):
+        # Host key of the circuit breaker FyersSession uses for this server
+        return urlparse(self.url).netloc
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def inject(self, *faults, endpoint='history', symbol=None):
+        """
+        Queues faults for the next requests to an endpoint, one fault per request. Faults
+        for a symbol are used before the faults of the whole endpoint.
+        """
+        with self.lock:
+            self.faults.setdefault((endpoint, symbol), []).extend(faults)
+
+    def count(self, endpoint=None, symbol=None):
+        # Number of requests received, optionally only for one endpoint and symbol
+        with self.lock:
+            return sum(1 for request in self.requests
+                       if endpoint in (None, request[0]) and symbol in (None, request[1]))
+
+    # Function to take the next fault of a request, or None to answer normally
+    def _next_fault(self, endpoint, symbol):
+        with self.lock:
+            self.requests.append((endpoint, symbol))
+            for key in ((endpoint, symbol), (endpoint, None)):
+                if self.faults.get(key):
+                    return self.faults[key].pop(0)
+        return None
+
+    # Function to build the synthetic candles of a symbol from range_from on
+    def _candles(self, symbol, range_from, range_to):
+        rng = np.random.default_rng(sum(map(ord, symbol)))
+        close = 100 + np.cumsum(rng.normal(0, 1, self.bars))
+        open_ = np.r_[100.0, close[:-1]]
+        end = min(int(range_to), int(time.time())) // 60 * 60
+        timestamps = end - 60 * np.arange(self.bars)[::-1]
+        return [[int(ts), round(o, 2), round(max(o, c) + 0.3, 2), round(min(o, c) - 0.3, 2), round(c, 2), 1000]
+                for ts, o, c in zip(timestamps.tolist(), open_.tolist(), close.tolist()) if ts >= int(range_from)]
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                endpoint = url.path.rstrip('/').rsplit('/', 1)[-1]
+                params = {key: values[0] for key, values in parse_qs(url.query).items()}
+                symbol = params.get('symbol') or params.get('symbols')
+                fault = fake._next_fault(endpoint, symbol)
+
+                if isinstance(fault, int):
+                    self._send(fault, {'s': 'error', 'code': fault, 'message': f"Injected HTTP {fault}"})
+                    return
+                if fault == HTML:
+                    self._send(200, b'<html><body>Bad gateway</body></html>', 'text/html')
+                    return
+                if fault == EMPTY:
+                    self._send(200, b'', 'text/html')
+                    return
+                if fault == TIMEOUT:
+                    time.sleep(fake.delay)
+
+                if endpoint == 'history':
+                    candles = fake._candles(symbol, params.get('range_from', 0), params.get('range_to', time.time()))
+                    self._send(200, {'s': 'ok', 'candles': candles})
+                elif endpoint == 'quotes':
+                    quotes = [{'n': name, 's': 'ok', 'v': {'lp': fake._candles(name, 0, time.time())[-1][4]}}
+                              for name in symbol.split(',')]
+                    self._send(200, {'s': 'ok', 'd': quotes})
+                else:
+                    self._send(404, {'s': 'error', 'message': f"Unknown endpoint {endpoint}"})
+
+            def _send(self, status, body, content_type='application/json'):
+                if not isinstance(body, bytes):
+                    body = json.dumps(body).encode()
+                try:
+                    self.send_response(status)
+                    self.send_header('Content-Type', content_type)
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client gave up on a timed-out request
+                    pass
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a fake Fyers data API that injects failures.")
+    parser.add_argument('--port', type=int, default=8765, help="Port to listen on")
+    parser.add_argument('--fail', default='', help="Comma-separated faults for the first history requests, e.g. 503,timeout,html")
+    parser.add_argument('--delay', type=float, default=2.0, help="Seconds a 'timeout' fault holds the response")
+    args = parser.parse_args()
+
+    fake_server = FakeFyersServer(port=args.port, delay=args.delay)
+    fake_server.inject(*(int(fault) if fault.isdigit() else fault for fault in args.fail.split(',') if fault))
+    print(f"Fake Fyers data API on {fake_server.url}; set data_url in config.ini to it")
+    fake_server.start()
+    try:
+        fake_server.thread.join()
+    except KeyboardInterrupt:
+        fake_server.stop()
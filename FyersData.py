@@ -0,0 +1,203 @@
+import collections
+import contextlib
+import datetime
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+from dateutil.relativedelta import relativedelta
+
+from FyersSession import get_fyers_session
+from Resilience import RetryQueue
+from SymbolMaster import INVALID_SYMBOL_CODE
+
+# Fyers API v3 data limits: 10 requests per second and 200 per minute
+FYERS_RATE_LIMITS = ((10, 1.0), (200, 60.0))
+
+# Fyers returns epoch timestamps; NSE candles are shown in Indian Standard Time
+FYERS_TIMEZONE = 'Asia/Kolkata'
+PRICE_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+
+class SlidingWindow:
+    """
+    Thread-safe sliding-window limit: allows at most `rate` requests in any `per` seconds, and
+    makes callers wait for the oldest request to leave the window otherwise. Unlike a token
+    bucket, a full burst after an idle period cannot be followed by a refilled one within the
+    same window, so the stated limit holds over every window.
+    """
+
+    def __init__(self, rate, per=1.0):
+        self.rate = rate
+        self.per = per
+        self.times = collections.deque()
+        self.lock = threading.Lock()
+
+    # Function to forget the requests that left the window; the caller holds the lock
+    def _refill(self, now):
+        while self.times and self.times[0] <= now - self.per:
+            self.times.popleft()
+
+    # Function to get the seconds until the window has room; the caller holds the lock
+    def _wait(self, now):
+        if len(self.times) < self.rate:
+            return 0.0
+        return self.times[0] + self.per - now
+
+    # Function to record a request; the caller holds the lock
+    def _take(self, now):
+        self.times.append(now)
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                wait = self._wait(now)
+                if wait <= 0:
+                    self._take(now)
+                    return
+            time.sleep(wait)
+
+
+class RateLimiter:
+    """
+    Combines several sliding windows (for example per-second and per-minute limits); a request
+    may go ahead once every window has room for it. The request is recorded in all windows
+    together, so a request waiting on one window does not use up room in another.
+    """
+
+    def __init__(self, limits=FYERS_RATE_LIMITS):
+        self.buckets = [SlidingWindow(rate, per) for rate, per in limits]
+
+    def acquire(self):
+        while True:
+            with contextlib.ExitStack() as stack:
+                # Locks are always taken in window order, so concurrent callers cannot deadlock
+                for bucket in self.buckets:
+                    stack.enter_context(bucket.lock)
+                now = time.monotonic()
+                for bucket in self.buckets:
+                    bucket._refill(now)
+                # Wait for the slowest window before recording anything
+                wait = max(bucket._wait(now) for bucket in self.buckets)
+                if wait <= 0:
+                    for bucket in self.buckets:
+                        bucket._take(now)
+                    return
+            time.sleep(wait)
+
+
+# Function to get the shared Fyers client for the credentials in the config file
+def load_fyers_client(confile):
+    # One pooled session per config file, so every history call reuses its connections
+    return get_fyers_session(confile)
+
+
+# Function to get the epoch range from `months` months ago until now
+def month_range(months=1):
+    today = datetime.datetime.now()
+    month_before = today - relativedelta(months=months)
+    return int(time.mktime(month_before.timetuple())), int(time.mktime(today.timetuple()))
+
+
+# Function to convert the candles of a Fyers history response to a DataFrame
+def candles_to_dataframe(candles_data, tz=FYERS_TIMEZONE):
+    """
+    Converts the [epoch, open, high, low, close, volume] rows of a history response in one
+    step, without formatting and re-parsing a date string per candle.
+    Args:
+        candles_data: The 'candles' list of a Fyers history response.
+        tz: Timezone of the returned index.
+    Returns:
+        DataFrame with Open, High, Low, Close and Volume columns and a tz-aware Date index.
+    """
+    candles = np.asarray(candles_data, dtype=float).reshape(-1, 6)
+    index = pd.to_datetime(candles[:, 0].astype(np.int64), unit='s', utc=True).tz_convert(tz)
+    return pd.DataFrame(candles[:, 1:], index=pd.DatetimeIndex(index, name='Date'), columns=PRICE_COLUMNS)
+
+
+# Function to fetch the history of one symbol
+def fetch_history(fyers, symbol, resolution, range_from, range_to, limiter=None, symbol_master=None):
+    data = {
+        "symbol": symbol,
+        "resolution": resolution,
+        "date_format": "0",  # 0 means using epoch timestamps
+        "range_from": range_from,
+        "range_to": range_to,
+        "cont_flag": "1"
+    }
+
+    if limiter is not None:
+        limiter.acquire()
+    response = fyers.history(data=data)
+
+    # Remember symbols Fyers does not know so later runs skip them
+    if response.get('code') == INVALID_SYMBOL_CODE and symbol_master is not None:
+        symbol_master.mark_invalid(symbol, response.get('message', ''))
+
+    candles_data = response.get('candles', [])
+    if not candles_data:
+        print(f"No candles data found for symbol: {symbol} ({response.get('message', 'empty response')})")
+        return None
+    return candles_to_dataframe(candles_data)
+
+
+# Function to fetch the history of many symbols concurrently within the broker's rate limits
+def fetch_history_bulk(symbols, resolution, range_from, range_to, confile='config.ini',
+                       max_workers=8, limiter=None, symbol_master=None):
+    """
+    Fetches the same candle window for every symbol from a bounded thread pool.
+    Args:
+        symbols: Fyers symbols, e.g. 'NSE:SBIN-EQ'.
+        resolution: Fyers resolution string, e.g. '120' or 'D'.
+        range_from, range_to: Epoch timestamps of the window. range_from may also be a dict
+            of symbol -> epoch to start each symbol somewhere else.
+        confile: Config file with the FyersAPI credentials.
+        max_workers: Number of requests in flight at once.
+        limiter: RateLimiter shared by all workers; defaults to the Fyers data limits.
+        symbol_master: SymbolMaster that records the symbols Fyers rejects as invalid.
+    Returns:
+        Dictionary of symbol -> DataFrame. Symbols that fail after their retries are retried
+        once more at the end; symbols without data or still failing are left out.
+    """
+    fyers = load_fyers_client(confile)
+    if fyers is None:
+        return {}
+    if limiter is None:
+        limiter = RateLimiter()
+
+    results = {}
+    retry_queue = RetryQueue()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(
+                fetch_history, fyers, symbol, resolution,
+                range_from[symbol] if isinstance(range_from, dict) else range_from, range_to, limiter,
+                symbol_master
+            ): symbol
+            for symbol in dict.fromkeys(symbols)
+        }
+        for future in as_completed(futures):
+            symbol = futures[future]
+            try:
+                df = future.result()
+            except Exception as e:
+                # Still failing after its retries: queue it instead of dropping it from the scan
+                print(f"Error fetching history for {symbol}: {str(e)}")
+                retry_queue.add(
+                    symbol, fetch_history, fyers, symbol, resolution,
+                    range_from[symbol] if isinstance(range_from, dict) else range_from, range_to, limiter,
+                    symbol_master
+                )
+                continue
+            if df is not None and not df.empty:
+                results[symbol] = df
+
+    # Give the failed symbols another go once the pool is done
+    for symbol, df in retry_queue.drain().items():
+        if df is not None and not df.empty:
+            results[symbol] = df
+    return results
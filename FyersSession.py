@@ -0,0 +1,131 @@
+import configparser
+import os
+import threading
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from Resilience import call_with_retry
+
+# Fyers API v3 data endpoints
+FYERS_DATA_URL = 'https://api-t1.fyers.in/data'
+
+_config_cache = {}
+_sessions = {}
+_lock = threading.Lock()
+
+
+# Function to read the FyersAPI credentials once per config file
+def load_fyers_config(confile='config.ini'):
+    """
+    Parses the FyersAPI section of the config file the first time it is asked for and returns
+    the cached values afterwards. Returns None when the file or section is missing.
+    """
+    with _lock:
+        if confile in _config_cache:
+            return _config_cache[confile]
+
+        # Verify the config file exists
+        if not os.path.exists(confile):
+            print(f"Config file not found: {confile}")
+            return None
+
+        config = configparser.ConfigParser()
+        config.read(confile)
+
+        # Check if 'FyersAPI' section exists
+        if 'FyersAPI' not in config:
+            print("FyersAPI section not found in config file.")
+            return None
+
+        _config_cache[confile] = dict(config['FyersAPI'])
+        return _config_cache[confile]
+
+
+class FyersSession:
+    """
+    Minimal Fyers data client with the same history() and quotes() calls as FyersModel, sent
+    over one pooled requests.Session so keep-alive connections and TLS sessions are reused
+    across symbols and threads.
+    """
+
+    def __init__(self, client_id, access_token, base_url=FYERS_DATA_URL, pool_size=16, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.host = urlparse(self.base_url).netloc
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({
+            'Authorization': f"{client_id}:{access_token}",
+            'Content-Type': 'application/json',
+            'version': '3',
+        })
+
+    def _request(self, endpoint, params):
+        response = self.session.get(f"{self.base_url}/{endpoint}", params=params, timeout=self.timeout)
+        # Throttling and server errors are transient; other errors come back as a JSON message
+        if response.status_code == 429 or response.status_code >= 500:
+            response.raise_for_status()
+        return response.json()
+
+    def _get(self, endpoint, params):
+        return call_with_retry(self._request, endpoint, params, host=self.host)
+
+    def history(self, data):
+        return self._get('history', data)
+
+    def quotes(self, data):
+        return self._get('quotes', data)
+
+    def connection_stats(self):
+        """
+        Returns how many requests were sent and how many new connections that took, per host
+        and in total. requests - connections is the number of requests that reused a
+        connection instead of doing a new TCP and TLS handshake.
+        """
+        hosts = {}
+        for adapter in set(self.session.adapters.values()):
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools[key]
+                hosts[pool.host] = {'requests': pool.num_requests, 'connections': pool.num_connections}
+
+        requests_sent = sum(host['requests'] for host in hosts.values())
+        connections = sum(host['connections'] for host in hosts.values())
+        return {
+            'requests': requests_sent,
+            'connections': connections,
+            'reused': requests_sent - connections,
+            'hosts': hosts,
+        }
+
+    def close(self):
+        self.session.close()
+
+
+# Function to get the process-wide Fyers session for a config file
+def get_fyers_session(confile='config.ini'):
+    config = load_fyers_config(confile)
+    if config is None:
+        return None
+
+    with _lock:
+        if confile not in _sessions:
+            _sessions[confile] = FyersSession(
+                config['client_id'], config['access_token'],
+                base_url=config.get('data_url', FYERS_DATA_URL)
+            )
+        return _sessions[confile]
+
+
+# Function to print the connection reuse of the shared session
+def print_connection_stats(confile='config.ini'):
+    session = _sessions.get(confile)
+    if session is None:
+        return
+    stats = session.connection_stats()
+    print(f"Fyers HTTP: {stats['requests']} requests over {stats['connections']} connections "
+          f"({stats['reused']} reused)")
@@ -1,73 +1,47 @@
 import sqlite3
 import pandas as pd
-import yfinance as yf
-from datetime import datetime, timedelta
+from PriceSnapshot import price_snapshot
+from datetime import datetime
+from ZoneIndex import ZoneIndex
+from ZoneStore import ZONE_DB
+
+# Days back a zone may start, and days since its test, for a zone to be checked in each timeframe
+ZONE_LOOKBACK_DAYS = {'1d': 15, '2h': 10, '1h': 5}
+TESTED_WITHIN_DAYS = {'1d': 2, '2h': 2, '1h': 1}
 
 # Function to fetch active demand/supply zones from the SQLite database
-def fetch_active_zones(db_file, timeframe):
-    connection = sqlite3.connect(db_file)
-    
-    today = datetime.today()
-    
-    if timeframe == '1d':
-        date_limit = today - timedelta(days=15)
-    elif timeframe == '2h':
-        date_limit = today - timedelta(days=10)
-    elif timeframe == '1h':
-        date_limit = today - timedelta(days=5)
-    else:
+def fetch_active_zones(timeframe, market='NSE', db_path=ZONE_DB):
+    if timeframe not in ZONE_LOOKBACK_DAYS:
         raise ValueError("Invalid timeframe. Use '1d', '2h', or '1h'.")
-    
-    date_limit_str = date_limit.strftime('%Y-%m-%d')
-    df = pd.DataFrame()
-    
-    if db_file == '../StockDZSZ.db':
-        query = f"""
-        SELECT symbol, zone_type, price_range_high, price_range_low, zone_status, start_date, end_date, tested_date
-        FROM demand_supply_zones
-        WHERE zone_status = 'Tested' AND start_date >= '{date_limit_str}';
-        """
-        # Use pandas to load the SQL query results into a DataFrame
-        df = pd.read_sql(query, connection)
-    else:
-        query = f"""
-        SELECT symbol, zone_type, price_range_high, price_range_low, zone_status, start_date,end_date, tested_date
-        FROM demand_supply_zones
-        WHERE zone_status = 'Tested' AND start_date >= '{date_limit_str}';
-        """
-        query1 = f"""
-        SELECT symbol, zone_type, price_range_high, price_range_low, zone_status, start_date,end_date, tested_date
-        FROM demand_supply_zones_1hr
-        WHERE zone_status = 'Tested' AND start_date >= '{date_limit_str}';
-        """
-        # Use pandas to load the SQL query results into DataFrames
-        df = pd.read_sql(query, connection)
-        df1 = pd.read_sql(query1, connection)
-        
-        # Concatenate the two DataFrames
-        df = pd.concat([df, df1], ignore_index=True)
+
+    connection = sqlite3.connect(db_path)
+
+    # The recency filters and days since the test are computed on the epoch columns in SQL, so no
+    # date is parsed in Python; the start filter is served by the (zone_status, start_ts) index
+    query = """
+    SELECT symbol, zone_type, price_range_high, price_range_low, zone_status, start_date, end_date,
+           strftime('%Y-%m-%d %H:%M:%S', tested_ts, 'unixepoch') AS tested_date,
+           (CAST(strftime('%s', 'now', 'localtime') AS INTEGER) - tested_ts) / 86400 AS days_since_tested
+    FROM zones
+    WHERE zone_status = 'Tested' AND timeframe = ? AND market = ?
+      AND start_ts >= CAST(strftime('%s', 'now', 'localtime', 'start of day', ?) AS INTEGER)
+      AND tested_ts > CAST(strftime('%s', 'now', 'localtime') AS INTEGER) - ? * 86400;
+    """
+    # Use pandas to load the SQL query results into a DataFrame
+    df = pd.read_sql(query, connection, params=(timeframe, market, f"-{ZONE_LOOKBACK_DAYS[timeframe]} days",
+                                                TESTED_WITHIN_DAYS[timeframe]))
     
     # Close the connection
-    # connection.close()
     connection.close()
     return df
 
-# Function to fetch the current price of a stock using yfinance
-def get_current_price(stock_name):
-    try:
-        stock = yf.Ticker(stock_name)
-        current_price = stock.history(period="1d")['Close'].iloc[-1]
-        return current_price
-    except Exception as e:
-        print(f"Error fetching price for {stock_name}: {e}")
-        return None
-
-# Function to create the GreenRedList table in the database
-def create_green_red_list_table(db_file):
+# Function to create the GreenRedList table in the database; drop=False keeps the stored lists
+def create_green_red_list_table(db_file, drop=True):
     if db_file == "../StockDZSZ.db":
         connection = sqlite3.connect(db_file)
         cursor = connection.cursor()
-        cursor.execute('DROP TABLE IF EXISTS GreenRedList')
+        if drop:
+            cursor.execute('DROP TABLE IF EXISTS GreenRedList')
         # Create the GreenRedList table if it doesn't exist
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS GreenRedList (
@@ -118,95 +92,87 @@ def is_valid_candle(open_price, close_price, high_price, low_price):
         return False
     return True
 # Function to check if the price is within the zone's range and meets the tested date condition
-def check_price_in_zone(db_file):
-    # Determine the appropriate timeframe based on the database file
-    if db_file == "../StockDZSZ.db":
-        timeframe = "1d"
-    elif db_file == "../StockTest.db":
-        timeframe = "2h"  # default for "demand_supply_zones"
-        # Also, we'll check for "demand_supply_zones_1hr" separately with 1h timeframe
-        check_price_in_zone_with_timeframe(db_file, timeframe, "demand_supply_zones")
-        timeframe = "1h"  # switch to 1h for "demand_supply_zones_1hr"
-    
-    check_price_in_zone_with_timeframe(db_file, timeframe, "demand_supply_zones")
+def check_price_in_zone(timeframes=('1d', '2h', '1h')):
+    # Every timeframe now lives in the one zones table
+    for timeframe in timeframes:
+        check_price_in_zone_with_timeframe(timeframe)
 
 # Helper function to handle checking price in the zone based on the specific timeframe
-def check_price_in_zone_with_timeframe(db_file, timeframe, table_name):
-    active_zones = fetch_active_zones(db_file, timeframe)
+def check_price_in_zone_with_timeframe(timeframe, index=None):
+    """
+    Args:
+        timeframe: '1d', '2h' or '1h'.
+        index: ZoneIndex of the timeframe's tested zones. By default it is built from
+            fetch_active_zones; a caller that keeps running can pass its own index and keep it
+            current with index.apply() instead of querying again.
+    """
+    # fetch_active_zones only returns zones tested within the timeframe's threshold
+    if index is None:
+        index = ZoneIndex.from_zones(dict(zone, timeframe=timeframe)
+                                     for zone in fetch_active_zones(timeframe).to_dict('records'))
     
     current_datetime = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
     
-    print(f"Checking zones at {current_datetime} with {timeframe} timeframe for table {table_name}")
-
-    for index, row in active_zones.iterrows():
-        stock_name = row['symbol']
-        current_price = get_current_price(stock_name)
-        start_date = row['start_date']
-        end_date = row['end_date']
-        tested_date = row['tested_date']
-        
-        # Check if the 'tested_date' format is valid (handle errors gracefully)
-        try:
-            if len(tested_date) == 10:  # Date format without time, e.g., '2025-01-24'
-                tested_date = tested_date + " 00:00:00"  # Add default time if no time is present
-            elif len(tested_date) == 16:  # Date format with minutes but no seconds (e.g., '2025-01-16 09:15')
-                tested_date = tested_date + ":00"  # Add ':00' for seconds
-            datetime_object = datetime.strptime(tested_date, '%Y-%m-%d %H:%M:%S')
-            days_since_tested = (datetime.now() - datetime_object).days
-        except ValueError as e:
-            print(f"Error parsing tested date {tested_date}: {e}")
-            days_since_tested = None
-        threshhold = None
-        if timeframe == '1h':
-            threshhold = 1
-        elif timeframe == '2h':
-            threshhold = 2
-        else:
-            threshhold = 2
-        if current_price is not None and days_since_tested is not None and days_since_tested < threshhold:
-            zone_list = None
-            # Determine if it's a Demand or Supply Zone
-            if row['zone_type'] == 'Demand Zone':
-                if row['price_range_low'] <= current_price:
-                    zone_list = "Green List"  # Price is within the Demand Zone
-                    print(f"Stock {stock_name} ({start_date}) is within the active Demand Zone: "
-                          f"Price: {current_price} is above or equal to zone low {row['price_range_low']} "
-                          f"and tested on {tested_date}")
-                else:
-                    zone_list = "Red List"  # Price has not crossed the zone low
-                    print(f"Stock {stock_name} ({start_date}) price hasn't crossed the zone low for Demand Zone.")
-            
-            elif row['zone_type'] == 'Supply Zone':
-                if row['price_range_high'] >= current_price:
-                    zone_list = "Red List"  # Price is within the Supply Zone
-                    print(f"Stock {stock_name} ({start_date}) is within the active Supply Zone: "
-                          f"Price: {current_price} is below or equal to zone high {row['price_range_high']} "
-                          f"and tested on {tested_date}")
+    print(f"Checking zones at {current_datetime} with {timeframe} timeframe")
+
+    # One batched request for every symbol with a zone
+    symbols = list(index.symbols)
+    current_prices = price_snapshot.prices(symbols)
+
+    for stock_name in symbols:
+        current_price = current_prices.get(stock_name)
+        if current_price is None:
+            continue
+
+        # The lists flip at the zone top: price_range_low of a demand zone (stored inverted) and
+        # price_range_high of a supply zone. One search over the sorted tops splits the zones.
+        below, at, above = index.split(stock_name, current_price)
+        for zones, top_position in ((below, 'below'), (at, 'at'), (above, 'above')):
+            for zone in zones:
+                start_date = zone['start_date']
+                tested_date = zone['tested_date']
+                # Determine if it's a Demand or Supply Zone
+                if zone['zone_type'] == 'Demand Zone':
+                    if top_position != 'above':
+                        zone_list = "Green List"  # Price is within the Demand Zone
+                        print(f"Stock {stock_name} ({start_date}) is within the active Demand Zone: "
+                              f"Price: {current_price} is above or equal to zone low {zone['price_range_low']} "
+                              f"and tested on {tested_date}")
+                    else:
+                        zone_list = "Red List"  # Price has not crossed the zone low
+                        print(f"Stock {stock_name} ({start_date}) price hasn't crossed the zone low for Demand Zone.")
+
+                elif zone['zone_type'] == 'Supply Zone':
+                    if top_position != 'below':
+                        zone_list = "Red List"  # Price is within the Supply Zone
+                        print(f"Stock {stock_name} ({start_date}) is within the active Supply Zone: "
+                              f"Price: {current_price} is below or equal to zone high {zone['price_range_high']} "
+                              f"and tested on {tested_date}")
+                    else:
+                        zone_list = "Green List"  # Price has not crossed the zone high
+                        print(f"Stock {stock_name} ({start_date}) price hasn't crossed the zone high for Supply Zone.")
                 else:
-                    zone_list = "Green List"  # Price has not crossed the zone high
-                    print(f"Stock {stock_name} ({start_date}) price hasn't crossed the zone high for Supply Zone.")
-            
-            # Prepare the data to be inserted into the GreenRedList table
-            if zone_list:
+                    continue
+
+                # Prepare the data to be inserted into the GreenRedList table
                 data = {
                     'symbol': stock_name,
                     'start_date': start_date,
-                    'end_date': end_date,
-                    'price_range_high': row['price_range_high'],
-                    'price_range_low': row['price_range_low'],
+                    'end_date': zone['end_date'],
+                    'price_range_high': zone['price_range_high'],
+                    'price_range_low': zone['price_range_low'],
                     'tested_date': tested_date,
                     'timeframe': timeframe,
                     'List': zone_list
                 }
                 insert_into_green_red_list("../StockDZSZ.db", data)
 
-# Example usage
-db_file1 = '../StockDZSZ.db'  # Path to your SQLite database file
-db_file2 = '../StockTest.db'  # Path to your other SQLite database file
+if __name__ == "__main__":
+    # Example usage
+    db_file1 = '../StockDZSZ.db'  # Path to your SQLite database file
 
-# Create the GreenRedList table if not exists
-create_green_red_list_table(db_file1)
+    # Create the GreenRedList table if not exists
+    create_green_red_list_table(db_file1)
 
-# Check prices in zone for both databases
-check_price_in_zone(db_file1)
-check_price_in_zone(db_file2)
+    # Check prices in zone for every timeframe
+    check_price_in_zone()
@@ -1,67 +1,39 @@
 import sqlite3
 import pandas as pd
-import yfinance as yf
-from datetime import datetime, timedelta
+from PriceSnapshot import price_snapshot
+from datetime import datetime
+from ZoneStore import ZONE_DB
+
+# Days back a zone may start, and days since its test, for a zone to be checked in each timeframe
+ZONE_LOOKBACK_DAYS = {'1d': 15, '2h': 10, '1h': 5}
+TESTED_WITHIN_DAYS = {'1d': 3, '2h': 3, '1h': 3}
 
 # Function to fetch active demand/supply zones from the SQLite database
-def fetch_active_zones(db_file, timeframe):
-    connection = sqlite3.connect(db_file)
-    
-    today = datetime.today()
-    
-    if timeframe == '1d':
-        date_limit = today - timedelta(days=15)
-    elif timeframe == '2h':
-        date_limit = today - timedelta(days=10)
-    elif timeframe == '1h':
-        date_limit = today - timedelta(days=5)
-    else:
+def fetch_active_zones(timeframe, market='NASDAQ'):
+    if timeframe not in ZONE_LOOKBACK_DAYS:
         raise ValueError("Invalid timeframe. Use '1d', '2h', or '1h'.")
-    
-    date_limit_str = date_limit.strftime('%Y-%m-%d')
-    df = pd.DataFrame()
-    
-    if db_file == '../StockDZSZ.db':
-        query = f"""
-        SELECT symbol, zone_type, price_range_high, price_range_low, zone_status, start_date, tested_date
-        FROM demand_supply_zones
-        WHERE zone_status = 'Tested' AND start_date >= '{date_limit_str}';
-        """
-        # Use pandas to load the SQL query results into a DataFrame
-        df = pd.read_sql(query, connection)
-    else:
-        query = f"""
-        SELECT symbol, zone_type, price_range_high, price_range_low, zone_status, start_date, tested_date
-        FROM demand_supply_zones
-        WHERE zone_status = 'Tested' AND start_date >= '{date_limit_str}';
-        """
-        query1 = f"""
-        SELECT symbol, zone_type, price_range_high, price_range_low, zone_status, start_date, tested_date
-        FROM demand_supply_zones_1h
-        WHERE zone_status = 'Tested' AND start_date >= '{date_limit_str}';
-        """
-        # Use pandas to load the SQL query results into DataFrames
-        df = pd.read_sql(query, connection)
-        df1 = pd.read_sql(query1, connection)
-        
-        # Concatenate the two DataFrames
-        df = pd.concat([df, df1], ignore_index=True)
+
+    connection = sqlite3.connect(ZONE_DB)
+
+    # The recency filters and days since the test are computed on the epoch columns in SQL, so no
+    # date is parsed in Python; the start filter is served by the (zone_status, start_ts) index
+    query = """
+    SELECT symbol, zone_type, price_range_high, price_range_low, zone_status, start_date,
+           strftime('%Y-%m-%d %H:%M:%S', tested_ts, 'unixepoch') AS tested_date,
+           (CAST(strftime('%s', 'now', 'localtime') AS INTEGER) - tested_ts) / 86400 AS days_since_tested
+    FROM zones
+    WHERE zone_status = 'Tested' AND timeframe = ? AND market = ?
+      AND start_ts >= CAST(strftime('%s', 'now', 'localtime', 'start of day', ?) AS INTEGER)
+      AND tested_ts > CAST(strftime('%s', 'now', 'localtime') AS INTEGER) - ? * 86400;
+    """
+    # Use pandas to load the SQL query results into a DataFrame
+    df = pd.read_sql(query, connection, params=(timeframe, market, f"-{ZONE_LOOKBACK_DAYS[timeframe]} days",
+                                                TESTED_WITHIN_DAYS[timeframe]))
     
     # Close the connection
-    # connection.close()
     connection.close()
     return df
 
-# Function to fetch the current price of a stock using yfinance
-def get_current_price(stock_name):
-    try:
-        stock = yf.Ticker(stock_name)
-        current_price = stock.history(period="1d")['Close'].iloc[-1]
-        return current_price
-    except Exception as e:
-        print(f"Error fetching price for {stock_name}: {e}")
-        return None
-
 # Function to create the GreenRedList table in the database
 def create_green_red_list_table(db_file):
     if db_file == "../StockDZSZNDX.db":
@@ -118,45 +90,30 @@ def is_valid_candle(open_price, close_price, high_price, low_price):
         return False
     return True
 # Function to check if the price is within the zone's range and meets the tested date condition
-def check_price_in_zone(db_file):
-    # Determine the appropriate timeframe based on the database file
-    if db_file == "../StockDZSZNDX.db":
-        timeframe = "1d"
-    elif db_file == "../StockTest.db":
-        timeframe = "2h"  # default for "demand_supply_zones"
-        # Also, we'll check for "demand_supply_zones_1hr" separately with 1h timeframe
-        check_price_in_zone_with_timeframe(db_file, timeframe, "demand_supply_zones")
-        timeframe = "1h"  # switch to 1h for "demand_supply_zones_1hr"
-    
-    check_price_in_zone_with_timeframe(db_file, timeframe, "demand_supply_zones")
+def check_price_in_zone(timeframes=('1d', '1h')):
+    # Every timeframe now lives in the one zones table
+    for timeframe in timeframes:
+        check_price_in_zone_with_timeframe(timeframe)
 
 # Helper function to handle checking price in the zone based on the specific timeframe
-def check_price_in_zone_with_timeframe(db_file, timeframe, table_name):
-    active_zones = fetch_active_zones(db_file, timeframe)
+def check_price_in_zone_with_timeframe(timeframe):
+    active_zones = fetch_active_zones(timeframe)
     
     current_datetime = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
     
-    print(f"Checking zones at {current_datetime} with {timeframe} timeframe for table {table_name}")
+    print(f"Checking zones at {current_datetime} with {timeframe} timeframe")
+
+    # One batched request for every symbol with a zone; repeated symbols are served from the snapshot
+    current_prices = price_snapshot.prices(active_zones['symbol'])
 
     for index, row in active_zones.iterrows():
         stock_name = row['symbol']
-        current_price = get_current_price(stock_name)
+        current_price = current_prices.get(stock_name)
         start_date = row['start_date']
         tested_date = row['tested_date']
         
-        # Check if the 'tested_date' format is valid (handle errors gracefully)
-        try:
-            if len(tested_date) == 10:  # Date format without time, e.g., '2025-01-24'
-                tested_date = tested_date + " 00:00:00"  # Add default time if no time is present
-            elif len(tested_date) == 16:  # Date format with minutes but no seconds (e.g., '2025-01-16 09:15')
-                tested_date = tested_date + ":00"  # Add ':00' for seconds
-            datetime_object = datetime.strptime(tested_date, '%Y-%m-%d %H:%M:%S')
-            days_since_tested = (datetime.now() - datetime_object).days
-        except ValueError as e:
-            print(f"Error parsing tested date {tested_date}: {e}")
-            days_since_tested = None
-
-        if current_price is not None and days_since_tested is not None and days_since_tested < 3:
+        # fetch_active_zones only returns zones tested within the timeframe's threshold
+        if current_price is not None:
             zone_list = None
             # Determine if it's a Demand or Supply Zone
             if row['zone_type'] == 'Demand Zone':
@@ -195,11 +152,9 @@ def check_price_in_zone_with_timeframe(db_file, timeframe, table_name):
 
 # Example usage
 db_file1 = '../StockDZSZNDX.db'  # Path to your SQLite database file
-# db_file2 = '../StockTest.db'  # Path to your other SQLite database file
 
 # Create the GreenRedList table if not exists
 create_green_red_list_table(db_file1)
 
-# Check prices in zone for both databases
-check_price_in_zone(db_file1)
-# check_price_in_zone(db_file2)
+# Check prices in zone for every timeframe
+check_price_in_zone()
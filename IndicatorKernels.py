@@ -0,0 +1,212 @@
+import collections
+
+import numpy as np
+import pandas as pd
+
+
+# Function to get a column of a candle frame as a float array
+def _column(stock_data, name):
+    return np.asarray(stock_data[name], dtype=float).reshape(-1)
+
+
+class EmaKernel:
+    """
+    EMA of the close, as Series.ewm(span=span, adjust=False).mean(): the first close seeds it.
+    init() runs a whole series at once; update() adds one closed bar in O(1).
+    """
+
+    def __init__(self, span=20):
+        self.span = span
+        self.name = f'ema{span}'
+        self.alpha = 2.0 / (span + 1)
+        self.ema = None
+
+    def init(self, stock_data):
+        """
+        Returns the EMA after every bar of stock_data and keeps the last one as the state.
+        """
+        close = pd.Series(_column(stock_data, 'Close'))
+        if self.ema is not None and len(close):
+            # Continue from the state: it stands in for the bars before the series
+            values = (pd.concat([pd.Series([self.ema]), close]).ewm(alpha=self.alpha, adjust=False)
+                      .mean().to_numpy()[1:])
+        else:
+            values = close.ewm(alpha=self.alpha, adjust=False).mean().to_numpy()
+        if len(values):
+            self.ema = float(values[-1])
+        return values
+
+    def update(self, high, low, close):
+        self.ema = close if self.ema is None else (1 - self.alpha) * self.ema + self.alpha * close
+        return self.ema
+
+    def value(self):
+        return self.ema
+
+    def get_state(self):
+        return {'ema': self.ema}
+
+    def set_state(self, state):
+        self.ema = state['ema']
+
+
+class AtrKernel:
+    """
+    Wilder's average true range. The true range of a bar is the largest of high - low and the
+    distances from the previous close to the high and the low; the first bar has no previous
+    close and uses high - low. The ATR is the mean of the first `period` true ranges and then
+    (ATR * (period - 1) + TR) / period.
+    """
+
+    def __init__(self, period=14):
+        self.period = period
+        self.name = f'atr{period}'
+        self.previous_close = None
+        self.count = 0
+        self.tr_sum = 0.0
+        self.atr = None
+
+    def init(self, stock_data):
+        """
+        Returns the ATR after every bar (NaN until `period` bars were seen) and keeps the state
+        of the last bar. Continues from the current state when there is one.
+        """
+        high, low, close = (_column(stock_data, name) for name in ('High', 'Low', 'Close'))
+        if len(close) == 0:
+            return np.empty(0)
+        previous_close = np.r_[np.nan if self.previous_close is None else self.previous_close, close[:-1]]
+        with np.errstate(invalid='ignore'):
+            true_range = np.fmax(high - low, np.fmax(np.abs(high - previous_close), np.abs(low - previous_close)))
+
+        values = np.full(len(close), np.nan)
+        # Bars still needed for the seed mean, then Wilder smoothing as an EMA with alpha 1 / period
+        seed = max(self.period - self.count, 0) if self.atr is None else 0
+        if seed > len(close):
+            self.tr_sum += float(np.sum(true_range))
+            self.count += len(close)
+        else:
+            if self.atr is None:
+                self.tr_sum += float(np.sum(true_range[:seed]))
+                self.count += seed
+                start = self.tr_sum / self.period
+                values[seed - 1] = start
+            else:
+                start = self.atr
+            smoothed = (pd.Series(np.r_[start, true_range[seed:]]).ewm(alpha=1.0 / self.period, adjust=False)
+                        .mean().to_numpy()[1:])
+            values[seed:] = smoothed
+            self.count += len(close) - seed
+            self.atr = float(values[-1])
+        self.previous_close = float(close[-1])
+        return values
+
+    def update(self, high, low, close):
+        true_range = high - low
+        if self.previous_close is not None:
+            true_range = max(true_range, abs(high - self.previous_close), abs(low - self.previous_close))
+        self.previous_close = close
+        self.count += 1
+        if self.atr is None:
+            self.tr_sum += true_range
+            if self.count == self.period:
+                self.atr = self.tr_sum / self.period
+        else:
+            alpha = 1.0 / self.period
+            self.atr = (1 - alpha) * self.atr + alpha * true_range
+        return self.atr
+
+    def value(self):
+        return self.atr
+
+    def get_state(self):
+        return {'previous_close': self.previous_close, 'count': self.count, 'tr_sum': self.tr_sum, 'atr': self.atr}
+
+    def set_state(self, state):
+        self.previous_close = state['previous_close']
+        self.count = state['count']
+        self.tr_sum = state['tr_sum']
+        self.atr = state['atr']
+
+
+class CandleSizeKernel:
+    """
+    Mean absolute close-to-close change, the candle size ZoneEngine compares long candles
+    against: each size is |close - previous close| rounded to `decimals`. Without a window the
+    mean is taken over every size so far, summed in order like ZoneEngine's 'expanding'
+    average; with a window it is taken over the last `window` sizes.
+    """
+
+    def __init__(self, window=None, decimals=1):
+        self.window = window
+        self.decimals = decimals
+        self.name = 'candle_size' if window is None else f'candle_size{window}'
+        self.previous_close = None
+        self.size_sum = 0.0
+        self.count = 0
+        self.sizes = collections.deque(maxlen=window) if window else None
+
+    def init(self, stock_data):
+        """
+        Returns the mean candle size after every bar (NaN before the second bar) and keeps the
+        state of the last bar. Continues from the current state when there is one.
+        """
+        close = _column(stock_data, 'Close')
+        if len(close) == 0:
+            return np.empty(0)
+        previous = np.r_[np.nan if self.previous_close is None else self.previous_close, close[:-1]]
+        sizes = np.round(np.abs(close - previous), self.decimals)
+        valid = ~np.isnan(sizes)
+        first = int(np.argmax(valid)) if valid.any() else len(close)
+
+        values = np.full(len(close), np.nan)
+        new_sizes = sizes[first:]
+        counts = self.count + np.arange(1, len(new_sizes) + 1)
+        if self.window is None:
+            # Sequential running sum, so the result matches update() bit for bit
+            sums = np.cumsum(np.r_[self.size_sum, new_sizes])[1:]
+            values[first:] = sums / counts
+            if len(new_sizes):
+                self.size_sum = float(sums[-1])
+        else:
+            history = np.r_[np.array(self.sizes, dtype=float), new_sizes]
+            sums = np.cumsum(np.r_[0.0, history])
+            ends = np.arange(len(self.sizes) + 1, len(history) + 1)
+            starts = np.maximum(ends - self.window, 0)
+            values[first:] = (sums[ends] - sums[starts]) / (ends - starts)
+            self.sizes.extend(new_sizes.tolist())
+            self.size_sum = float(sum(self.sizes))
+        self.count += len(new_sizes)
+        self.previous_close = float(close[-1])
+        return values
+
+    def update(self, high, low, close):
+        previous_close, self.previous_close = self.previous_close, close
+        if previous_close is None:
+            return None
+        size = float(np.round(abs(close - previous_close), self.decimals))
+        if self.sizes is not None:
+            if len(self.sizes) == self.window:
+                self.size_sum -= self.sizes[0]
+            self.sizes.append(size)
+            self.size_sum += size
+            self.count += 1
+            return self.size_sum / len(self.sizes)
+        self.size_sum += size
+        self.count += 1
+        return self.size_sum / self.count
+
+    def value(self):
+        if self.count == 0:
+            return None
+        return self.size_sum / (len(self.sizes) if self.sizes is not None else self.count)
+
+    def get_state(self):
+        return {'previous_close': self.previous_close, 'size_sum': self.size_sum, 'count': self.count,
+                'sizes': list(self.sizes) if self.sizes is not None else None}
+
+    def set_state(self, state):
+        self.previous_close = state['previous_close']
+        self.size_sum = state['size_sum']
+        self.count = state['count']
+        if self.window:
+            self.sizes = collections.deque(state['sizes'] or [], maxlen=self.window)
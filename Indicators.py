@@ -0,0 +1,198 @@
+import datetime
+import json
+import sqlite3
+
+import pandas as pd
+import yfinance as yf
+
+from CandleStore import CANDLE_DB, CandleStore, _to_epoch, period_start
+from FyersData import PRICE_COLUMNS
+from IndicatorKernels import EmaKernel
+from Resilience import YAHOO_HOST, YAHOO_RETRYABLE_ERRORS, call_with_retry
+
+# EMA spans kept for every symbol, and the daily history a symbol without a state starts from
+EMA_SPANS = (20,)
+EMA_INIT_PERIOD = '1mo'
+
+# Candle store resolution of the daily yfinance candles
+DAILY_RESOLUTION = '1d'
+
+
+# Function to download the daily candles of many tickers in one yf.download call
+def download_candles(symbols, **kwargs):
+    """
+    Returns:
+        Dictionary of symbol -> DataFrame with Open, High, Low, Close and Volume columns and a
+        naive date index; symbols yfinance returned nothing for are left out.
+    """
+    data = call_with_retry(yf.download, symbols, host=YAHOO_HOST, retryable=YAHOO_RETRYABLE_ERRORS,
+                           group_by='column', progress=False, **kwargs)
+    if data is None or data.empty:
+        return {}
+    if data.index.tz is not None:
+        data.index = data.index.tz_localize(None)
+
+    candles = {}
+    for symbol in symbols:
+        if isinstance(data.columns, pd.MultiIndex):
+            if symbol not in data.columns.get_level_values(1):
+                continue
+            df = data.xs(symbol, axis=1, level=1)
+        else:
+            df = data
+        df = df.reindex(columns=PRICE_COLUMNS).dropna(subset=['Close'])
+        if not df.empty:
+            candles[symbol] = df
+    return candles
+
+
+class EmaService:
+    """
+    Daily EMAs of a whole universe. The daily candles of all symbols come from one batched
+    download into the candle store, and refresh_indicators keeps an EmaKernel per span and
+    symbol in the indicator_state table, so a later day only downloads and feeds the candles
+    after each stored state instead of recomputing the EMA from a fresh history.
+    """
+
+    def __init__(self, spans=EMA_SPANS, db_path=CANDLE_DB, init_period=EMA_INIT_PERIOD):
+        self.spans = tuple(spans)
+        self.init_period = init_period
+        self.candle_store = CandleStore(db_path)
+        self.indicator_store = IndicatorStore(db_path)
+
+    def refresh(self, symbols):
+        """
+        Brings the stored candles and EMAs of the symbols up to date. Symbols without candles
+        download init_period of history; the others download, together, only the days from the
+        oldest of their last stored candles, which is fetched again as it may have been forming.
+        """
+        symbols = list(dict.fromkeys(symbols))
+        range_from = period_start(self.init_period)
+        starts = {symbol: self.candle_store.refresh_start(symbol, DAILY_RESOLUTION, range_from) for symbol in symbols}
+        new = [symbol for symbol in symbols if starts[symbol] == range_from]
+        stored = [symbol for symbol in symbols if starts[symbol] != range_from]
+
+        for group, start, covered_from in ((new, range_from, range_from),
+                                           (stored, min((starts[symbol] for symbol in stored), default=None), None)):
+            if not group:
+                continue
+            start = datetime.datetime.fromtimestamp(start, tz=datetime.timezone.utc).strftime('%Y-%m-%d')
+            for symbol, df in download_candles(group, start=start, interval='1d').items():
+                self.candle_store.write(symbol, DAILY_RESOLUTION, df, covered_from=covered_from)
+
+        for symbol in symbols:
+            refresh_indicators(symbol, DAILY_RESOLUTION, [EmaKernel(span) for span in self.spans],
+                               self.candle_store, self.indicator_store)
+
+    def latest(self, symbols, span=EMA_SPANS[0], refresh=True):
+        """
+        Returns:
+            Dictionary of symbol -> EMA as of the latest stored close, today's unfinished candle
+            included, like ewm(...).mean().iloc[-1] on a download that ends today. Symbols
+            without any close are left out.
+        """
+        symbols = list(dict.fromkeys(symbols))
+        if refresh:
+            self.refresh(symbols)
+        latest = {}
+        for symbol in symbols:
+            kernel = EmaKernel(span)
+            state_ts = self.indicator_store.load(symbol, DAILY_RESOLUTION, [kernel]).get(kernel.name, -1)
+            # The last candle is held out of the stored state, so it moves the EMA here only
+            last = self.candle_store.read(symbol, DAILY_RESOLUTION, range_from=state_ts + 1)
+            for close in last['Close'].tolist():
+                kernel.update(None, None, close)
+            if kernel.value() is not None:
+                latest[symbol] = kernel.value()
+        return latest
+
+
+class IndicatorStore:
+    """
+    State of the indicator kernels of each (symbol, resolution) series, kept in the candle
+    database next to the candles, with the timestamp of the last bar it includes. A refresh
+    feeds a kernel only the candles stored after that bar.
+    """
+
+    def __init__(self, db_path=CANDLE_DB):
+        self.db_path = db_path
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS indicator_state (
+            symbol TEXT,
+            resolution TEXT,
+            indicator TEXT,
+            ts INTEGER,
+            state TEXT,
+            PRIMARY KEY (symbol, resolution, indicator)
+        ) WITHOUT ROWID
+        """)
+        conn.commit()
+        conn.close()
+
+    def load(self, symbol, resolution, kernels):
+        """
+        Restores the stored state of each kernel. Returns a dictionary of kernel name -> ts of
+        the last bar in its state; kernels without a stored state are left out and unchanged.
+        """
+        conn = sqlite3.connect(self.db_path)
+        rows = conn.execute(
+            "SELECT indicator, ts, state FROM indicator_state WHERE symbol = ? AND resolution = ?",
+            (symbol, resolution)
+        ).fetchall()
+        conn.close()
+        stored = {indicator: (ts, state) for indicator, ts, state in rows}
+        loaded = {}
+        for kernel in kernels:
+            if kernel.name in stored:
+                ts, state = stored[kernel.name]
+                kernel.set_state(json.loads(state))
+                loaded[kernel.name] = ts
+        return loaded
+
+    def save(self, symbol, resolution, kernels, ts):
+        conn = sqlite3.connect(self.db_path)
+        conn.executemany(
+            "INSERT OR REPLACE INTO indicator_state (symbol, resolution, indicator, ts, state) VALUES (?, ?, ?, ?, ?)",
+            [(symbol, resolution, kernel.name, int(ts), json.dumps(kernel.get_state())) for kernel in kernels]
+        )
+        conn.commit()
+        conn.close()
+
+
+# Function to bring the indicators of a stored candle series up to its last candle
+def refresh_indicators(symbol, resolution, kernels, candle_store=None, indicator_store=None):
+    """
+    Restores each kernel's stored state and feeds it the candles stored after the bar its state
+    ends at; a kernel without a state is initialised over the whole stored series in one
+    vectorized pass. The states are saved again afterwards.
+    The last stored candle may still be forming when it is refreshed, so it is left out of the
+    states and fed on the next refresh, once a newer candle exists.
+    Args:
+        symbol, resolution: Series of the candle store, e.g. 'NSE:SBIN-EQ' and '15'.
+        kernels: Kernels from IndicatorKernels, e.g. [EmaKernel(20), AtrKernel(14), CandleSizeKernel()].
+    Returns:
+        Dictionary of kernel name -> value after the last closed candle (None when unknown).
+    """
+    candle_store = candle_store or CandleStore()
+    indicator_store = indicator_store or IndicatorStore(candle_store.db_path)
+    loaded = indicator_store.load(symbol, resolution, kernels)
+
+    since = min((loaded.get(kernel.name, -1) for kernel in kernels), default=-1)
+    candles = candle_store.read(symbol, resolution, range_from=since + 1)
+    ts = _to_epoch(candles.index)
+    # Only closed candles go into the states
+    candles, ts = candles.iloc[:-1], ts[:-1]
+
+    for kernel in kernels:
+        new = ts > loaded.get(kernel.name, -1)
+        if kernel.name in loaded:
+            # A stored state advances one bar at a time
+            for high, low, close in candles.loc[new, ['High', 'Low', 'Close']].itertuples(index=False):
+                kernel.update(high, low, close)
+        else:
+            kernel.init(candles.loc[new])
+
+    if len(ts):
+        indicator_store.save(symbol, resolution, kernels, ts[-1])
+    return {kernel.name: kernel.value() for kernel in kernels}
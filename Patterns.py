@@ -0,0 +1,127 @@
+import numpy as np
+import pandas as pd
+
+# Patterns detect_patterns computes when none are named
+PATTERN_NAMES = [
+    'bullish_engulfing', 'bearish_engulfing', 'hammer', 'shooting_star', 'doji', 'marubozu',
+    'inside_bar', 'outside_bar', 'morning_star', 'evening_star'
+]
+
+
+# Function to get a column as a float array
+def _values(data, name):
+    return np.asarray(data[name], dtype=float).reshape(-1)
+
+
+# Function to shift an array by `periods` candles within each symbol of a panel
+def _previous(values, same_symbol, periods):
+    previous = np.full(len(values), np.nan)
+    if len(values) > periods:
+        previous[periods:] = values[:-periods]
+        previous[periods:][~same_symbol[periods - 1]] = np.nan
+    return previous
+
+
+# Function to compute the body and wick features every pattern is built from
+def candle_features(data, symbol_column='symbol'):
+    """
+    Computes the features of all candles once, without adding columns to data.
+    Args:
+        data: DataFrame with Open, High, Low and Close columns, one series or a panel of several
+            symbols stacked with a symbol_column, each symbol's candles together and in time order.
+        symbol_column: Column naming the symbol of each candle in a panel.
+    Returns:
+        Dictionary of NumPy arrays: open, high, low, close, body (close - open), body_size,
+        upper_wick, lower_wick, candle_range, body_top, body_bottom, and the open, close,
+        body_size and body_top/bottom of the previous candle (prev_*) and the one before it
+        (prev2_*). The previous candle of a symbol's first candle is NaN, so every comparison
+        with it is False.
+    """
+    open_ = _values(data, 'Open')
+    high = _values(data, 'High')
+    low = _values(data, 'Low')
+    close = _values(data, 'Close')
+
+    # same_symbol[k][i] tells whether candle i + k + 1 belongs to the symbol of candle i
+    if symbol_column in data.columns and len(data) > 1:
+        codes = pd.factorize(np.asarray(data[symbol_column]))[0]
+        same_symbol = [codes[k + 1:] == codes[:-(k + 1)] for k in range(2)]
+    else:
+        same_symbol = [np.ones(max(len(close) - k - 1, 0), dtype=bool) for k in range(2)]
+
+    body_top = np.maximum(open_, close)
+    body_bottom = np.minimum(open_, close)
+    features = {
+        'open': open_,
+        'high': high,
+        'low': low,
+        'close': close,
+        'body': close - open_,
+        'body_size': np.abs(close - open_),
+        'upper_wick': high - body_top,
+        'lower_wick': body_bottom - low,
+        'candle_range': high - low,
+        'body_top': body_top,
+        'body_bottom': body_bottom,
+    }
+    for prefix, periods in (('prev', 1), ('prev2', 2)):
+        for name in ('open', 'close', 'high', 'low', 'body_size', 'body_top', 'body_bottom'):
+            features[f'{prefix}_{name}'] = _previous(features[name], same_symbol, periods)
+    return features
+
+
+# Function to find candlestick patterns on every candle at once
+def detect_patterns(data, patterns=None, symbol_column='symbol', engulf_percentage=0.7, features=None):
+    """
+    Evaluates a family of candlestick patterns as boolean arrays over shared features.
+    Args:
+        data: One series or a stacked panel, see candle_features. It is not modified.
+        patterns: Names from PATTERN_NAMES; all of them by default.
+        engulf_percentage: Smallest body of an engulfing candle as a share of the previous body.
+        features: Output of candle_features to reuse instead of computing it again.
+    Returns:
+        Dictionary of pattern name -> boolean NumPy array aligned with the rows of data.
+    """
+    f = features if features is not None else candle_features(data, symbol_column)
+    patterns = PATTERN_NAMES if patterns is None else patterns
+    open_, close, body_size, candle_range = f['open'], f['close'], f['body_size'], f['candle_range']
+
+    results = {}
+    with np.errstate(invalid='ignore'):
+        for name in patterns:
+            if name == 'bullish_engulfing':
+                # Same rules as the engulfing scan in EC
+                result = ((open_ <= f['prev_close']) & (open_ < f['prev_open']) & (close > f['prev_open'])
+                          & (body_size >= engulf_percentage * np.abs(f['prev_close'] - f['prev_open'])))
+            elif name == 'bearish_engulfing':
+                result = ((open_ >= f['prev_close']) & (open_ > f['prev_open']) & (close < f['prev_open'])
+                          & (body_size >= engulf_percentage * np.abs(f['prev_close'] - f['prev_open'])))
+            elif name == 'hammer':
+                # Bullish pin bar: long lower wick, small upper wick
+                result = ((f['lower_wick'] >= 2 * body_size) & (f['upper_wick'] <= 0.25 * candle_range)
+                          & (candle_range > 0))
+            elif name == 'shooting_star':
+                # Bearish pin bar: long upper wick, small lower wick
+                result = ((f['upper_wick'] >= 2 * body_size) & (f['lower_wick'] <= 0.25 * candle_range)
+                          & (candle_range > 0))
+            elif name == 'doji':
+                result = (body_size <= 0.1 * candle_range) & (candle_range > 0)
+            elif name == 'marubozu':
+                result = (body_size >= 0.9 * candle_range) & (candle_range > 0)
+            elif name == 'inside_bar':
+                result = (f['high'] < f['prev_high']) & (f['low'] > f['prev_low'])
+            elif name == 'outside_bar':
+                result = (f['high'] > f['prev_high']) & (f['low'] < f['prev_low'])
+            elif name == 'morning_star':
+                # Long red candle, small body gapping below it, green candle closing past the red body's middle
+                result = ((f['prev2_close'] < f['prev2_open']) & (f['prev_body_size'] <= 0.5 * f['prev2_body_size'])
+                          & (f['prev_body_top'] < f['prev2_close']) & (close > open_)
+                          & (close > (f['prev2_open'] + f['prev2_close']) / 2))
+            elif name == 'evening_star':
+                result = ((f['prev2_close'] > f['prev2_open']) & (f['prev_body_size'] <= 0.5 * f['prev2_body_size'])
+                          & (f['prev_body_bottom'] > f['prev2_close']) & (close < open_)
+                          & (close < (f['prev2_open'] + f['prev2_close']) / 2))
+            else:
+                raise ValueError(f"Unknown pattern: {name}")
+            results[name] = result
+    return results
@@ -0,0 +1,109 @@
+import time
+
+import pandas as pd
+import yfinance as yf
+
+from FyersSession import get_fyers_session
+from Resilience import YAHOO_HOST, YAHOO_RETRYABLE_ERRORS, call_with_retry
+from SymbolMaster import to_fyers_symbol
+
+# Fyers quotes accept at most 50 symbols per request
+FYERS_QUOTES_BATCH = 50
+
+
+# Function to get the latest close of each ticker from a multi-ticker yf.download
+def _yf_last_prices(symbols):
+    data = yf.download(symbols, period="1d", group_by='column', progress=False)
+    if data is None or data.empty:
+        return {}
+
+    closes = data['Close']
+    if isinstance(closes, pd.Series):
+        closes = closes.to_frame(symbols[0])
+
+    prices = {}
+    for symbol in closes.columns:
+        valid = closes[symbol].dropna()
+        if not valid.empty:
+            prices[symbol] = float(valid.iloc[-1])
+    return prices
+
+
+class PriceSnapshot:
+    """
+    Current prices for many symbols from as few requests as possible. Symbols are deduplicated,
+    only the ones missing from the snapshot (or older than ttl seconds) are fetched, and the
+    fetch is one batched request per source instead of one history call per symbol.
+    """
+
+    def __init__(self, ttl=60, source='yf', confile='config.ini', symbol_map=to_fyers_symbol):
+        """
+        Args:
+            ttl: Seconds a fetched price stays valid for the rest of the run.
+            source: 'yf' for a multi-ticker yf.download or 'fyers' for the Fyers quotes endpoint.
+            confile: Config file with the FyersAPI credentials (fyers source only).
+            symbol_map: Converts the symbols used in the zones tables to Fyers symbols.
+        """
+        self.ttl = ttl
+        self.source = source
+        self.confile = confile
+        self.symbol_map = symbol_map
+        self.cache = {}
+        self.requests = 0
+
+    def _fetch_yf(self, symbols):
+        self.requests += 1
+        return call_with_retry(_yf_last_prices, symbols, host=YAHOO_HOST, retryable=YAHOO_RETRYABLE_ERRORS)
+
+    def _fetch_fyers(self, symbols):
+        fyers = get_fyers_session(self.confile)
+        if fyers is None:
+            return {}
+
+        fyers_symbols = {self.symbol_map(symbol): symbol for symbol in symbols}
+        names = list(fyers_symbols)
+        prices = {}
+        for batch_start in range(0, len(names), FYERS_QUOTES_BATCH):
+            batch = names[batch_start:batch_start + FYERS_QUOTES_BATCH]
+            self.requests += 1
+            response = fyers.quotes(data={"symbols": ",".join(batch)})
+            for quote in response.get('d', []):
+                if quote.get('s') == 'ok' and quote.get('n') in fyers_symbols:
+                    prices[fyers_symbols[quote['n']]] = float(quote['v']['lp'])
+        return prices
+
+    def prices(self, symbols):
+        """
+        Returns a dictionary of symbol -> current price. Symbols whose price could not be
+        fetched are left out.
+        """
+        symbols = [symbol for symbol in dict.fromkeys(symbols) if symbol]
+        now = time.monotonic()
+        missing = [symbol for symbol in symbols
+                   if symbol not in self.cache or now - self.cache[symbol][1] > self.ttl]
+
+        if missing:
+            try:
+                fetched = self._fetch_fyers(missing) if self.source == 'fyers' else self._fetch_yf(missing)
+            except Exception as e:
+                print(f"Error fetching current prices: {e}")
+                fetched = {}
+            for symbol in missing:
+                if symbol in fetched:
+                    self.cache[symbol] = (fetched[symbol], now)
+                else:
+                    print(f"Error fetching price for {symbol}: no price returned")
+
+        return {symbol: self.cache[symbol][0] for symbol in symbols if symbol in self.cache}
+
+    def price(self, symbol):
+        return self.prices([symbol]).get(symbol)
+
+
+# Snapshot shared by everything that asks for current prices during one run
+price_snapshot = PriceSnapshot()
+
+
+# Function to fetch the current price of a stock from the shared snapshot
+def get_current_price(symbol):
+    return price_snapshot.price(symbol)
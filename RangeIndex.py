@@ -0,0 +1,94 @@
+import numpy as np
+
+
+class SparseTable:
+    """
+    Range min or max over a fixed array. Building costs O(n log n) once, after which any
+    [left, right) range is answered with two lookups, for one range or an array of ranges.
+    """
+
+    def __init__(self, values, op=np.maximum, max_span=None):
+        """
+        Args:
+            values: 1-D array to index.
+            op: np.maximum or np.minimum.
+            max_span: Longest range that will be queried. Levels above it are not built,
+                which keeps memory at O(n log max_span) for short queries on long series.
+        """
+        self.op = op
+        self.identity = -np.inf if op is np.maximum else np.inf
+        values = np.asarray(values, dtype=float)
+        span_limit = len(values) if max_span is None else min(max_span, len(values))
+        self.levels = [values]
+        width = 1
+        while width * 2 <= span_limit:
+            previous = self.levels[-1]
+            self.levels.append(op(previous[:-width], previous[width:]))
+            width *= 2
+
+    def query(self, left, right):
+        """
+        Returns op over values[left:right] for each pair; empty ranges give the identity
+        (-inf for max, inf for min).
+        """
+        left = np.asarray(left, dtype=np.int64)
+        right = np.asarray(right, dtype=np.int64)
+        length = right - left
+        if np.any(length >= 2 ** len(self.levels)):
+            raise ValueError("Range is longer than the max_span the table was built for.")
+
+        safe_length = np.maximum(length, 1)
+        level = np.floor(np.log2(safe_length)).astype(np.int64)
+        result = np.full(np.shape(length), self.identity)
+        for k in np.unique(level[length > 0]):
+            rows = (level == k) & (length > 0)
+            table = self.levels[k]
+            result[rows] = self.op(table[left[rows]], table[right[rows] - 2 ** k])
+        return result
+
+
+class CandleRangeIndex:
+    """
+    Answers "combine the candles in [left, right)" in constant time: wick high, wick low,
+    lowest body and highest body, plus how many candles took part.
+    Passing a mask builds the masked variant, where only candles with mask True (for example
+    base candles) contribute and the others are ignored.
+    """
+
+    def __init__(self, high, low, lowest_body, highest_body, mask=None, max_span=None):
+        high = np.asarray(high, dtype=float)
+        low = np.asarray(low, dtype=float)
+        lowest_body = np.asarray(lowest_body, dtype=float)
+        highest_body = np.asarray(highest_body, dtype=float)
+        if mask is None:
+            mask = np.ones(len(high), dtype=bool)
+        mask = np.asarray(mask, dtype=bool)
+
+        # Masked-out candles hold the identity so they never win a min or max
+        self.high = SparseTable(np.where(mask, high, -np.inf), np.maximum, max_span)
+        self.low = SparseTable(np.where(mask, low, np.inf), np.minimum, max_span)
+        self.lowest_body = SparseTable(np.where(mask, lowest_body, np.inf), np.minimum, max_span)
+        self.highest_body = SparseTable(np.where(mask, highest_body, -np.inf), np.maximum, max_span)
+        self.counts = np.concatenate([[0], np.cumsum(mask)])
+
+    def combine(self, left, right):
+        """
+        Combines the (masked) candles of every [left, right) range.
+        Returns:
+            Dictionary of arrays high, low, lowest_body, highest_body and count. Ranges without
+            any contributing candle get NaN prices and a count of 0.
+        """
+        left = np.asarray(left, dtype=np.int64)
+        right = np.asarray(right, dtype=np.int64)
+        count = self.counts[right] - self.counts[left]
+        empty = count == 0
+        combined = {
+            'high': self.high.query(left, right),
+            'low': self.low.query(left, right),
+            'lowest_body': self.lowest_body.query(left, right),
+            'highest_body': self.highest_body.query(left, right),
+        }
+        for values in combined.values():
+            values[empty] = np.nan
+        combined['count'] = count
+        return combined
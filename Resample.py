@@ -0,0 +1,146 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+# Regular session open and exchange timezone of each market
+SESSION_OPENS = {
+    'NSE': ('09:15', 'Asia/Kolkata'),
+    'NASDAQ': ('09:30', 'America/New_York'),
+}
+
+
+# Function to turn an interval such as '2h', '75m' or 120 into minutes
+def interval_minutes(interval):
+    if isinstance(interval, (int, np.integer)):
+        return int(interval)
+    match = re.fullmatch(r'(\d+)\s*(m|min|h|hr)', str(interval).strip().lower())
+    if match is None:
+        raise ValueError(f"Unsupported interval: {interval}")
+    value = int(match.group(1))
+    return value * 60 if match.group(2) in ('h', 'hr') else value
+
+
+# Function to drop empty candles, sort by time and list the price columns present
+def _prepare(stock_data):
+    stock_data = stock_data[stock_data['Close'].notna()]
+    if not stock_data.index.is_monotonic_increasing:
+        stock_data = stock_data.sort_index()
+    columns = [column for column in ['Open', 'High', 'Low', 'Close', 'Volume'] if column in stock_data.columns]
+    return stock_data, columns
+
+
+# Function to aggregate runs of consecutive candles with the same key into one candle each
+def _aggregate(stock_data, columns, keys, index_name):
+    # Candles are sorted, so each bucket is one run; reduceat aggregates all runs at once
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    ends = np.r_[starts[1:], len(keys)] - 1
+
+    values = {column: np.asarray(stock_data[column], dtype=float).reshape(-1) for column in columns}
+    resampled = {
+        'Open': values['Open'][starts],
+        'High': np.fmax.reduceat(values['High'], starts),
+        'Low': np.fmin.reduceat(values['Low'], starts),
+        'Close': values['Close'][ends],
+    }
+    if 'Volume' in values:
+        resampled['Volume'] = np.add.reduceat(np.nan_to_num(values['Volume']), starts)
+
+    index = pd.DatetimeIndex(keys[starts].astype('datetime64[ns]'), name=index_name)
+    return pd.DataFrame(resampled, index=index, columns=columns)
+
+
+# Function to build coarser candles from finer ones, aligned to the session open
+def resample_candles(stock_data, interval, market='NSE'):
+    """
+    Aggregates finer candles into buckets of `interval` counted from each day's session open,
+    so a bucket never spans two sessions and a short last bucket of the day is kept.
+    Args:
+        stock_data: DataFrame with Open, High, Low, Close (and optionally Volume) columns and a
+            DatetimeIndex. A naive index is taken to be in the market's local time.
+        interval: Bucket size such as '2h', '4h', '75m', '125m' or a number of minutes.
+        market: Key of SESSION_OPENS giving the session open, e.g. 'NSE' or 'NASDAQ'.
+    Returns:
+        DataFrame of the resampled candles indexed by each bucket's start time, in the same
+        timezone as the input. Open is the first open, High the highest high, Low the lowest
+        low, Close the last close and Volume the sum.
+    """
+    minutes = interval_minutes(interval)
+    session_open, market_tz = SESSION_OPENS[market]
+    open_hour, open_minute = (int(part) for part in session_open.split(':'))
+
+    stock_data, columns = _prepare(stock_data)
+    if stock_data.empty:
+        return pd.DataFrame(columns=columns)
+
+    index = pd.DatetimeIndex(stock_data.index)
+    local = index.tz_convert(market_tz).tz_localize(None) if index.tz is not None else index
+    local = local.as_unit('ns')
+
+    # Minutes since the session open of each candle's own day, and the bucket it falls in
+    open_ns = local.normalize().asi8 + (open_hour * 60 + open_minute) * 60 * 10**9
+    bucket = np.floor_divide(local.asi8 - open_ns, minutes * 60 * 10**9)
+    bucket_start = open_ns + bucket * minutes * 60 * 10**9
+
+    result = _aggregate(stock_data, columns, bucket_start, index.name)
+    if index.tz is not None:
+        result.index = result.index.tz_localize(market_tz).tz_convert(index.tz)
+    return result
+
+
+# Function to build daily candles from intraday ones, one per session day
+def resample_daily(stock_data, market='NSE'):
+    """
+    Aggregates intraday candles into one candle per trading day of the market, indexed by the
+    day at midnight (naive, like yfinance daily data).
+    """
+    _, market_tz = SESSION_OPENS[market]
+    stock_data, columns = _prepare(stock_data)
+    if stock_data.empty:
+        return pd.DataFrame(columns=columns)
+
+    index = pd.DatetimeIndex(stock_data.index)
+    local = index.tz_convert(market_tz).tz_localize(None) if index.tz is not None else index
+    days = local.normalize().as_unit('ns').asi8
+    return _aggregate(stock_data, columns, days, index.name)
+
+
+# Function to derive several timeframes from one finely grained series
+def derive_timeframes(stock_data, timeframes, market='NSE', starts=None):
+    """
+    Builds every requested timeframe locally from one fetched series, so a symbol needs a
+    single history request however many timeframes are scanned.
+    Args:
+        stock_data: The finest series, e.g. 15-minute or 1-hour candles.
+        timeframes: Timeframes such as '1d', '2h', '1h' or '75m'. A timeframe equal to the
+            resolution of stock_data is returned as is.
+        market: Key of SESSION_OPENS the buckets are aligned to.
+        starts: Optional dictionary of timeframe -> epoch seconds; candles before it are cut
+            so each timeframe keeps the window it was scanned over when fetched on its own.
+    Returns:
+        Dictionary of timeframe -> DataFrame.
+    """
+    starts = starts or {}
+    if len(stock_data) > 1:
+        base_minutes = int(pd.Series(stock_data.index).diff().min() / pd.Timedelta(minutes=1))
+    else:
+        base_minutes = None
+
+    derived = {}
+    for timeframe in timeframes:
+        if timeframe in ('1d', 'D'):
+            data = resample_daily(stock_data, market)
+        elif interval_minutes(timeframe) == base_minutes:
+            data = stock_data
+        else:
+            data = resample_candles(stock_data, timeframe, market)
+
+        if timeframe in starts and not data.empty:
+            start = pd.Timestamp(starts[timeframe], unit='s', tz='UTC')
+            if data.index.tz is not None:
+                start = start.tz_convert(data.index.tz)
+            else:
+                start = start.tz_convert(SESSION_OPENS[market][1]).tz_localize(None).normalize()
+            data = data[data.index >= start]
+        derived[timeframe] = data
+    return derived
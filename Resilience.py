@@ -0,0 +1,194 @@
+import random
+import threading
+import time
+
+import requests
+
+# Retry defaults for broker and market-data calls
+MAX_RETRIES = 4
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 30.0
+
+# Consecutive failures that open a host's circuit, and how long it then stays open
+FAILURE_THRESHOLD = 5
+RESET_TIMEOUT = 30.0
+
+# Host key for the circuit breaker of all yfinance calls
+YAHOO_HOST = 'query1.finance.yahoo.com'
+
+# Errors worth retrying: network failures, timeouts and server-side HTTP errors
+RETRYABLE_ERRORS = (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                    requests.exceptions.HTTPError, ConnectionError, TimeoutError)
+
+# yfinance raises the network errors of its HTTP client and its own rate-limit error; anything
+# else from a yfinance call is a bug, which must neither be retried nor open Yahoo's circuit
+YAHOO_RETRYABLE_ERRORS = RETRYABLE_ERRORS + (requests.exceptions.RequestException,)
+try:
+    from yfinance.exceptions import YFRateLimitError
+    YAHOO_RETRYABLE_ERRORS += (YFRateLimitError,)
+except ImportError:
+    # Older yfinance releases have no rate-limit error of their own
+    pass
+try:
+    from curl_cffi.requests.exceptions import RequestException as CurlRequestException
+    YAHOO_RETRYABLE_ERRORS += (CurlRequestException,)
+except ImportError:
+    # yfinance releases before curl_cffi use requests
+    pass
+
+
+# Function to get the jittered exponential backoff before retry number `attempt`
+def backoff_delay(attempt, base=BACKOFF_BASE, cap=BACKOFF_CAP):
+    # Full jitter: a random wait up to the exponential bound spreads out retrying workers
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class CircuitBreaker:
+    """
+    Tracks consecutive failures against one host. After `failure_threshold` failures the
+    circuit opens and every caller waits in acquire() instead of hitting the host, which
+    pauses the whole worker pool. After `reset_timeout` seconds one trial call is let through;
+    its success closes the circuit, its failure opens it again.
+    """
+
+    def __init__(self, failure_threshold=FAILURE_THRESHOLD, reset_timeout=RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.open_until = None
+        self.trial_running = False
+        self.condition = threading.Condition()
+
+    @property
+    def state(self):
+        with self.condition:
+            if self.open_until is None:
+                return 'closed'
+            return 'half-open' if time.monotonic() >= self.open_until else 'open'
+
+    def acquire(self):
+        """
+        Waits until the circuit lets a call through.
+        Returns:
+            True when the call is the half-open trial. Its caller must end it with
+            record_success(), record_failure() or release_trial().
+        """
+        with self.condition:
+            while self.open_until is not None:
+                wait = self.open_until - time.monotonic()
+                if wait <= 0 and not self.trial_running:
+                    self.trial_running = True
+                    return True
+                self.condition.wait(timeout=wait if wait > 0 else None)
+            return False
+
+    def record_success(self):
+        with self.condition:
+            self.failures = 0
+            self.open_until = None
+            self.trial_running = False
+            self.condition.notify_all()
+
+    def record_failure(self):
+        with self.condition:
+            self.failures += 1
+            if self.trial_running or self.failures >= self.failure_threshold:
+                if self.open_until is None:
+                    print(f"Circuit opened after {self.failures} failures; pausing for {self.reset_timeout}s")
+                self.open_until = time.monotonic() + self.reset_timeout
+                self.trial_running = False
+                self.condition.notify_all()
+
+    def release_trial(self):
+        # The trial ended without telling whether the host recovered; the next caller runs a new one
+        with self.condition:
+            self.trial_running = False
+            self.condition.notify_all()
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+# Function to get the circuit breaker shared by every call to one host
+def circuit_breaker(host, failure_threshold=FAILURE_THRESHOLD, reset_timeout=RESET_TIMEOUT):
+    # The thresholds only apply to the first call for a host, which creates its breaker
+    with _breakers_lock:
+        if host not in _breakers:
+            _breakers[host] = CircuitBreaker(failure_threshold, reset_timeout)
+        return _breakers[host]
+
+
+# Function to call `func` with backoff retries behind the host's circuit breaker
+def call_with_retry(func, *args, host='default', retries=MAX_RETRIES, retryable=RETRYABLE_ERRORS, **kwargs):
+    """
+    Calls func(*args, **kwargs) and retries it on retryable errors with jittered exponential
+    backoff. Every attempt first waits for the host's circuit to allow it. Other errors are
+    raised at once; they say nothing about the host, so they neither open nor close the circuit.
+    Returns:
+        The result of func. The last error is raised once the retries are used up.
+    """
+    breaker = circuit_breaker(host)
+    for attempt in range(retries + 1):
+        trial = breaker.acquire()
+        try:
+            result = func(*args, **kwargs)
+        except retryable as e:
+            breaker.record_failure()
+            if attempt == retries:
+                raise
+            delay = backoff_delay(attempt)
+            print(f"Request to {host} failed ({e}); retry {attempt + 1}/{retries} in {delay:.1f}s")
+            time.sleep(delay)
+        except BaseException:
+            # A half-open trial must always end, or every later caller waits for it forever
+            if trial:
+                breaker.release_trial()
+            raise
+        else:
+            breaker.record_success()
+            return result
+
+
+class RetryQueue:
+    """
+    Collects calls that still failed after their retries so the scan can carry on and try
+    them again once at the end, instead of silently dropping them.
+    """
+
+    def __init__(self):
+        self.pending = {}
+        self.lock = threading.Lock()
+
+    def add(self, key, func, *args, **kwargs):
+        with self.lock:
+            self.pending[key] = (func, args, kwargs)
+
+    def __len__(self):
+        return len(self.pending)
+
+    def drain(self, rounds=2, pause=RESET_TIMEOUT):
+        """
+        Re-runs the queued calls up to `rounds` times, waiting `pause` seconds between rounds.
+        Returns:
+            Dictionary of key -> result for the calls that succeeded. Keys that failed in
+            every round are printed and stay in `pending`.
+        """
+        results = {}
+        for round_number in range(rounds):
+            if not self.pending:
+                break
+            if round_number > 0:
+                time.sleep(pause)
+            print(f"Retrying {len(self.pending)} failed requests (round {round_number + 1}/{rounds})")
+            for key, (func, args, kwargs) in list(self.pending.items()):
+                try:
+                    results[key] = func(*args, **kwargs)
+                except Exception as e:
+                    print(f"Retry failed for {key}: {str(e)}")
+                    continue
+                del self.pending[key]
+
+        for key in self.pending:
+            print(f"Giving up on {key} after the retry rounds.")
+        return results
@@ -0,0 +1,139 @@
+import multiprocessing
+import os
+
+from Resample import derive_timeframes
+from ZoneEngine import refresh_zone_rows
+from ZoneStore import ZONE_DB, ZoneStore
+
+# Rows per executemany transaction of the writer
+WRITE_BATCH_SIZE = 5000
+
+# Queue the pool workers send their rows to; set in each worker by _init_worker
+_row_queue = None
+
+
+# Function to upsert zone rows from the queue in large transactions until told to stop
+def _write_rows(db_path, row_queue, batch_size):
+    store = ZoneStore(db_path)
+    conn = store.connect()
+    pending = {}
+    pending_count = 0
+
+    def flush():
+        for (timeframe, market), rows in pending.items():
+            store.upsert(rows, timeframe, market, conn=conn)
+        conn.commit()
+        pending.clear()
+
+    while True:
+        item = row_queue.get()
+        if item is None:
+            break
+        key, rows = item
+        pending.setdefault(key, []).extend(rows)
+        pending_count += len(rows)
+        if pending_count >= batch_size:
+            flush()
+            pending_count = 0
+
+    flush()
+    conn.close()
+
+
+def _init_worker(row_queue):
+    global _row_queue
+    _row_queue = row_queue
+
+
+# Function to find and classify the zones of one symbol in every requested timeframe
+def scan_symbol(stock_symbol, stock_data, specs, states=None):
+    """
+    Args:
+        stock_symbol: Symbol stored in the zones table.
+        stock_data: The symbol's candles. Each spec either uses them as they are or derives
+            its timeframe from them.
+        specs: List of dictionaries with 'timeframe', 'market' and 'date_format', and optionally
+            'derive' (build the timeframe from stock_data), 'starts' (window start per
+            timeframe), 'rule' ('first_test' or 'last_test'), 'mark_bad' and 'last_bar_closed'
+            (see refresh_zone_rows).
+        states: Optional list with the symbol's stored zones for each spec; live zones resume
+            from their cursor and terminal ones are skipped instead of being resolved again.
+    Returns:
+        List of ((timeframe, market), rows) pairs.
+    """
+    timeframes = [spec['timeframe'] for spec in specs if spec.get('derive')]
+    derived = {}
+    if timeframes:
+        starts = {}
+        for spec in specs:
+            starts.update(spec.get('starts', {}))
+        derived = derive_timeframes(stock_data, timeframes, market=specs[0].get('market', 'NSE'), starts=starts)
+
+    results = []
+    for spec, spec_states in zip(specs, states or [[]] * len(specs)):
+        data = derived[spec['timeframe']] if spec.get('derive') else stock_data
+        rows = refresh_zone_rows(stock_symbol, data, spec_states, spec['date_format'],
+                                 rule=spec.get('rule', 'first_test'), mark_bad=spec.get('mark_bad', True),
+                                 last_bar_closed=spec.get('last_bar_closed', False))
+        results.append(((spec['timeframe'], spec.get('market', 'NSE')), rows))
+    return results
+
+
+# Function run by the pool for one symbol: scan it and hand the rows to the writer
+def _scan_job(job):
+    stock_symbol, stock_data, specs, states = job
+    try:
+        results = scan_symbol(stock_symbol, stock_data, specs, states)
+    except Exception as e:
+        print(f"Error processing {stock_symbol}: {str(e)}")
+        return stock_symbol, 0
+    count = 0
+    for key, rows in results:
+        if rows:
+            _row_queue.put((key, rows))
+            count += len(rows)
+    return stock_symbol, count
+
+
+# Function to scan a universe of symbols on all cores with one batched SQLite writer
+def run_scan(series, specs, db_path=ZONE_DB, processes=None, batch_size=WRITE_BATCH_SIZE):
+    """
+    Fans the symbols out to a process pool for the zone detection and streams the zone rows
+    to a single writer process that upserts them into the zones table in large transactions.
+    Zones already stored resume from their last evaluated candle, and zones in a terminal
+    state are skipped, so a refresh costs time in proportion to the new candles.
+    Args:
+        series: Iterable of (symbol, DataFrame) pairs. It is consumed lazily, so a generator
+            that fetches the candles overlaps the fetching with the scanning.
+        specs: Timeframes to scan in each series, see scan_symbol.
+        db_path: SQLite database of the zones table.
+        processes: Pool size; defaults to the number of cores.
+        batch_size: Rows per writer transaction.
+    Returns:
+        Dictionary of symbol -> number of zones written.
+    """
+    processes = processes or os.cpu_count() or 1
+    store = ZoneStore(db_path)
+    spec_states = [store.zone_states(spec['timeframe'], spec.get('market', 'NSE')) for spec in specs]
+    row_queue = multiprocessing.Queue(maxsize=processes * 4)
+    writer = multiprocessing.Process(target=_write_rows, args=(db_path, row_queue, batch_size))
+    writer.start()
+
+    counts = {}
+    try:
+        jobs = ((symbol, stock_data, specs, [states.get(symbol, []) for states in spec_states])
+                for symbol, stock_data in series if stock_data is not None)
+        with multiprocessing.Pool(processes, initializer=_init_worker, initargs=(row_queue,)) as pool:
+            for symbol, count in pool.imap_unordered(_scan_job, jobs, chunksize=1):
+                counts[symbol] = count
+                print(f"Scanned {symbol}: {count} zones")
+            # Let the workers exit on their own so their queue feeders flush; leaving the block
+            # terminates them, which can drop rows or kill one holding the queue's write lock
+            pool.close()
+            pool.join()
+    finally:
+        row_queue.put(None)
+        writer.join()
+
+    print(f"Wrote {sum(counts.values())} zones for {len(counts)} symbols")
+    return counts
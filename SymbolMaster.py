@@ -0,0 +1,165 @@
+import csv
+import datetime
+import os
+import re
+import sqlite3
+
+SYMBOL_DB = '../StockSymbols.db'
+
+# Local copy of the Fyers symbol master (https://public.fyers.in/sym_details/NSE_CM.csv)
+SYMBOL_MASTER_FILE = 'NSE_CM.csv'
+
+# Columns of the Fyers symbol master CSV, which has no header row
+MASTER_NAME_COLUMN = 1
+MASTER_TICKER_COLUMN = 9
+MASTER_SYMBOL_COLUMN = 13
+
+# Fyers error code for a symbol it does not know
+INVALID_SYMBOL_CODE = -300
+
+
+# Function to convert a yfinance NSE ticker such as 'SBIN.NS' to the Fyers 'NSE:SBIN-EQ' form
+def to_fyers_symbol(symbol):
+    if symbol.endswith('.NS'):
+        return 'NSE:' + symbol.split('.')[0] + '-EQ'
+    else:
+        return 'NSE:' + symbol + '-EQ'
+
+
+# Function to reduce a symbol to upper-case letters and digits so spelling variants match
+def _normalize(symbol):
+    if symbol.endswith('.NS'):
+        symbol = symbol[:-3]
+    return re.sub(r'[^A-Z0-9]', '', symbol.upper())
+
+
+class SymbolMaster:
+    """
+    Persistent index of the tradable NSE equity tickers plus a negative cache of the tickers
+    Fyers rejected, so a scan can check its universe before requesting any history.
+    """
+
+    def __init__(self, db_path=SYMBOL_DB):
+        self.db_path = db_path
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS symbol_master (
+            ticker TEXT PRIMARY KEY,
+            symbol TEXT,
+            name TEXT,
+            normalized TEXT
+        )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_symbol_master_normalized ON symbol_master (normalized)")
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS invalid_symbols (
+            ticker TEXT PRIMARY KEY,
+            reason TEXT,
+            rejected_at TEXT
+        )
+        """)
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS symbol_master_source (
+            path TEXT PRIMARY KEY,
+            mtime REAL
+        )
+        """)
+        conn.commit()
+        conn.close()
+
+    def refresh(self, master_file=SYMBOL_MASTER_FILE):
+        """
+        Reloads the index from the symbol master file when the file changed since the last
+        load. Tickers that are listed again are dropped from the negative cache.
+        Returns:
+            True if the index was reloaded.
+        """
+        if not os.path.exists(master_file):
+            print(f"Symbol master file not found: {master_file}")
+            return False
+
+        mtime = os.path.getmtime(master_file)
+        conn = sqlite3.connect(self.db_path)
+        row = conn.execute("SELECT mtime FROM symbol_master_source WHERE path = ?", (master_file,)).fetchone()
+        if row is not None and row[0] >= mtime:
+            conn.close()
+            return False
+
+        rows = []
+        with open(master_file, newline='', encoding='utf-8') as f:
+            for record in csv.reader(f):
+                if len(record) <= MASTER_SYMBOL_COLUMN:
+                    continue
+                ticker = record[MASTER_TICKER_COLUMN].strip()
+                # Only cash-market equities are scanned
+                if not ticker.startswith('NSE:') or not ticker.endswith('-EQ'):
+                    continue
+                symbol = record[MASTER_SYMBOL_COLUMN].strip()
+                rows.append((ticker, symbol, record[MASTER_NAME_COLUMN].strip(), _normalize(symbol)))
+
+        conn.execute("DELETE FROM symbol_master")
+        conn.executemany("INSERT OR REPLACE INTO symbol_master (ticker, symbol, name, normalized) VALUES (?, ?, ?, ?)", rows)
+        conn.execute("DELETE FROM invalid_symbols WHERE ticker IN (SELECT ticker FROM symbol_master)")
+        conn.execute("INSERT OR REPLACE INTO symbol_master_source (path, mtime) VALUES (?, ?)", (master_file, mtime))
+        conn.commit()
+        conn.close()
+        print(f"Loaded {len(rows)} symbols from {master_file}")
+        return True
+
+    def mark_invalid(self, ticker, reason=''):
+        conn = sqlite3.connect(self.db_path)
+        conn.execute(
+            "INSERT OR REPLACE INTO invalid_symbols (ticker, reason, rejected_at) VALUES (?, ?, ?)",
+            (ticker, reason, datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+        )
+        conn.commit()
+        conn.close()
+
+    def invalid_tickers(self):
+        conn = sqlite3.connect(self.db_path)
+        tickers = {row[0] for row in conn.execute("SELECT ticker FROM invalid_symbols")}
+        conn.close()
+        return tickers
+
+    def resolve(self, symbols):
+        """
+        Maps scan symbols (e.g. 'SBIN.NS' or 'Bajaj-AUTO.NS') to Fyers tickers.
+        A symbol is matched exactly first and then by its letters and digits only. Without a
+        loaded master every symbol keeps the plain NSE:<symbol>-EQ mapping.
+        Returns:
+            (resolved, rejected): dictionary of symbol -> Fyers ticker, and the list of symbols
+            that are not listed or that Fyers rejected before.
+        """
+        conn = sqlite3.connect(self.db_path)
+        by_symbol = {}
+        by_normalized = {}
+        for ticker, symbol, normalized in conn.execute("SELECT ticker, symbol, normalized FROM symbol_master"):
+            by_symbol[symbol] = ticker
+            by_normalized.setdefault(normalized, ticker)
+        invalid = {row[0] for row in conn.execute("SELECT ticker FROM invalid_symbols")}
+        conn.close()
+
+        resolved = {}
+        rejected = []
+        for symbol in dict.fromkeys(symbols):
+            if by_symbol:
+                bare = symbol[:-3] if symbol.endswith('.NS') else symbol
+                ticker = by_symbol.get(bare) or by_normalized.get(_normalize(symbol))
+            else:
+                ticker = to_fyers_symbol(symbol)
+
+            if ticker is None or ticker in invalid:
+                rejected.append(symbol)
+            else:
+                resolved[symbol] = ticker
+        return resolved, rejected
+
+
+# Function to check and canonicalize a scan universe before any history is requested
+def resolve_universe(symbols, master_file=SYMBOL_MASTER_FILE, master=None):
+    master = master or SymbolMaster()
+    master.refresh(master_file)
+    resolved, rejected = master.resolve(symbols)
+    if rejected:
+        print(f"Skipping {len(rejected)} unknown or rejected symbols: {', '.join(rejected)}")
+    return resolved
@@ -0,0 +1,453 @@
+import numpy as np
+import pandas as pd
+
+from RangeIndex import CandleRangeIndex
+
+# Colour codes used in the classification arrays
+GREEN = 1
+RED = -1
+NEUTRAL = 0
+
+# Zone classification for each (first long candle colour, second long candle colour) pair
+ZONE_PATTERNS = {
+    (RED, RED): ('Supply Zone', 'DBD'),
+    (GREEN, GREEN): ('Demand Zone', 'RBR'),
+    (RED, GREEN): ('Demand Zone', 'DBR'),
+    (GREEN, RED): ('Supply Zone', 'RBD'),
+}
+
+ZONE_COLUMNS = [
+    'start_index', 'end_index', 'base_candles_count', 'zone_type', 'zone_classification',
+    'price_range_high', 'price_range_low', 'is_bad'
+]
+
+
+# Function to read a price column as a flat float array
+def _column(stock_data, name):
+    # yf.download returns a one-column frame per field for a single ticker, so flatten it
+    return np.asarray(stock_data[name], dtype=float).reshape(-1)
+
+
+# Function to classify every candle as Long/Base and green/red in one pass
+def classify_candles(stock_data, long_candle_factor=1.5, avg_candle_size=None):
+    """
+    Classifies all candles of a series at once.
+    Args:
+        stock_data: DataFrame with 'Open', 'High', 'Low' and 'Close' columns.
+        long_candle_factor: Multiple of the average candle size that makes a candle Long.
+        avg_candle_size: None averages the candle size over the whole series. 'expanding'
+            averages it over the candles up to and including each candle, which is what a
+            detector fed one closed bar at a time can know. A number is used as it is.
+    Returns:
+        Dictionary of NumPy arrays (open, high, low, close, close_rounded, candle_size, color,
+        is_long) plus avg_candle_size and long_candle_threshold, which are arrays with
+        'expanding' and scalars otherwise.
+        Candle 0 has no previous close, so its candle_size is NaN and it is never Long.
+    """
+    open_ = _column(stock_data, 'Open')
+    high = _column(stock_data, 'High')
+    low = _column(stock_data, 'Low')
+    close = _column(stock_data, 'Close')
+
+    # Candle size is the absolute close-to-close change, rounded to 1 decimal
+    candle_size = np.full(len(close), np.nan)
+    candle_size[1:] = np.round(np.abs(np.diff(close)), 1)
+
+    if avg_candle_size is None:
+        avg_candle_size = round(float(np.mean(candle_size[1:])), 1) if len(close) > 1 else 0.0
+    elif avg_candle_size == 'expanding':
+        # Sequential running sum, so the online detector's averages match bit for bit
+        avg_candle_size = np.full(len(close), np.nan)
+        avg_candle_size[1:] = np.round(np.cumsum(candle_size[1:]) / np.arange(1, len(close)), 1)
+    long_candle_threshold = avg_candle_size * long_candle_factor
+
+    is_long = np.zeros(len(close), dtype=bool)
+    is_long[1:] = candle_size[1:] >= (long_candle_threshold[1:] if np.ndim(long_candle_threshold) else
+                                      long_candle_threshold)
+
+    color = np.sign(close - open_).astype(np.int8)
+
+    return {
+        'open': open_,
+        'high': high,
+        'low': low,
+        'close': close,
+        'close_rounded': np.round(close, 1),
+        'candle_size': candle_size,
+        'color': color,
+        'is_long': is_long,
+        'avg_candle_size': avg_candle_size,
+        'long_candle_threshold': long_candle_threshold,
+    }
+
+
+# Function to get the lower and upper body edge of every candle
+def candle_bodies(candles):
+    """
+    Body edges as combine_multiple_base_candles took them: the open and the close rounded to 1
+    decimal, picked by the colour of the unrounded candle. A green body runs from the open up to
+    the close and a red body from the close up to the open, even where rounding moves the close
+    past the open; only neutral candles take the min and max. The first base candle of a zone
+    is the exception and always takes the min and max, see first_base_bodies.
+    """
+    open_ = candles['open']
+    close = candles['close_rounded']
+    color = candles['color']
+    lowest_body = np.where(color == GREEN, open_, np.where(color == RED, close, np.minimum(open_, close)))
+    highest_body = np.where(color == GREEN, close, np.where(color == RED, open_, np.maximum(open_, close)))
+    return lowest_body, highest_body
+
+
+# Function to get the body edges of the first base candle of zones
+def first_base_bodies(candles, position):
+    # combine_multiple_base_candles seeded the body with min/max of the first candle, whatever its colour
+    open_ = candles['open'][position]
+    close = candles['close_rounded'][position]
+    return np.minimum(open_, close), np.maximum(open_, close)
+
+
+# Function to index the base candles of a series for combined-base-candle range queries
+def build_base_candle_index(candles, max_span=None):
+    """
+    Builds the masked CandleRangeIndex over the Base candles returned by classify_candles, so
+    the combined base candle between any two long candles is a constant-time query.
+    """
+    lowest_body, highest_body = candle_bodies(candles)
+    return CandleRangeIndex(
+        candles['high'], candles['low'], lowest_body, highest_body,
+        mask=~candles['is_long'], max_span=max_span
+    )
+
+
+# Function to find all demand and supply zones of a series
+def find_zones(stock_data, max_base_candles=6, long_candle_factor=1.5, avg_candle_size=None):
+    """
+    Finds the demand and supply zones between consecutive long candles.
+    Args:
+        stock_data: DataFrame with 'Open', 'High', 'Low' and 'Close' columns.
+        max_base_candles: Largest number of base candles allowed between the two long candles.
+        long_candle_factor: Multiple of the average candle size that makes a candle Long.
+        avg_candle_size: How the average candle size is taken, see classify_candles.
+    Returns:
+        DataFrame with one row per zone and the columns in ZONE_COLUMNS. start_index and
+        end_index are positions in stock_data of the two long candles.
+    """
+    candles = classify_candles(stock_data, long_candle_factor, avg_candle_size)
+    long_index = np.flatnonzero(candles['is_long'])
+    if len(long_index) < 2:
+        return pd.DataFrame(columns=ZONE_COLUMNS)
+
+    start = long_index[:-1]
+    end = long_index[1:]
+    base_count = end - start - 1
+
+    color = candles['color']
+    first_color = color[start]
+    second_color = color[end]
+    classified = (first_color != NEUTRAL) & (second_color != NEUTRAL)
+
+    keep = classified & (base_count >= 1) & (base_count <= max_base_candles)
+    start, end, base_count = start[keep], end[keep], base_count[keep]
+    first_color, second_color = first_color[keep], second_color[keep]
+    if len(start) == 0:
+        return pd.DataFrame(columns=ZONE_COLUMNS)
+
+    # Combine the base candles of every zone with constant-time range queries. The first base
+    # candle's body counts with its min and max, the others' by colour (see candle_bodies).
+    high, low = candles['high'], candles['low']
+    base_index = build_base_candle_index(candles, max_span=max_base_candles)
+    base = base_index.combine(start + 1, end)
+    base_high, base_low = base['high'], base['low']
+    later = base_index.combine(start + 2, end)
+    first_lowest_body, first_highest_body = first_base_bodies(candles, start + 1)
+    base_lowest_body = np.fmin(first_lowest_body, later['lowest_body'])
+    base_highest_body = np.fmax(first_highest_body, later['highest_body'])
+
+    is_dbd = (first_color == RED) & (second_color == RED)
+    is_rbr = (first_color == GREEN) & (second_color == GREEN)
+    is_dbr = (first_color == RED) & (second_color == GREEN)
+    # DBD and RBD break down out of the base, so the second long candle is red for supply zones
+    is_supply = second_color == RED
+
+    # Supply zones span wick high to lowest body, demand zones wick low to highest body
+    price_range_high = np.select(
+        [is_dbd, is_rbr, is_dbr],
+        [base_high, base_low, np.minimum(base_low, low[start])],
+        default=np.maximum(base_high, high[start])
+    )
+    price_range_low = np.where(is_supply, base_lowest_body, base_highest_body)
+
+    # A zone is Bad when the breakout candle's wick exceeds 10% of its body
+    end_open = candles['open'][end]
+    end_close = candles['close_rounded'][end]
+    wick = np.where(
+        is_supply,
+        low[end] - np.minimum(end_open, end_close),
+        high[end] - np.maximum(end_open, end_close)
+    )
+    is_bad = wick > 0.1 * np.abs(end_open - end_close)
+
+    zone_type, zone_classification = zip(*(
+        ZONE_PATTERNS[(a, b)] for a, b in zip(first_color.tolist(), second_color.tolist())
+    ))
+
+    return pd.DataFrame({
+        'start_index': start,
+        'end_index': end,
+        'base_candles_count': base_count,
+        'zone_type': zone_type,
+        'zone_classification': zone_classification,
+        'price_range_high': np.round(price_range_high, 2),
+        'price_range_low': np.round(price_range_low, 2),
+        'is_bad': is_bad,
+    }, columns=ZONE_COLUMNS)
+
+
+# Function to find the first test and first violation of many zones in one pass
+def resolve_zone_events(end_index, price_range_high, price_range_low, is_supply, high, low, close,
+                        supply_test='wick', track_last_test=False, block_size=4096, zone_chunk=512):
+    """
+    Scans the candles after every zone once, in bounded blocks, and finds when each zone was
+    first tested and first violated.
+    Args:
+        end_index: Position of each zone's second long candle; scanning starts after it.
+        price_range_high, price_range_low: Zone bounds as stored in the zones table.
+        is_supply: True for supply zones, False for demand zones.
+        high, low, close: Price arrays of the whole series.
+        supply_test: 'wick' tests a supply zone when the high or low enters it, 'close' when the
+            close does. Demand zones are always tested by the high or low.
+        track_last_test: Also report the last test before the violation (or end of data).
+        block_size, zone_chunk: Candles and zones per block; memory stays block_size * zone_chunk.
+    Returns:
+        (first_tested, first_violated, last_tested) arrays of candle positions, -1 where the zone
+        never was. A test on the violating candle or later is not reported, because the
+        violation is checked first and ends the zone.
+    """
+    end_index = np.asarray(end_index, dtype=np.int64)
+    zone_high = np.asarray(price_range_high, dtype=float)
+    zone_low = np.asarray(price_range_low, dtype=float)
+    is_supply = np.asarray(is_supply, dtype=bool)
+    high = np.asarray(high, dtype=float).reshape(-1)
+    low = np.asarray(low, dtype=float).reshape(-1)
+    close = np.asarray(close, dtype=float).reshape(-1)
+
+    zone_count = len(end_index)
+    first_tested = np.full(zone_count, -1, dtype=np.int64)
+    first_violated = np.full(zone_count, -1, dtype=np.int64)
+    last_tested = np.full(zone_count, -1, dtype=np.int64)
+    close_test = is_supply & (supply_test == 'close')
+
+    # Zones become live once the scan passes their end candle, so walk them in end order
+    order = np.argsort(end_index, kind='stable')
+    live = np.zeros(zone_count, dtype=bool)
+    next_zone = 0
+
+    for block_start in range(0, len(close), block_size):
+        block_end = min(block_start + block_size, len(close))
+        while next_zone < zone_count and end_index[order[next_zone]] < block_end - 1:
+            live[order[next_zone]] = True
+            next_zone += 1
+
+        live_zones = np.flatnonzero(live)
+        positions = np.arange(block_start, block_end)
+        block_high = high[block_start:block_end]
+        block_low = low[block_start:block_end]
+        block_close = close[block_start:block_end]
+
+        for chunk_start in range(0, len(live_zones), zone_chunk):
+            zones = live_zones[chunk_start:chunk_start + zone_chunk]
+            zh = zone_high[zones, None]
+            zl = zone_low[zones, None]
+            supply = is_supply[zones, None]
+            after_zone = positions[None, :] > end_index[zones, None]
+
+            violated = after_zone & np.where(supply, block_close > zh, block_close < zl)
+            wick_in_zone = ((zl <= block_high) & (block_high <= zh)) | ((zl <= block_low) & (block_low <= zh))
+            close_in_zone = (zl <= block_close) & (block_close <= zh)
+            tested = after_zone & np.where(close_test[zones, None], close_in_zone, wick_in_zone)
+
+            has_violation = violated.any(axis=1)
+            violation_index = np.where(has_violation, violated.argmax(axis=1) + block_start, block_end)
+            tested &= positions[None, :] < violation_index[:, None]
+            has_test = tested.any(axis=1)
+
+            new_test = has_test & (first_tested[zones] < 0)
+            first_tested[zones[new_test]] = tested[new_test].argmax(axis=1) + block_start
+            if track_last_test:
+                last_tested[zones[has_test]] = block_end - 1 - tested[has_test][:, ::-1].argmax(axis=1)
+            first_violated[zones[has_violation]] = violation_index[has_violation]
+
+            # A violated zone is finished; without last-test tracking so is a tested one
+            finished = has_violation if track_last_test else has_violation | (first_tested[zones] >= 0)
+            live[zones[finished]] = False
+
+    return first_tested, first_violated, last_tested
+
+
+# Function to resolve Active/Tested/Violated for every zone found by find_zones
+def resolve_zone_statuses(zones, stock_data, rule='first_test'):
+    """
+    Applies the update_zone_status rules to all zones of a series at once.
+    Args:
+        zones: DataFrame returned by find_zones.
+        stock_data: The DataFrame the zones were found in.
+        rule: 'first_test': the first candle after the zone that closes beyond it violates the
+            zone, and the first one whose high or low enters the range before that tests it;
+            a test takes precedence over a later violation.
+            'last_test': a violation takes precedence and keeps the violating candle as the
+            tested date; otherwise the zone is Tested by the last candle entering the range
+            (the close for supply zones, the high or low for demand zones).
+    Returns:
+        (zone_status, tested_index) arrays; tested_index is -1 for Active zones.
+    """
+    last_test = rule == 'last_test'
+    first_tested, first_violated, last_tested = resolve_zone_events(
+        zones['end_index'], zones['price_range_high'], zones['price_range_low'],
+        zones['zone_type'] == 'Supply Zone',
+        _column(stock_data, 'High'), _column(stock_data, 'Low'), _column(stock_data, 'Close'),
+        supply_test='close' if last_test else 'wick', track_last_test=last_test
+    )
+    if last_test:
+        zone_status = np.where(first_violated >= 0, 'Violated', np.where(last_tested >= 0, 'Tested', 'Active'))
+        return zone_status, np.where(first_violated >= 0, first_violated, last_tested)
+
+    zone_status = np.where(first_tested >= 0, 'Tested', np.where(first_violated >= 0, 'Violated', 'Active'))
+    return zone_status, first_tested
+
+
+# Columns of a row of the zones table, in insert order
+ZONE_ROW_COLUMNS = [
+    'symbol', 'start_date', 'end_date', 'base_candles_count', 'zone_type', 'zone_classification',
+    'price_range_high', 'price_range_low', 'zone_status', 'tested_date'
+]
+
+
+# Function to find the zones of a series and format them as rows of a zones table
+def zone_rows(stock_symbol, stock_data, date_format='%Y-%m-%d %H:%M:%S', rule='first_test', mark_bad=True,
+              avg_candle_size=None):
+    """
+    Runs find_zones and resolve_zone_statuses and returns one tuple per zone in the order of
+    ZONE_ROW_COLUMNS, with dates formatted by date_format. With mark_bad, zones whose breakout
+    candle has a long wick get the status 'Bad'.
+    """
+    if stock_data is None or stock_data.empty:
+        return []
+    zones = find_zones(stock_data, avg_candle_size=avg_candle_size)
+    if zones.empty:
+        return []
+    zone_statuses, tested_indexes = resolve_zone_statuses(zones, stock_data, rule)
+
+    dates = pd.DatetimeIndex(stock_data.index).strftime(date_format)
+    zone_statuses = np.where(zones['is_bad'].to_numpy(dtype=bool) & mark_bad, 'Bad', zone_statuses)
+    tested_dates = [dates[i] if i >= 0 else None for i in tested_indexes.tolist()]
+
+    return list(zip(
+        [stock_symbol] * len(zones),
+        dates[zones['start_index'].to_numpy()].tolist(),
+        dates[zones['end_index'].to_numpy()].tolist(),
+        zones['base_candles_count'].tolist(),
+        zones['zone_type'].tolist(),
+        zones['zone_classification'].tolist(),
+        zones['price_range_high'].tolist(),
+        zones['price_range_low'].tolist(),
+        zone_statuses.tolist(),
+        tested_dates,
+    ))
+
+
+# Statuses a zone never leaves under each rule, so a refresh never scans it again
+TERMINAL_STATUSES = {
+    'first_test': ('Tested', 'Violated', 'Bad'),
+    'last_test': ('Violated', 'Bad'),
+}
+
+# Columns of a stored zone a refresh resumes from: a zones row plus its cursor, the epoch of the
+# last candle its status was evaluated on
+ZONE_STATE_COLUMNS = ZONE_ROW_COLUMNS + ['last_bar_ts']
+
+
+# Function to bring stored zones up to date and add the new zones of a series, scanning only new candles
+def refresh_zone_rows(stock_symbol, stock_data, states=(), date_format='%Y-%m-%d %H:%M:%S', rule='first_test',
+                      mark_bad=True, last_bar_closed=False):
+    """
+    Incremental form of zone_rows. Zones already stored resume from their cursor: only the
+    candles after it are scanned, and their stored status and tested date carry over when
+    nothing new happens. Zones in a terminal state are not scanned or returned again.
+    Zones found in the series that are not stored yet are resolved from their end candle.
+    The last candle of a series may still be forming, and a cursor never moves back over it,
+    so it is left out like refresh_indicators does and scanned on a later refresh once it has
+    closed. The result equals what zone_rows gives over the closed candles.
+    Args:
+        states: Stored zones of the symbol, tuples in the order of ZONE_STATE_COLUMNS.
+        stock_data: The symbol's candles; they must reach back to the oldest cursor for a resumed
+            zone to see every candle after it.
+        last_bar_closed: True when the last candle is known to be closed, e.g. a daily series
+            fetched after the session, so it is scanned as well.
+    Returns:
+        Rows in the order of ZONE_ROW_COLUMNS followed by the date of the last closed candle,
+        which becomes the new cursor of every returned zone.
+    """
+    if stock_data is not None and not last_bar_closed:
+        stock_data = stock_data.iloc[:-1]
+    if stock_data is None or stock_data.empty:
+        return []
+    dates = pd.DatetimeIndex(stock_data.index).strftime(date_format)
+    # Epochs of the candles as SQLite's strftime('%s', date) gives them for the stored dates
+    bar_ts = pd.to_datetime(pd.Index(dates), format=date_format).as_unit('s').asi8
+
+    stored = {(state[1], state[2]) for state in states}
+    states = [state for state in states if state[8] not in TERMINAL_STATUSES[rule]]
+    zones = find_zones(stock_data)
+    new_zones = zones[[(start, end) not in stored for start, end in
+                       zip(dates[zones['start_index'].to_numpy()], dates[zones['end_index'].to_numpy()])]]
+
+    # A stored zone is scanned after its cursor, or after its end candle if it has none yet
+    resume_ts = np.array([state[10] if state[10] is not None else
+                          int(pd.Timestamp(state[2]).timestamp()) for state in states], dtype=np.int64)
+    scan_after = np.r_[np.searchsorted(bar_ts, resume_ts, side='right') - 1,
+                       new_zones['end_index'].to_numpy(dtype=np.int64)]
+    price_range_high = np.r_[[state[6] for state in states], new_zones['price_range_high'].to_numpy(dtype=float)]
+    price_range_low = np.r_[[state[7] for state in states], new_zones['price_range_low'].to_numpy(dtype=float)]
+    zone_type = [state[4] for state in states] + new_zones['zone_type'].tolist()
+    if not zone_type:
+        return []
+
+    last_test = rule == 'last_test'
+    first_tested, first_violated, last_tested = resolve_zone_events(
+        scan_after, price_range_high, price_range_low, np.array(zone_type) == 'Supply Zone',
+        _column(stock_data, 'High'), _column(stock_data, 'Low'), _column(stock_data, 'Close'),
+        supply_test='close' if last_test else 'wick', track_last_test=last_test
+    )
+    date_at = lambda position: dates[position] if position >= 0 else None
+
+    rows = []
+    last_bar = dates[-1]
+    for i, state in enumerate(states):
+        zone_status, tested_date = state[8], state[9]
+        if last_test and first_violated[i] >= 0:
+            zone_status, tested_date = 'Violated', date_at(first_violated[i])
+        elif last_test and last_tested[i] >= 0:
+            zone_status, tested_date = 'Tested', date_at(last_tested[i])
+        elif not last_test and first_tested[i] >= 0:
+            zone_status, tested_date = 'Tested', date_at(first_tested[i])
+        elif not last_test and first_violated[i] >= 0:
+            zone_status = 'Violated'
+        rows.append(tuple(state[:8]) + (zone_status, tested_date, last_bar))
+
+    offset = len(states)
+    is_bad = new_zones['is_bad'].tolist()
+    new_rows = zip(dates[new_zones['start_index'].to_numpy()].tolist(), dates[new_zones['end_index'].to_numpy()].tolist(),
+                   new_zones['base_candles_count'].tolist(), new_zones['zone_type'].tolist(),
+                   new_zones['zone_classification'].tolist(), new_zones['price_range_high'].tolist(),
+                   new_zones['price_range_low'].tolist())
+    for i, zone in enumerate(new_rows, start=offset):
+        if last_test:
+            zone_status = 'Violated' if first_violated[i] >= 0 else 'Tested' if last_tested[i] >= 0 else 'Active'
+            tested_index = first_violated[i] if first_violated[i] >= 0 else last_tested[i]
+        else:
+            zone_status = 'Tested' if first_tested[i] >= 0 else 'Violated' if first_violated[i] >= 0 else 'Active'
+            tested_index = first_tested[i]
+        if is_bad[i - offset] and mark_bad:
+            zone_status = 'Bad'
+        rows.append((stock_symbol,) + zone + (zone_status, date_at(tested_index), last_bar))
+    return rows
@@ -0,0 +1,222 @@
+import bisect
+import heapq
+
+from ZoneStore import ZoneStore
+
+# Columns of the zones table an index keeps for each zone
+INDEX_COLUMNS = ['symbol', 'timeframe', 'start_date', 'end_date', 'zone_type', 'price_range_high',
+                 'price_range_low', 'zone_status', 'tested_date']
+
+
+class _SymbolZones:
+    """
+    Zones of one symbol as two sorted endpoint lists: zone bottoms and zone tops, each with the
+    zone keys in the same order, plus the sorted zone heights. The zones that can contain a price
+    all have their bottom in [price - tallest, price], and tallest shrinks again when the tallest
+    zone is removed.
+    """
+
+    def __init__(self):
+        self.bottoms = []
+        self.bottom_keys = []
+        self.tops = []
+        self.top_keys = []
+        self.heights = []
+
+    @property
+    def tallest(self):
+        return self.heights[-1] if self.heights else 0.0
+
+    def add(self, key, bottom, top):
+        position = bisect.bisect_right(self.bottoms, bottom)
+        self.bottoms.insert(position, bottom)
+        self.bottom_keys.insert(position, key)
+        position = bisect.bisect_right(self.tops, top)
+        self.tops.insert(position, top)
+        self.top_keys.insert(position, key)
+        bisect.insort(self.heights, top - bottom)
+
+    def remove(self, key, bottom, top):
+        for values, keys, value in ((self.bottoms, self.bottom_keys, bottom), (self.tops, self.top_keys, top)):
+            position = bisect.bisect_left(values, value)
+            while keys[position] != key:
+                position += 1
+            del values[position]
+            del keys[position]
+        del self.heights[bisect.bisect_left(self.heights, top - bottom)]
+
+
+class ZoneIndex:
+    """
+    In-memory price index of zones per symbol. Answers which zones contain a price and which
+    zone is nearest above or below it with binary searches over the sorted zone edges, instead
+    of comparing the price with every zone row.
+
+    Demand zones are stored with price_range_high below price_range_low, so each zone is indexed
+    by its bottom min(high, low) and its top max(high, low). Zones are keyed by
+    (timeframe, start_date, end_date) within their symbol, like the zones table.
+    """
+
+    def __init__(self, statuses=('Active', 'Tested')):
+        """
+        Args:
+            statuses: Zone statuses kept by apply(); rows with any other status are removed.
+        """
+        self.statuses = set(statuses)
+        self.symbols = {}
+        self.zones = {}
+
+    @classmethod
+    def load(cls, store=None, statuses=('Active', 'Tested'), timeframe=None, market=None):
+        """
+        Builds an index from the zones table.
+        Args:
+            store: ZoneStore to read; defaults to the shared zones database.
+            statuses: Zone statuses to load.
+            timeframe: Optional timeframe, e.g. '1h', or tuple of timeframes to load.
+            market: Optional market filter, e.g. 'NSE'.
+        """
+        store = store or ZoneStore()
+        timeframes = timeframe if isinstance(timeframe, (list, tuple)) else [timeframe]
+        rows = (row for zone_status in statuses for zone_timeframe in timeframes
+                for row in store.fetch(INDEX_COLUMNS, zone_status=zone_status, timeframe=zone_timeframe, market=market))
+        return cls.from_zones((dict(zip(INDEX_COLUMNS, row)) for row in rows), statuses)
+
+    @classmethod
+    def from_zones(cls, zones, statuses=('Active', 'Tested')):
+        """
+        Builds an index from zones already read, e.g. the records of a filtered query.
+        Args:
+            zones: Iterable of zone dictionaries, see add().
+        """
+        index = cls(statuses)
+        for zone in zones:
+            index.add(zone)
+        return index
+
+    def __len__(self):
+        return len(self.zones)
+
+    def add(self, zone):
+        """
+        Adds a zone, or replaces the stored zone with the same key.
+        Args:
+            zone: Dictionary with at least symbol, timeframe, start_date, end_date,
+                price_range_high and price_range_low; it is returned as is by the queries.
+        """
+        key = (zone['symbol'], zone['timeframe'], zone['start_date'], zone['end_date'])
+        if key in self.zones:
+            self.remove(*key)
+        bottom = min(zone['price_range_high'], zone['price_range_low'])
+        top = max(zone['price_range_high'], zone['price_range_low'])
+        self.symbols.setdefault(zone['symbol'], _SymbolZones()).add(key, bottom, top)
+        self.zones[key] = zone
+
+    def remove(self, symbol, timeframe, start_date, end_date):
+        """
+        Removes a zone if it is indexed. Returns the removed zone or None.
+        """
+        key = (symbol, timeframe, start_date, end_date)
+        zone = self.zones.pop(key, None)
+        if zone is not None:
+            symbol_zones = self.symbols[symbol]
+            symbol_zones.remove(key, min(zone['price_range_high'], zone['price_range_low']),
+                                max(zone['price_range_high'], zone['price_range_low']))
+            if not symbol_zones.bottoms:
+                del self.symbols[symbol]
+        return zone
+
+    def apply(self, rows, timeframe):
+        """
+        Updates the index with rows in the order of ZoneEngine.ZONE_ROW_COLUMNS, as returned by
+        zone_rows, refresh_zone_rows or OnlineZoneDetector.update. Zones whose status is not in
+        self.statuses are removed.
+        """
+        for row in rows:
+            symbol, start_date, end_date, _, zone_type, _, price_range_high, price_range_low, zone_status, tested_date = row[:10]
+            if zone_status in self.statuses:
+                self.add({'symbol': symbol, 'timeframe': timeframe, 'start_date': start_date, 'end_date': end_date,
+                          'zone_type': zone_type, 'price_range_high': price_range_high,
+                          'price_range_low': price_range_low, 'zone_status': zone_status, 'tested_date': tested_date})
+            else:
+                self.remove(symbol, timeframe, start_date, end_date)
+
+    def containing(self, symbol, price):
+        """
+        Returns the zones of a symbol whose range contains price, edges included.
+        """
+        symbol_zones = self.symbols.get(symbol)
+        if symbol_zones is None:
+            return []
+        bottoms = symbol_zones.bottoms
+        # Only zones starting at most one zone height below the price can reach it
+        first = bisect.bisect_left(bottoms, price - symbol_zones.tallest)
+        last = bisect.bisect_right(bottoms, price)
+        zones = []
+        for key in symbol_zones.bottom_keys[first:last]:
+            zone = self.zones[key]
+            if max(zone['price_range_high'], zone['price_range_low']) >= price:
+                zones.append(zone)
+        return zones
+
+    def nearest_above(self, symbol, price):
+        """
+        Returns the nearest zone of a symbol lying wholly above price, the one with the lowest
+        bottom above it, or None. Zones containing price are not above it; see containing().
+        """
+        symbol_zones = self.symbols.get(symbol)
+        if symbol_zones is None:
+            return None
+        position = bisect.bisect_right(symbol_zones.bottoms, price)
+        if position == len(symbol_zones.bottoms):
+            return None
+        return self.zones[symbol_zones.bottom_keys[position]]
+
+    def nearest_below(self, symbol, price):
+        """
+        Returns the nearest zone of a symbol lying wholly below price, the one with the highest
+        top below it, or None. Zones containing price are not below it; see containing().
+        """
+        symbol_zones = self.symbols.get(symbol)
+        if symbol_zones is None:
+            return None
+        position = bisect.bisect_left(symbol_zones.tops, price)
+        if position == 0:
+            return None
+        return self.zones[symbol_zones.top_keys[position - 1]]
+
+    def split(self, symbol, price):
+        """
+        Splits the zones of a symbol by where their top lies against price, with one binary
+        search over the sorted tops.
+        Returns:
+            (zones with the top below price, zones with the top at price, zones with the top above price).
+        """
+        symbol_zones = self.symbols.get(symbol)
+        if symbol_zones is None:
+            return [], [], []
+        tops, keys = symbol_zones.tops, symbol_zones.top_keys
+        first = bisect.bisect_left(tops, price)
+        last = bisect.bisect_right(tops, price)
+        return ([self.zones[key] for key in keys[:first]], [self.zones[key] for key in keys[first:last]],
+                [self.zones[key] for key in keys[last:]])
+
+    def by_distance(self, symbol, price):
+        """
+        Returns every zone of a symbol as (distance, zone), nearest first, where distance is from
+        price to the nearer edge of the zone. The zones above and below price are already in
+        order in the sorted bottoms and tops; only the zones containing price are sorted.
+        """
+        symbol_zones = self.symbols.get(symbol)
+        if symbol_zones is None:
+            return []
+        bottoms, tops = symbol_zones.bottoms, symbol_zones.tops
+        first_above = bisect.bisect_right(bottoms, price)
+        last_below = bisect.bisect_left(tops, price)
+        above = ((bottoms[i] - price, self.zones[symbol_zones.bottom_keys[i]])
+                 for i in range(first_above, len(bottoms)))
+        below = ((price - tops[i], self.zones[symbol_zones.top_keys[i]]) for i in range(last_below - 1, -1, -1))
+        inside = sorted(((min(price - min(zone['price_range_high'], zone['price_range_low']),
+                               max(zone['price_range_high'], zone['price_range_low']) - price), zone)
+                         for zone in self.containing(symbol, price)), key=lambda item: item[0])
+        return list(heapq.merge(inside, above, below, key=lambda item: item[0]))
@@ -0,0 +1,381 @@
+import argparse
+import heapq
+import itertools
+import sqlite3
+import time
+
+from FyersSession import load_fyers_config
+from GreenList import ZONE_LOOKBACK_DAYS, create_green_red_list_table, fetch_active_zones
+from SymbolMaster import to_fyers_symbol
+from ZoneStore import ZONE_DB
+
+GREEN_RED_DB = '../StockDZSZ.db'
+GREEN_LIST = 'Green List'
+RED_LIST = 'Red List'
+
+# Seconds between two reads of the zones table while ticks arrive
+RELOAD_INTERVAL = 300
+
+
+# Function to get the price edge a zone flips list at and whether it flips when the price equals it
+def zone_edge(zone):
+    """
+    Follows GreenList.check_price_in_zone_with_timeframe: a demand zone is on the Green List
+    while the price is at or above price_range_low (its upper edge, demand zones are stored
+    inverted), and a supply zone is on the Red List while the price is at or below
+    price_range_high.
+    Returns:
+        (edge, is_supply); the zone is Green when price >= edge for demand zones and when
+        price > edge for supply zones.
+    """
+    if zone['zone_type'] == 'Supply Zone':
+        return zone['price_range_high'], True
+    return zone['price_range_low'], False
+
+
+# Zone values a zone is placed on; a reload places a zone again only when one of them changed
+_PLACED_FIELDS = ('zone_type', 'price_range_high', 'price_range_low', 'tested_date')
+
+
+class _SymbolBook:
+    """
+    Zones of one symbol split by their list at the last price: Red zones in a min-heap of the
+    edges above the price and Green zones in a max-heap of the edges below it. The top of each
+    heap is the nearest edge, so a tick only pops the zones whose edge it crossed.
+    """
+
+    def __init__(self):
+        self.price = None
+        self.red = []
+        self.green = []
+        self.unplaced = []
+
+
+class ZoneMonitor:
+    """
+    Keeps the tested zones in memory and moves them between the Green and Red lists as ticks
+    arrive. Only the zones whose list changed are written to GreenRedList, updating the stored
+    row of the zone or inserting it.
+    The zones table is read again every reload_interval seconds, on the next tick, so zones
+    that were violated or went stale leave the lists and zones of later scans join them.
+    """
+
+    def __init__(self, db_file=GREEN_RED_DB, timeframes=('1d', '2h', '1h'), write=True, zone_db=ZONE_DB,
+                 reload_interval=RELOAD_INTERVAL):
+        self.db_file = db_file
+        self.timeframes = timeframes
+        self.write = write
+        self.zone_db = zone_db
+        self.reload_interval = reload_interval
+        self.loaded_at = None
+        # Symbols that got their first zone since the feed subscribed; the feed subscribes them
+        self.new_symbols = []
+        self.books = {}
+        self.zones = {}
+        # Key of each placed zone -> heap entry; entries no longer in here are stale
+        self.entries = {}
+        self.lists = {}
+        self.counter = itertools.count()
+        self.transitions = 0
+        self.connection = None
+
+    @staticmethod
+    def zone_key(zone):
+        return zone['symbol'], zone['timeframe'], zone['start_date'], zone['end_date']
+
+    def load(self):
+        """
+        Loads the tested zones GreenList checks and the lists already stored in GreenRedList,
+        so the first tick of a symbol only writes the zones whose list differs.
+        """
+        self.reload()
+        self.new_symbols = []
+
+        create_green_red_list_table(self.db_file, drop=False)
+        connection = sqlite3.connect(self.db_file)
+        try:
+            rows = connection.execute(
+                "SELECT symbol, timeframe, start_date, end_date, List FROM GreenRedList").fetchall()
+        except sqlite3.Error as e:
+            print(f"SQLite error: {e}")
+            rows = []
+        connection.close()
+        for symbol, timeframe, start_date, end_date, zone_list in rows:
+            key = (symbol, timeframe, start_date, end_date)
+            if key in self.zones:
+                self.lists[key] = zone_list
+        print(f"Monitoring {len(self.zones)} zones of {len(self.books)} symbols")
+        return self
+
+    def reload(self):
+        """
+        Reads the tested zones from the zones table again. Zones no longer returned, because
+        they were violated, retested long ago or went out of the lookback, are dropped along
+        with their GreenRedList rows; new zones are added and zones whose bounds or tested
+        date changed are placed again.
+        Returns:
+            List of (zone key, previous list, new list) transitions, already written.
+        """
+        current = {}
+        for timeframe in self.timeframes:
+            for zone in fetch_active_zones(timeframe, db_path=self.zone_db).to_dict('records'):
+                zone['timeframe'] = timeframe
+                current[self.zone_key(zone)] = zone
+
+        removed = [key for key in self.zones if key not in current]
+        for key in removed:
+            self.remove_zone(key)
+        self._delete(removed)
+
+        transitions = []
+        for key, zone in current.items():
+            stored = self.zones.get(key)
+            if stored is not None and all(stored[field] == zone[field] for field in _PLACED_FIELDS):
+                # Only the days since the test moved on
+                self.zones[key] = zone
+                continue
+            transitions += self.add_zone(zone)
+        self.loaded_at = time.monotonic()
+        return transitions
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def symbols(self):
+        return list(self.books)
+
+    def add_zone(self, zone):
+        key = self.zone_key(zone)
+        # A zone placed again keeps its list, so it only counts as a transition if that changes
+        zone_list = self.lists.get(key)
+        self.remove_zone(key)
+        if zone_list is not None:
+            self.lists[key] = zone_list
+        self.zones[key] = zone
+        if zone['symbol'] not in self.books:
+            self.books[zone['symbol']] = _SymbolBook()
+            self.new_symbols.append(zone['symbol'])
+        book = self.books[zone['symbol']]
+        if book.price is None:
+            book.unplaced.append(key)
+            return []
+        return self._write(self._place(book, key, book.price))
+
+    def remove_zone(self, key):
+        # The heap entry stays behind and is skipped once it reaches the top
+        self.entries.pop(key, None)
+        self.lists.pop(key, None)
+        return self.zones.pop(key, None)
+
+    # Function to push a zone on the heap of its list at `price`; returns its transition, if any
+    def _place(self, book, key, price):
+        edge, is_supply = zone_edge(self.zones[key])
+        if price > edge or (price == edge and not is_supply):
+            entry = (-edge, 1 if is_supply else 2, next(self.counter), key)
+            heapq.heappush(book.green, entry)
+            zone_list = GREEN_LIST
+        else:
+            entry = (edge, 2 if is_supply else 1, next(self.counter), key)
+            heapq.heappush(book.red, entry)
+            zone_list = RED_LIST
+        self.entries[key] = entry
+        previous = self.lists.get(key)
+        self.lists[key] = zone_list
+        return [(key, previous, zone_list)] if previous != zone_list else []
+
+    def on_tick(self, symbol, price):
+        """
+        Moves the zones of a symbol whose edge the price crossed since its last tick.
+        Returns:
+            List of (zone key, previous list, new list) transitions, already written.
+        """
+        reloaded = []
+        if (self.reload_interval is not None and self.loaded_at is not None
+                and time.monotonic() - self.loaded_at >= self.reload_interval):
+            reloaded = self.reload()
+        book = self.books.get(symbol)
+        if book is None or price is None:
+            return reloaded
+        transitions = []
+        if book.unplaced:
+            for key in book.unplaced:
+                if key in self.zones:
+                    transitions += self._place(book, key, price)
+            book.unplaced = []
+
+        # Red zones turn Green when the price reaches their edge (passes it for supply zones).
+        # At equal edges demand zones sort first, so the loop stops at the first zone that stays.
+        red, green = book.red, book.green
+        while red and (self.entries.get(red[0][3]) is not red[0]
+                       or price > red[0][0] or (price == red[0][0] and red[0][1] == 1)):
+            entry = heapq.heappop(red)
+            if self.entries.get(entry[3]) is entry:
+                transitions += self._place(book, entry[3], price)
+        # Green zones turn Red when the price drops below their edge (to it for supply zones)
+        while green and (self.entries.get(green[0][3]) is not green[0]
+                         or price < -green[0][0] or (price == -green[0][0] and green[0][1] == 1)):
+            entry = heapq.heappop(green)
+            if self.entries.get(entry[3]) is entry:
+                transitions += self._place(book, entry[3], price)
+
+        book.price = price
+        return reloaded + self._write(transitions)
+
+    def nearest_edges(self, symbol):
+        """
+        Returns (distance to the nearest edge above, distance to the nearest edge below) of a
+        symbol at its last price; None where there is no zone on that side.
+        """
+        book = self.books.get(symbol)
+        if book is None or book.price is None:
+            return None, None
+        for heap in (book.red, book.green):
+            while heap and self.entries.get(heap[0][3]) is not heap[0]:
+                heapq.heappop(heap)
+        above = book.red[0][0] - book.price if book.red else None
+        below = book.price + book.green[0][0] if book.green else None
+        return above, below
+
+    # Function to get the connection of the whole run; the websocket calls back from its own thread
+    def _connect(self):
+        if self.connection is None:
+            self.connection = sqlite3.connect(self.db_file, check_same_thread=False)
+        return self.connection
+
+    # Function to delete the GreenRedList rows of zones no longer monitored in one transaction
+    def _delete(self, keys):
+        if not keys or not self.write:
+            return
+        connection = self._connect()
+        try:
+            with connection:
+                connection.executemany(
+                    "DELETE FROM GreenRedList WHERE symbol = ? AND timeframe = ? AND start_date = ? AND end_date = ?",
+                    keys
+                )
+        except sqlite3.Error as e:
+            print(f"SQLite error during deletion: {e}")
+
+    # Function to write the zones whose list changed in one transaction
+    def _write(self, transitions):
+        if not transitions or not self.write:
+            self.transitions += len(transitions)
+            return transitions
+        connection = self._connect()
+        try:
+            with connection:
+                for key, _, zone_list in transitions:
+                    zone = self.zones[key]
+                    updated = connection.execute(
+                        "UPDATE GreenRedList SET List = ? "
+                        "WHERE symbol = ? AND timeframe = ? AND start_date = ? AND end_date = ?",
+                        (zone_list,) + key
+                    )
+                    if updated.rowcount == 0:
+                        connection.execute(
+                            "INSERT INTO GreenRedList (symbol, start_date, end_date, price_range_high, "
+                            "price_range_low, tested_date, timeframe, List) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                            (zone['symbol'], zone['start_date'], zone['end_date'], zone['price_range_high'],
+                             zone['price_range_low'], zone['tested_date'], zone['timeframe'], zone_list)
+                        )
+        except sqlite3.Error as e:
+            print(f"SQLite error during insertion: {e}")
+        self.transitions += len(transitions)
+        return transitions
+
+
+# Function to print each transition with the time it took from the tick
+def _print_transitions(transitions, received):
+    elapsed = (time.perf_counter() - received) * 1000
+    for (symbol, timeframe, start_date, _), previous, zone_list in transitions:
+        print(f"{symbol} {timeframe} zone from {start_date}: {previous or 'new'} -> {zone_list} "
+              f"({elapsed:.2f} ms after the tick)")
+
+
+# Function to feed recorded ticks to the monitor, as a stand-in for the live feed
+def replay_ticks(monitor, ticks, speed=None):
+    """
+    Args:
+        monitor: Loaded ZoneMonitor.
+        ticks: Iterable of (timestamp, symbol, price), or a CSV file with those columns.
+        speed: None replays as fast as possible; otherwise the gaps between the tick
+            timestamps (epoch seconds) are slept, divided by speed.
+    """
+    if isinstance(ticks, str):
+        import pandas as pd
+        ticks = pd.read_csv(ticks).itertuples(index=False, name=None)
+    previous = None
+    for timestamp, symbol, price in ticks:
+        if speed and previous is not None:
+            time.sleep(max(0.0, (timestamp - previous) / speed))
+        previous = timestamp
+        received = time.perf_counter()
+        transitions = monitor.on_tick(symbol, float(price))
+        if transitions:
+            _print_transitions(transitions, received)
+
+
+# Function to run the monitor on the Fyers data websocket until it is stopped
+def run_fyers_feed(monitor, confile='config.ini'):
+    from fyers_apiv3.FyersWebsocket import data_ws
+
+    config = load_fyers_config(confile)
+    if config is None:
+        return
+    # Ticks arrive with Fyers symbols; the zones use the yfinance tickers
+    symbols = {to_fyers_symbol(symbol): symbol for symbol in monitor.symbols()}
+
+    def on_message(message):
+        received = time.perf_counter()
+        symbol = symbols.get(message.get('symbol')) if isinstance(message, dict) else None
+        if symbol is None or 'ltp' not in message:
+            return
+        transitions = monitor.on_tick(symbol, float(message['ltp']))
+        if transitions:
+            _print_transitions(transitions, received)
+        if monitor.new_symbols:
+            # Symbols whose first zone came with a reload
+            new = {to_fyers_symbol(symbol): symbol for symbol in monitor.new_symbols}
+            monitor.new_symbols = []
+            symbols.update(new)
+            socket.subscribe(symbols=list(new), data_type="SymbolUpdate")
+
+    def on_connect():
+        socket.subscribe(symbols=list(symbols), data_type="SymbolUpdate")
+        print(f"Subscribed to {len(symbols)} symbols")
+
+    socket = data_ws.FyersDataSocket(
+        access_token=f"{config['client_id']}:{config['access_token']}",
+        log_path="",
+        litemode=True,
+        write_to_file=False,
+        reconnect=True,
+        on_connect=on_connect,
+        on_close=lambda message: print(f"Fyers feed closed: {message}"),
+        on_error=lambda message: print(f"Fyers feed error: {message}"),
+        on_message=on_message
+    )
+    socket.connect()
+    socket.keep_running()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move tested zones between the Green and Red lists on live ticks.")
+    parser.add_argument('--replay', help="CSV of timestamp,symbol,price ticks to replay instead of the live feed")
+    parser.add_argument('--speed', type=float, help="Replay speed-up; replays as fast as possible when omitted")
+    parser.add_argument('--timeframes', default=','.join(ZONE_LOOKBACK_DAYS), help="Timeframes to monitor")
+    parser.add_argument('--config', default='config.ini', help="Config file with the FyersAPI section")
+    parser.add_argument('--reload-interval', type=float, default=RELOAD_INTERVAL,
+                        help="Seconds between two reads of the zones table")
+    args = parser.parse_args()
+
+    zone_monitor = ZoneMonitor(timeframes=tuple(args.timeframes.split(',')),
+                               reload_interval=args.reload_interval).load()
+    if args.replay:
+        replay_ticks(zone_monitor, args.replay, args.speed)
+    else:
+        run_fyers_feed(zone_monitor, args.config)
+    zone_monitor.close()
+    print(f"Wrote {zone_monitor.transitions} list changes")
@@ -0,0 +1,217 @@
+import datetime
+import os
+import sqlite3
+
+from ZoneEngine import ZONE_ROW_COLUMNS, ZONE_STATE_COLUMNS
+
+ZONE_DB = '../StockDZSZ.db'
+
+# Timeframe labels used in stock_price_results and by the chart scripts, mapped to the
+# timeframe stored in the zones table
+TIMEFRAME_LABELS = {'1d': '1d', '1hr': '1h', '1h': '1h', '2hr': '2h', '2h': '2h'}
+
+# Tables the scan scripts used to rebuild on every run: (database, table, timeframe, market)
+LEGACY_TABLES = [
+    ('../StockDZSZ.db', 'demand_supply_zones', '1d', 'NSE'),
+    ('../StockTest.db', 'demand_supply_zones', '2h', 'NSE'),
+    ('../StockTest.db', 'demand_supply_zones_1hr', '1h', 'NSE'),
+    ('../StockDZSZNDX.db', 'demand_supply_zones', '1d', 'NASDAQ'),
+    ('../StockDZSZNDX.db', 'demand_supply_zones_1h', '1h', 'NASDAQ'),
+]
+
+# Scan that writes the NSE 1-hour zones. 'fyers': DZSZ4 derives them from its 15-minute Fyers
+# series (with its MULTI_TIMEFRAME on) and DZSZ3 writes none. 'yfinance': DZSZ3 scans yfinance
+# 1-hour candles and DZSZ4 only writes 2-hour zones. The two sources have different bar
+# boundaries and prices, so their zones never share a key and must not both be stored.
+NSE_1H_SOURCE = 'fyers'
+
+# Columns the upsert compares to decide whether a stored zone changed
+_UPDATE_COLUMNS = [
+    'base_candles_count', 'zone_type', 'zone_classification', 'price_range_high', 'price_range_low',
+    'zone_status', 'tested_date'
+]
+
+# Integer epoch columns kept next to the text dates they are derived from. The text dates are the
+# exchange's wall-clock time, so the epochs count that wall-clock time as UTC; compare them with
+# strftime('%s', 'now', 'localtime') like the scripts compared the text with datetime.now().
+EPOCH_COLUMNS = {'start_ts': 'start_date', 'end_ts': 'end_date', 'tested_ts': 'tested_date'}
+
+
+class ZoneStore:
+    """
+    Single zones table for every market and timeframe, keyed by (symbol, timeframe,
+    start_date, end_date). Scans upsert into it, so a rerun only touches the zones whose
+    status or bounds changed.
+    """
+
+    def __init__(self, db_path=ZONE_DB):
+        self.db_path = db_path
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS zones (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            symbol TEXT NOT NULL,
+            market TEXT NOT NULL,
+            timeframe TEXT NOT NULL,
+            start_date TEXT NOT NULL,
+            end_date TEXT NOT NULL,
+            base_candles_count INTEGER,
+            zone_type TEXT,
+            zone_classification TEXT,
+            price_range_high REAL,
+            price_range_low REAL,
+            zone_status TEXT,
+            tested_date TEXT,
+            updated_at TEXT,
+            start_ts INTEGER,
+            end_ts INTEGER,
+            tested_ts INTEGER,
+            last_bar_ts INTEGER
+        )
+        """)
+        self._migrate(conn)
+        conn.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_zones_natural_key
+        ON zones (symbol, timeframe, start_date, end_date)
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_zones_status_start_ts ON zones (zone_status, start_ts)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_zones_symbol_timeframe ON zones (symbol, timeframe)")
+        conn.commit()
+        conn.close()
+
+    # Function to add the epoch columns to a zones table created before they existed
+    def _migrate(self, conn):
+        existing = {row[1] for row in conn.execute("PRAGMA table_info(zones)")}
+        for epoch_column, date_column in EPOCH_COLUMNS.items():
+            if epoch_column not in existing:
+                conn.execute(f"ALTER TABLE zones ADD COLUMN {epoch_column} INTEGER")
+                # SQLite parses all three stored formats: '%Y-%m-%d', '%Y-%m-%d %H:%M' and '%Y-%m-%d %H:%M:%S'
+                conn.execute(f"UPDATE zones SET {epoch_column} = CAST(strftime('%s', {date_column}) AS INTEGER)")
+                print(f"Added {epoch_column} to the zones table of {self.db_path}")
+        if 'last_bar_ts' not in existing:
+            # Without a cursor a zone is evaluated from its end candle on its next refresh
+            conn.execute("ALTER TABLE zones ADD COLUMN last_bar_ts INTEGER")
+        # The recency index now covers the epoch start instead of the text start
+        conn.execute("DROP INDEX IF EXISTS idx_zones_status_start")
+
+    def connect(self, timeout=60):
+        return sqlite3.connect(self.db_path, timeout=timeout)
+
+    def upsert(self, rows, timeframe, market, conn=None):
+        """
+        Inserts new zones and updates the stored ones whose values changed.
+        Args:
+            rows: Tuples in the order of ZoneEngine.ZONE_ROW_COLUMNS, optionally followed by the
+                date of the last candle the status was evaluated on, stored as the zone's cursor.
+            timeframe: '1d', '2h', '1h', ...
+            market: 'NSE' or 'NASDAQ'.
+            conn: Open connection to write in; the caller then commits.
+        Returns:
+            Number of rows passed in.
+        """
+        rows = list(rows)
+        if not rows:
+            return 0
+        updated_at = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        columns = ['market', 'timeframe', 'updated_at'] + ZONE_ROW_COLUMNS
+        # Numbered parameters let SQLite derive each epoch column from its date parameter
+        values = [f'?{number}' for number in range(1, len(columns) + 1)]
+        values += [f"CAST(strftime('%s', ?{columns.index(date_column) + 1}) AS INTEGER)"
+                   for date_column in EPOCH_COLUMNS.values()]
+        values.append(f"CAST(strftime('%s', ?{len(columns) + 1}) AS INTEGER)")
+        changed = ' OR '.join(f"zones.{column} IS NOT excluded.{column}" for column in _UPDATE_COLUMNS + ['last_bar_ts'])
+        updated = _UPDATE_COLUMNS + ['market', 'updated_at', 'tested_ts', 'last_bar_ts']
+        sql = f"""
+            INSERT INTO zones ({', '.join(columns + list(EPOCH_COLUMNS) + ['last_bar_ts'])})
+            VALUES ({', '.join(values)})
+            ON CONFLICT (symbol, timeframe, start_date, end_date) DO UPDATE SET
+            {', '.join(f'{column} = excluded.{column}' for column in updated)}
+            WHERE {changed}"""
+
+        own_connection = conn is None
+        if own_connection:
+            conn = self.connect()
+        width = len(ZONE_ROW_COLUMNS) + 1
+        conn.executemany(sql, ((market, timeframe, updated_at) + (tuple(row) + (None,))[:width] for row in rows))
+        if own_connection:
+            conn.commit()
+            conn.close()
+        return len(rows)
+
+    def fetch(self, columns, zone_status=None, timeframe=None, market=None, symbol=None, start_from=None):
+        """
+        Returns the requested columns of the zones matching every filter that is given.
+        start_from keeps the zones starting on or after that date ('%Y-%m-%d'), using the
+        epoch start column and its index.
+        """
+        conditions = []
+        params = []
+        for column, value in (('zone_status', zone_status), ('timeframe', timeframe),
+                              ('market', market), ('symbol', symbol)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        if start_from is not None:
+            conditions.append("start_ts >= CAST(strftime('%s', ?) AS INTEGER)")
+            params.append(start_from)
+
+        query = f"SELECT {', '.join(columns)} FROM zones"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        conn = self.connect()
+        rows = conn.execute(query, params).fetchall()
+        conn.close()
+        return rows
+
+    def zone_states(self, timeframe, market):
+        """
+        Returns the stored zones of a timeframe, for a refresh to resume the live ones and skip
+        the rest, as a dictionary of symbol -> list of tuples in the order of ZONE_STATE_COLUMNS.
+        """
+        conn = self.connect()
+        rows = conn.execute(
+            f"SELECT {', '.join(ZONE_STATE_COLUMNS)} FROM zones WHERE timeframe = ? AND market = ?",
+            (timeframe, market)
+        ).fetchall()
+        conn.close()
+        states = {}
+        for row in rows:
+            states.setdefault(row[0], []).append(row)
+        return states
+
+    def set_status(self, symbol, timeframe, market, start_date, end_date, zone_status):
+        """
+        Sets the status of one zone, found by its natural key within its market, so a ticker
+        listed on both markets or two zones with the same bounds are never marked together.
+        Returns:
+            Number of zones updated.
+        """
+        conn = self.connect()
+        updated = conn.execute(
+            "UPDATE zones SET zone_status = ?, updated_at = ? "
+            "WHERE symbol = ? AND timeframe = ? AND start_date = ? AND end_date = ? AND market = ?",
+            (zone_status, datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'), symbol, timeframe, start_date,
+             end_date, market)
+        ).rowcount
+        conn.commit()
+        conn.close()
+        return updated
+
+
+# Function to copy the zones of the old per-script tables into the zones table
+def migrate_legacy_zones(store=None, legacy_tables=LEGACY_TABLES):
+    store = store or ZoneStore()
+    for db_path, table, timeframe, market in legacy_tables:
+        if not os.path.exists(db_path):
+            continue
+        conn = sqlite3.connect(db_path)
+        exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()
+        rows = conn.execute(f"SELECT {', '.join(ZONE_ROW_COLUMNS)} FROM {table}").fetchall() if exists else []
+        conn.close()
+        if rows:
+            store.upsert(rows, timeframe, market)
+            print(f"Migrated {len(rows)} zones from {db_path} {table}")
+
+
+if __name__ == "__main__":
+    migrate_legacy_zones()
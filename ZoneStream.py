@@ -0,0 +1,172 @@
+import numpy as np
+import pandas as pd
+
+from IndicatorKernels import CandleSizeKernel
+from ZoneEngine import GREEN, NEUTRAL, RED, TERMINAL_STATUSES, ZONE_PATTERNS
+
+
+class OnlineZoneDetector:
+    """
+    Finds the zones of one (symbol, timeframe) as each bar closes, with the rules of
+    ZoneEngine.find_zones and resolve_zone_statuses. The detection state is O(1): a running
+    candle-size average, the last long candle and running aggregates of the base candles after
+    it. Zones that can still change status are kept until they reach a terminal status.
+
+    Replaying a series through update() yields the same zones, statuses and tested dates as
+    zone_rows(..., avg_candle_size=self.avg_candle_size) over that series. The default running
+    average ('expanding') only uses closed bars; pass the series average of a warm-up history
+    as a number to keep the threshold fixed instead. The running average is a CandleSizeKernel,
+    so one restored by Indicators.IndicatorStore resumes it without replaying the history.
+    """
+
+    def __init__(self, symbol, date_format='%Y-%m-%d %H:%M:%S', rule='first_test', mark_bad=True,
+                 max_base_candles=6, long_candle_factor=1.5, avg_candle_size='expanding', candle_sizes=None):
+        self.symbol = symbol
+        self.date_format = date_format
+        self.rule = rule
+        self.mark_bad = mark_bad
+        self.max_base_candles = max_base_candles
+        self.long_candle_factor = long_candle_factor
+        self.avg_candle_size = avg_candle_size
+
+        self.bars = 0
+        self.previous_close = None
+        self.candle_sizes = candle_sizes or CandleSizeKernel()
+        # Last long candle: (position, date, colour, high, low)
+        self.last_long = None
+        self._reset_base()
+        # Zones whose status or tested date can still change: key -> [row fields, is_supply, status].
+        # A Bad zone keeps 'Bad' in its row but is followed under its underlying status, because
+        # the batch engine reports the tested date of Bad zones too.
+        self.live = {}
+
+    def _reset_base(self):
+        self.base_count = 0
+        self.base_high = -np.inf
+        self.base_low = np.inf
+        self.base_lowest_body = np.inf
+        self.base_highest_body = -np.inf
+
+    # Function to get the long candle threshold from the mean candle size after the latest bar
+    def _threshold(self, mean_candle_size):
+        if self.avg_candle_size == 'expanding':
+            return np.round(mean_candle_size, 1) * self.long_candle_factor
+        return self.avg_candle_size * self.long_candle_factor
+
+    def update(self, timestamp, open_, high, low, close):
+        """
+        Feeds one closed bar.
+        Returns:
+            Rows in the order of ZoneEngine.ZONE_ROW_COLUMNS for every zone that was found on this
+            bar or whose status or tested date changed on it, ready for ZoneStore.upsert.
+        """
+        date = pd.Timestamp(timestamp).strftime(self.date_format)
+        open_, high, low, close = float(open_), float(high), float(low), float(close)
+        changed = self._update_statuses(date, high, low, close)
+        mean_candle_size = self.candle_sizes.update(high, low, close)
+
+        position = self.bars
+        self.bars += 1
+        previous_close = self.previous_close
+        self.previous_close = close
+        if previous_close is None:
+            return changed
+
+        candle_size = np.round(abs(close - previous_close), 1)
+        is_long = candle_size >= self._threshold(mean_candle_size)
+        close_rounded = np.round(close, 1)
+        color = int(np.sign(close - open_))
+
+        if not is_long:
+            self.base_count += 1
+            if self.base_count <= self.max_base_candles:
+                self.base_high = max(self.base_high, high)
+                self.base_low = min(self.base_low, low)
+                # Same body edges as ZoneEngine.candle_bodies and first_base_bodies
+                if self.base_count == 1 or color == NEUTRAL:
+                    lowest_body, highest_body = min(open_, close_rounded), max(open_, close_rounded)
+                elif color == GREEN:
+                    lowest_body, highest_body = open_, close_rounded
+                else:
+                    lowest_body, highest_body = close_rounded, open_
+                self.base_lowest_body = min(self.base_lowest_body, lowest_body)
+                self.base_highest_body = max(self.base_highest_body, highest_body)
+            return changed
+
+        if self.last_long is not None:
+            zone = self._make_zone(date, open_, high, low, close_rounded, color)
+            if zone is not None:
+                changed.append(zone)
+        self.last_long = (position, date, color, high, low)
+        self._reset_base()
+        return changed
+
+    # Function to build the zone between the last long candle and the long candle that just closed
+    def _make_zone(self, date, open_, high, low, close_rounded, color):
+        _, start_date, first_color, first_high, first_low = self.last_long
+        if first_color == NEUTRAL or color == NEUTRAL or not 1 <= self.base_count <= self.max_base_candles:
+            return None
+
+        zone_type, zone_classification = ZONE_PATTERNS[(first_color, color)]
+        is_supply = color == RED
+        if first_color == RED and color == RED:
+            price_range_high = self.base_high
+        elif first_color == GREEN and color == GREEN:
+            price_range_high = self.base_low
+        elif first_color == RED:
+            price_range_high = min(self.base_low, first_low)
+        else:
+            price_range_high = max(self.base_high, first_high)
+        price_range_low = self.base_lowest_body if is_supply else self.base_highest_body
+
+        # A zone is Bad when the breakout candle's wick exceeds 10% of its body
+        wick = low - min(open_, close_rounded) if is_supply else high - max(open_, close_rounded)
+        is_bad = wick > 0.1 * abs(open_ - close_rounded)
+
+        row = [self.symbol, start_date, date, self.base_count, zone_type, zone_classification,
+               float(np.round(price_range_high, 2)), float(np.round(price_range_low, 2)),
+               'Bad' if is_bad and self.mark_bad else 'Active', None]
+        self.live[(start_date, date)] = [row, is_supply, 'Active']
+        return tuple(row)
+
+    # Function to move every live zone through the bar that just closed
+    def _update_statuses(self, date, high, low, close):
+        changed = []
+        last_test = self.rule == 'last_test'
+        for key, zone in list(self.live.items()):
+            row, is_supply, _ = zone
+            zone_high, zone_low = row[6], row[7]
+            violated = close > zone_high if is_supply else close < zone_low
+            if is_supply and last_test:
+                tested = zone_low <= close <= zone_high
+            else:
+                tested = zone_low <= high <= zone_high or zone_low <= low <= zone_high
+
+            if violated:
+                zone[2] = 'Violated'
+                if last_test:
+                    row[9] = date
+            elif tested:
+                zone[2], row[9] = 'Tested', date
+            else:
+                continue
+            if row[8] != 'Bad':
+                row[8] = zone[2]
+            changed.append(tuple(row))
+            if zone[2] in TERMINAL_STATUSES[self.rule]:
+                del self.live[key]
+        return changed
+
+    def replay(self, stock_data):
+        """
+        Feeds every bar of a series in order.
+        Returns:
+            Dictionary of (start_date, end_date) -> latest row of every zone found.
+        """
+        zones = {}
+        open_, high, low, close = (np.asarray(stock_data[column], dtype=float).reshape(-1)
+                                   for column in ('Open', 'High', 'Low', 'Close'))
+        for i, timestamp in enumerate(stock_data.index):
+            for row in self.update(timestamp, open_[i], high[i], low[i], close[i]):
+                zones[(row[1], row[2])] = row
+        return zones
@@ -0,0 +1,58 @@
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+import Indicators
+from Indicators import EmaService
+
+
+# Function to build a fake yf.download over a dictionary of symbol -> daily closes
+def _fake_download(history, calls):
+    def download(symbols, start=None, **kwargs):
+        calls.append((tuple(symbols), start))
+        frames = {}
+        for symbol in symbols:
+            close = history[symbol][history[symbol].index >= pd.Timestamp(start)]
+            for field in ('Open', 'High', 'Low', 'Close', 'Volume'):
+                frames[(field, symbol)] = close
+        return pd.DataFrame(frames)
+    return download
+
+
+def test_ema_service_resumes_its_kernels_from_the_stored_state(tmp_path, monkeypatch):
+    rng = np.random.default_rng(7)
+    dates = pd.date_range(end=pd.Timestamp.now().normalize(), periods=40, freq='D')
+    history = {symbol: pd.Series(100 + np.cumsum(rng.normal(0, 1, len(dates))), index=dates)
+               for symbol in ('AAA.NS', 'BBB.NS')}
+    today = {symbol: closes.iloc[-1] for symbol, closes in history.items()}
+    calls = []
+    monkeypatch.setattr(Indicators.yf, 'download', _fake_download(history, calls), raising=False)
+
+    db_path = str(tmp_path / 'candles.db')
+    service = EmaService(spans=(5, 20), db_path=db_path)
+    first = service.latest(list(history), span=20)
+    start = pd.Timestamp(calls[0][1])
+    for symbol, closes in history.items():
+        assert np.isclose(first[symbol], closes[closes.index >= start].ewm(span=20, adjust=False).mean().iloc[-1])
+
+    # Today's candle closes at another price and a new day starts
+    tomorrow = dates[-1] + pd.Timedelta(days=1)
+    for symbol in history:
+        history[symbol].iloc[-1] = today[symbol] + 3
+        history[symbol] = pd.concat([history[symbol], pd.Series([today[symbol] - 2], index=[tomorrow])])
+    second = EmaService(spans=(5, 20), db_path=db_path).latest(list(history), span=20)
+
+    # One batched download from the last stored day, which may have been forming
+    assert calls[-1] == (tuple(history), dates[-1].strftime('%Y-%m-%d'))
+    for symbol, closes in history.items():
+        assert np.isclose(second[symbol], closes[closes.index >= start].ewm(span=20, adjust=False).mean().iloc[-1])
+
+    conn = sqlite3.connect(db_path)
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    states = conn.execute("SELECT symbol, indicator, ts FROM indicator_state ORDER BY symbol, indicator").fetchall()
+    conn.close()
+    assert 'ema_state' not in tables
+    # The states end at the last closed candle
+    assert states == [(symbol, name, int(dates[-1].timestamp()))
+                      for symbol in sorted(history) for name in ('ema20', 'ema5')]
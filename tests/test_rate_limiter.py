@@ -0,0 +1,45 @@
+import threading
+import time
+
+from FyersData import RateLimiter
+
+
+def test_waiting_on_one_window_keeps_the_room_of_the_others():
+    # Plenty of per-second budget, one request per 10 seconds
+    limiter = RateLimiter(((5, 1.0), (1, 10.0)))
+    limiter.acquire()
+    waiter = threading.Thread(target=limiter.acquire, daemon=True)
+    waiter.start()
+    time.sleep(0.2)
+
+    # The second request waits on the slow window without using up per-second room
+    assert waiter.is_alive()
+    per_second = limiter.buckets[0]
+    with per_second.lock:
+        assert len(per_second.times) == 1
+
+
+def test_requests_are_spaced_by_the_tightest_window():
+    limiter = RateLimiter(((10, 1.0), (2, 0.2)))
+    started = time.monotonic()
+    for _ in range(4):
+        limiter.acquire()
+    # Two requests go at once; the next two wait for the first two to leave the 0.2 s window
+    assert 0.18 <= time.monotonic() - started < 0.5
+
+
+def test_no_window_admits_more_than_the_limit_after_an_idle_period():
+    # The Fyers limits scaled down 100 times: 10 per 10 ms and 200 per 0.6 s
+    per = 0.6
+    limiter = RateLimiter(((10, 0.01), (200, per)))
+    time.sleep(per)
+    times = []
+    started = time.monotonic()
+    while time.monotonic() - started < 1.5 * per:
+        limiter.acquire()
+        times.append(time.monotonic())
+
+    # A token bucket admits a full burst plus a full refill, close to 400, in the first window
+    # Times are taken just after each request, so allow for a few milliseconds of jitter
+    assert max(sum(1 for t in times[i:] if t - start < per - 0.005) for i, start in enumerate(times)) <= 200
+    assert len(times) > 200
@@ -0,0 +1,169 @@
+import threading
+import time
+
+import pytest
+import requests
+
+import Resilience
+from FakeFyersServer import HTML, TIMEOUT, FakeFyersServer
+from FyersData import fetch_history_bulk
+from FyersSession import FyersSession
+from Resilience import YAHOO_RETRYABLE_ERRORS, backoff_delay, call_with_retry, circuit_breaker
+
+
+@pytest.fixture
+def server():
+    with FakeFyersServer(delay=1.0) as fake_server:
+        yield fake_server
+
+
+@pytest.fixture
+def delays(monkeypatch):
+    # Record the backoff of every retry instead of sleeping it
+    recorded = []
+
+    def no_wait(attempt, *args, **kwargs):
+        recorded.append(backoff_delay(attempt, *args, **kwargs))
+        return 0.0
+
+    monkeypatch.setattr(Resilience, 'backoff_delay', no_wait)
+    return recorded
+
+
+def history_params(symbol='NSE:SBIN-EQ'):
+    return {'symbol': symbol, 'resolution': '15', 'date_format': '0', 'range_from': 0,
+            'range_to': int(time.time()), 'cont_flag': '1'}
+
+
+# Function to run `func` in a thread and tell whether it finished within `timeout` seconds
+def finishes(func, timeout=2.0):
+    thread = threading.Thread(target=func, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    return not thread.is_alive()
+
+
+def test_backoff_delay_is_bounded_by_the_exponential_cap():
+    for attempt in range(10):
+        bound = min(Resilience.BACKOFF_CAP, Resilience.BACKOFF_BASE * 2 ** attempt)
+        assert all(0 <= backoff_delay(attempt) <= bound for _ in range(50))
+
+
+def test_server_errors_are_retried_with_backoff(server, delays):
+    server.inject(503, 429)
+    response = FyersSession('id', 'token', base_url=server.url).history(history_params())
+    assert response['s'] == 'ok' and response['candles']
+    assert server.count('history') == 3
+    assert len(delays) == 2
+    assert delays[0] <= Resilience.BACKOFF_BASE and delays[1] <= 2 * Resilience.BACKOFF_BASE
+
+
+def test_timeouts_are_retried(server, delays):
+    server.inject(TIMEOUT)
+    response = FyersSession('id', 'token', base_url=server.url, timeout=0.2).history(history_params())
+    assert response['s'] == 'ok'
+    assert server.count('history') == 2
+
+
+def test_retries_give_up_with_the_last_error(server, delays):
+    server.inject(*[503] * 3)
+    session = FyersSession('id', 'token', base_url=server.url)
+    with pytest.raises(requests.exceptions.HTTPError):
+        call_with_retry(session._request, 'history', history_params(), host=session.host, retries=2)
+    assert server.count('history') == 3
+
+
+def test_breaker_opens_then_half_open_trial_closes_it(server, delays):
+    breaker = circuit_breaker(server.host, failure_threshold=2, reset_timeout=0.3)
+    session = FyersSession('id', 'token', base_url=server.url)
+    server.inject(503, 503)
+    with pytest.raises(requests.exceptions.HTTPError):
+        call_with_retry(session._request, 'history', history_params(), host=session.host, retries=1)
+    assert breaker.state == 'open'
+
+    # The next call waits out the open circuit and runs as the half-open trial
+    started = time.monotonic()
+    assert session.history(history_params())['s'] == 'ok'
+    assert time.monotonic() - started >= 0.25
+    assert breaker.state == 'closed'
+    assert server.count('history') == 3
+
+
+def test_failed_half_open_trial_opens_the_breaker_again(server, delays):
+    breaker = circuit_breaker(server.host, failure_threshold=1, reset_timeout=0.2)
+    session = FyersSession('id', 'token', base_url=server.url)
+    server.inject(503, 503)
+    with pytest.raises(requests.exceptions.HTTPError):
+        call_with_retry(session._request, 'history', history_params(), host=session.host, retries=1)
+    # The second failure was the half-open trial, so the circuit is open again
+    assert breaker.state == 'open'
+    assert session.history(history_params())['s'] == 'ok'
+    assert breaker.state == 'closed'
+
+
+def test_non_retryable_error_in_half_open_trial_releases_it(server, delays):
+    breaker = circuit_breaker(server.host, failure_threshold=1, reset_timeout=0.1)
+    session = FyersSession('id', 'token', base_url=server.url)
+    server.inject(503, HTML)
+    with pytest.raises(requests.exceptions.HTTPError):
+        call_with_retry(session._request, 'history', history_params(), host=session.host, retries=0)
+
+    # The trial gets an HTML error page, which does not parse as JSON and is not retried
+    with pytest.raises(ValueError):
+        session.history(history_params())
+    assert not breaker.trial_running
+    assert finishes(lambda: session.history(history_params()))
+    assert breaker.state == 'closed'
+
+
+def test_breaker_trial_released_on_any_exception():
+    breaker = circuit_breaker('trial-release.test', failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+
+    def bad_trial():
+        raise ValueError("not a host failure")
+
+    with pytest.raises(ValueError):
+        call_with_retry(bad_trial, host='trial-release.test')
+    assert finishes(lambda: call_with_retry(lambda: None, host='trial-release.test'))
+    assert breaker.state == 'closed'
+
+
+def test_yahoo_calls_retry_network_errors_but_not_bugs(delays):
+    breaker = circuit_breaker('yahoo-errors.test', failure_threshold=2)
+    calls = []
+
+    def bad_column():
+        calls.append(1)
+        raise KeyError('Adj Close')
+
+    with pytest.raises(KeyError):
+        call_with_retry(bad_column, host='yahoo-errors.test', retryable=YAHOO_RETRYABLE_ERRORS)
+    assert len(calls) == 1 and not delays
+    assert breaker.failures == 0 and breaker.state == 'closed'
+
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise requests.exceptions.ConnectionError("reset by peer")
+        return 'ok'
+
+    assert call_with_retry(flaky, host='yahoo-errors.test', retryable=YAHOO_RETRYABLE_ERRORS) == 'ok'
+    assert len(delays) == 1
+
+
+def test_retry_queue_recovers_symbols_at_the_end_of_the_scan(server, delays, tmp_path):
+    confile = tmp_path / 'config.ini'
+    confile.write_text(f"[FyersAPI]\nclient_id=id\naccess_token=token\ndata_url={server.url}\n")
+    # A high threshold keeps the failing symbol from opening the circuit for the others
+    circuit_breaker(server.host, failure_threshold=100)
+    failing = 'NSE:SBIN-EQ'
+    server.inject(*[503] * (Resilience.MAX_RETRIES + 1), symbol=failing)
+
+    symbols = [failing, 'NSE:TCS-EQ', 'NSE:INFY-EQ']
+    candles = fetch_history_bulk(symbols, '15', 0, int(time.time()), str(confile), max_workers=3)
+    assert sorted(candles) == sorted(symbols)
+    # Every retry of the pool failed; the end-of-scan drain fetched it
+    assert server.count('history', failing) == Resilience.MAX_RETRIES + 2
+    assert all(server.count('history', symbol) == 1 for symbol in symbols[1:])
@@ -0,0 +1,59 @@
+import pandas as pd
+
+from ZoneEngine import find_zones, refresh_zone_rows, zone_rows
+from ZoneStream import OnlineZoneDetector
+
+
+# Red long candle, two base candles, green long candle: one DBR demand zone. The second base
+# candle is green but its close rounds to 95.2, below its open of 95.23.
+CANDLES = pd.DataFrame({
+    'Open': [100.0, 100.0, 95.1, 95.23, 95.3],
+    'High': [100.5, 100.2, 95.4, 95.5, 101.2],
+    'Low': [99.5, 94.8, 94.9, 95.0, 95.2],
+    'Close': [100.0, 95.0, 95.2, 95.24, 101.0],
+}, index=pd.date_range('2024-01-01', periods=5, freq='D'))
+
+
+def test_base_body_edges_follow_the_candle_colour():
+    zones = find_zones(CANDLES)
+    assert len(zones) == 1
+    zone = zones.iloc[0]
+    assert (zone['zone_type'], zone['zone_classification']) == ('Demand Zone', 'DBR')
+    # Wick low of the base and the first long candle
+    assert zone['price_range_high'] == 94.8
+    # A green base candle's body top is its rounded close, not max(open, close): 95.2, not 95.23
+    assert zone['price_range_low'] == 95.2
+
+
+def test_online_detector_takes_the_same_body_edges():
+    detector = OnlineZoneDetector('TEST', date_format='%Y-%m-%d', avg_candle_size=2.8)
+    rows = []
+    for timestamp, candle in CANDLES.iterrows():
+        rows += detector.update(timestamp, candle['Open'], candle['High'], candle['Low'], candle['Close'])
+    assert [row[6:8] for row in rows] == [(94.8, 95.2)]
+    assert [row[6:8] for row in zone_rows('TEST', CANDLES, '%Y-%m-%d')] == [(94.8, 95.2)]
+
+
+# Function to turn refreshed rows into stored zone states, with the cursor as SQLite stores it
+def _states(rows):
+    return [row[:-1] + (int(pd.Timestamp(row[-1]).timestamp()),) for row in rows]
+
+
+def test_refresh_scans_the_forming_candle_again_once_it_has_closed():
+    # Two more days; the last one violates the demand zone once it has closed, but not while forming
+    completed = pd.concat([CANDLES, pd.DataFrame({
+        'Open': [101.0, 100.0],
+        'High': [101.5, 100.2],
+        'Low': [100.5, 93.0],
+        'Close': [101.2, 94.0],
+    }, index=pd.date_range('2024-01-06', periods=2, freq='D'))])
+    forming = completed.copy()
+    forming.iloc[-1] = [100.0, 100.2, 99.8, 100.1]
+
+    states = _states(refresh_zone_rows('TEST', forming, date_format='%Y-%m-%d'))
+    assert [state[-1] for state in states] == [int(pd.Timestamp('2024-01-06').timestamp())]
+    rows = refresh_zone_rows('TEST', completed, states, date_format='%Y-%m-%d', last_bar_closed=True)
+
+    expected = zone_rows('TEST', completed, '%Y-%m-%d')
+    assert sorted(row[:-1] for row in rows) == sorted(expected)
+    assert expected[0][8] == 'Violated'
@@ -0,0 +1,36 @@
+import datetime
+
+from ZoneMonitor import GREEN_LIST, RED_LIST, ZoneMonitor
+from ZoneStore import ZoneStore
+
+
+# Function to build a zones row tested an hour ago, starting `days` days back
+def _tested_zone(symbol, days, high, low, zone_type='Demand Zone'):
+    now = datetime.datetime.now()
+    start = (now - datetime.timedelta(days=days)).strftime('%Y-%m-%d %H:%M:%S')
+    end = (now - datetime.timedelta(days=days - 1)).strftime('%Y-%m-%d %H:%M:%S')
+    tested = (now - datetime.timedelta(hours=1)).strftime('%Y-%m-%d %H:%M:%S')
+    return (symbol, start, end, 1, zone_type, 'DBR', high, low, 'Tested', tested)
+
+
+def test_monitor_follows_the_zones_table_after_load(tmp_path):
+    zone_db = str(tmp_path / 'zones.db')
+    store = ZoneStore(zone_db)
+    old = _tested_zone('AAA.NS', 3, 95.0, 100.0)
+    store.upsert([old], '1d', 'NSE')
+
+    monitor = ZoneMonitor(db_file=str(tmp_path / 'lists.db'), timeframes=('1d',), write=False,
+                          zone_db=zone_db, reload_interval=0).load()
+    old_key = ('AAA.NS', '1d', old[1], old[2])
+    assert monitor.on_tick('AAA.NS', 101.0) == [(old_key, None, GREEN_LIST)]
+
+    # A later scan violates the zone and finds a new one above the price
+    store.upsert([old[:8] + ('Violated', old[9])], '1d', 'NSE')
+    new = _tested_zone('AAA.NS', 2, 110.0, 105.0, 'Supply Zone')
+    store.upsert([new], '1d', 'NSE')
+
+    new_key = ('AAA.NS', '1d', new[1], new[2])
+    assert monitor.on_tick('AAA.NS', 101.5) == [(new_key, None, RED_LIST)]
+    assert list(monitor.zones) == [new_key]
+    # The violated zone no longer moves with the price
+    assert monitor.on_tick('AAA.NS', 90.0) == []
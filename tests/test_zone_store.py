@@ -0,0 +1,17 @@
+from ZoneStore import ZoneStore
+
+
+def test_set_status_marks_only_the_zone_of_its_market(tmp_path):
+    store = ZoneStore(str(tmp_path / 'zones.db'))
+    # Two zones of one ticker with the same high, and the same ticker on the other market
+    store.upsert([('ABC', '2024-01-02', '2024-01-04', 1, 'Supply Zone', 'RBD', 101.0, 100.0, 'Tested', None),
+                  ('ABC', '2024-02-02', '2024-02-04', 1, 'Supply Zone', 'RBD', 101.0, 99.0, 'Tested', None)],
+                 '1d', 'NSE')
+    store.upsert([('ABC', '2024-03-02', '2024-03-04', 1, 'Supply Zone', 'RBD', 101.0, 98.0, 'Tested', None)],
+                 '1d', 'NASDAQ')
+
+    assert store.set_status('ABC', '1d', 'NSE', '2024-02-02', '2024-02-04', 'Violated') == 1
+    assert store.set_status('ABC', '1d', 'NSE', '2024-03-02', '2024-03-04', 'Violated') == 0
+    statuses = store.fetch(['market', 'start_date', 'zone_status'], symbol='ABC')
+    assert sorted(statuses) == [('NASDAQ', '2024-03-02', 'Tested'), ('NSE', '2024-01-02', 'Tested'),
+                                ('NSE', '2024-02-02', 'Violated')]